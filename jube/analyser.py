@@ -27,18 +27,137 @@ import os
 import re
 import glob
 import math
+import mmap
+import json
+import hashlib
+import functools
+import itertools
+import operator
+import multiprocessing as mp
 import jube.pattern
 import jube.util.util
 import jube.util.output
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 LOGGER = jube.log.get_logger(__name__)
 
+# ASCII characters, whose bytes are matched differently than in text read
+# from a file (translated line ends and unicode whitespace characters)
+_NON_TEXT_ASCII_BYTES = (b"\r", b"\x1c", b"\x1d", b"\x1e", b"\x1f")
+
+# (file path, pattern list) tuples of the current analyse, which are
+# scanned by the forked worker processes
+_FILE_SCANS = None
+
+
+def _scan_file(index):
+    """Scan a single file of the current analyse inside a worker process"""
+    return Analyser.scan_file(*_FILE_SCANS[index])
+
 
 class Analyser(object):
 
     """The Analyser handles the analyse process and store all important data
     to run a new analyse."""
 
+    # Number of characters of a file, which are scanned at once
+    CHUNK_SIZE = 4 * 1024 * 1024
+    # Number of matches of memory mapped files, which are converted at once
+    MATCH_BATCH_SIZE = 65536
+    # Number of files per process, which are scanned together
+    BATCH_SIZE = 256
+    # Minimum number of float matches, whose statistic values are combined
+    # by numpy (if available)
+    NUMPY_MIN_VALUES = 4096
+    # Maximum number of numerical matches of a file, which are stored in the
+    # analyse cache
+    CACHE_MAX_VALUES = 100000
+
+    class PatternStatistic(dict):
+
+        """Statistic values of a single pattern. Additionally the count, the
+        mean and the sum of squared deviations from the mean of all
+        numerical matches are kept to calculate a numerically stable
+        standard deviation. The matches of each file are combined in blocks
+        of BLOCK_SIZE matches using the parallel algorithm of Chan et al.,
+        so the result does not depend on how a file was scanned. Mean and
+        sum of squared deviations are stored relative to a power of two
+        scale, to avoid an overflow for very large values."""
+
+        __slots__ = ("_cnt", "_scale", "_mean", "_m2", "_pending")
+
+        BLOCK_SIZE = 4096
+
+        def __init__(self):
+            dict.__init__(self)
+            self._cnt = 0
+            self._scale = 1.0
+            self._mean = 0.0
+            self._m2 = 0.0
+            self._pending = list()
+
+        def add_values(self, values):
+            """Add numerical matches of the current file"""
+            values = self._pending + values
+            end = len(values) - len(values) % self.BLOCK_SIZE
+            for start in range(0, end, self.BLOCK_SIZE):
+                self._add_block(values[start:start + self.BLOCK_SIZE])
+            self._pending = values[end:]
+
+        def flush(self):
+            """Add the remaining matches of the current file"""
+            if len(self._pending) > 0:
+                self._add_block(self._pending)
+                self._pending = list()
+
+        def _add_block(self, block):
+            """Combine the statistic of a block of values with the current
+            statistic"""
+            cnt = len(block)
+            try:
+                # Scaling by a power of two is exact, the results only
+                # differ if the unscaled calculation would overflow
+                scale = math.ldexp(1.0, math.frexp(max(map(abs, block)))[1])
+                block = list(map(operator.truediv, block,
+                                 itertools.repeat(scale)))
+                mean = math.fsum(block) / cnt
+                deviations = list(map(operator.sub, block,
+                                      itertools.repeat(mean)))
+                m2 = math.fsum(map(operator.mul, deviations, deviations))
+            except (OverflowError, ValueError):
+                scale = 1.0
+                mean = m2 = math.nan
+            if self._cnt == 0:
+                self._scale = scale
+                self._mean = mean
+                self._m2 = m2
+                self._cnt = cnt
+                return
+            # Use the larger scale for both statistics
+            if scale > self._scale:
+                factor = self._scale / scale
+                self._mean *= factor
+                self._m2 *= factor * factor
+                self._scale = scale
+            elif scale < self._scale:
+                factor = scale / self._scale
+                mean *= factor
+                m2 *= factor * factor
+            delta = mean - self._mean
+            self._mean += delta * cnt / (self._cnt + cnt)
+            self._m2 += m2 + delta * delta * self._cnt * cnt / \
+                (self._cnt + cnt)
+            self._cnt += cnt
+
+        def standard_deviation(self):
+            """Return the sample standard deviation of all values"""
+            if self._cnt > 1:
+                return self._scale * math.sqrt(self._m2 / (self._cnt - 1))
+            return 0
+
     class AnalyseFile(object):
 
         """A file which should be analysed"""
@@ -81,13 +200,26 @@ class Analyser(object):
                     jube.conf.DEFAULT_SEPARATOR.join(self._use)
             return file_etree
 
-    def __init__(self, name, reduce_iteration=True):
+    def __init__(self, name, reduce_iteration=True, procs=1):
         self._name = name
         self._use = set()
         self._analyse = dict()
         self._benchmark = None
         self._analyse_result = None
         self._reduce_iteration = reduce_iteration
+        self._procs = procs
+        # Combined patternsets and checked parameterset combinations of the
+        # current analyse run, to avoid repeated checks for every file
+        self._file_patternsets = dict()
+        self._compatible_parametersets = set()
+        # Substituted and compiled pattern of the files, which are
+        # currently analysed
+        self._file_pattern = dict()
+        self._pattern_hashes = dict()
+        # Matches of unchanged files from the last analyse and the matches
+        # of the current analyse (None if no cache is used)
+        self._cached_files = dict()
+        self._file_cache = None
 
     @property
     def benchmark(self):
@@ -145,11 +277,24 @@ class Analyser(object):
         """Get analyser reduce"""
         return self._reduce_iteration
 
+    @property
+    def procs(self):
+        """Get number of processes used to scan files"""
+        return self._procs
+
+    @property
+    def file_cache(self):
+        """Get the file matches of the last analyse, which can be used to
+        avoid scanning unchanged files again"""
+        return self._file_cache
+
     def etree_repr(self):
         """Return etree object representation"""
         analyser_etree = ET.Element("analyser")
         analyser_etree.attrib["name"] = self._name
         analyser_etree.attrib["reduce"] = str(self._reduce_iteration)
+        if self._procs != 1:
+            analyser_etree.attrib["procs"] = str(self._procs)
         for use in self._use:
             use_etree = ET.SubElement(analyser_etree, "use")
             use_etree.text = use
@@ -177,14 +322,29 @@ class Analyser(object):
                                            ",".join(incompatible_names)))
             patternset.add_patternset(self._benchmark.patternsets[use])
 
-    def analyse(self):
-        """Run the analyser"""
+    def analyse(self, procs=None, file_cache=None):
+        """Run the analyser, procs overwrites the number of processes used
+        to scan the files. file_cache can contain the file_cache of a
+        former analyse, files which were not changed since then are not
+        scanned again. If file_cache is None, no cache is used."""
         LOGGER.debug("Run analyser \"{0}\"".format(self._name))
         if self._benchmark is None:
             raise RuntimeError("No benchmark found using analyser {0}"
                                .format(self._name))
+        if procs is None:
+            procs = self._procs
 
         result = dict()
+        self._file_patternsets = dict()
+        self._compatible_parametersets = set()
+        self._file_pattern = dict()
+        self._pattern_hashes = dict()
+        if file_cache is None:
+            self._cached_files = dict()
+            self._file_cache = None
+        else:
+            self._cached_files = file_cache
+            self._file_cache = dict()
 
         # Combine all patternsets
         patternset = jube.pattern.Patternset()
@@ -209,6 +369,9 @@ class Analyser(object):
                 align_right=False)
         LOGGER.debug(debugstr)
 
+        # Root workpackages, whose files were not analysed yet
+        pending = list()
+        file_cnt = 0
         for stepname in self._analyse:
             result[stepname] = dict()
             LOGGER.debug("  analyse step \"{0}\"".format(stepname))
@@ -220,11 +383,12 @@ class Analyser(object):
             workpackages = set(self._benchmark.workpackages[stepname])
             while len(workpackages) > 0:
                 root_workpackage = workpackages.pop()
-                match_dict = dict()
                 # Global patternset to store all existing pattern (e.g. from
                 # individual file uses), necessary to evaluate default pattern
                 # and derived pattern
                 global_patternset = patternset.copy()
+                global_uses = set()
+                files = list()
                 result[stepname][root_workpackage.id] = dict()
                 # Should multiple iterations be reduced to a single result line
                 if self._reduce_iteration:
@@ -240,10 +404,7 @@ class Analyser(object):
                     if not workpackage.started:
                         continue
 
-                    parameter = \
-                        dict([[par.name, par.value] for par in
-                              workpackage.parameterset.
-                              constant_parameter_dict.values()])
+                    parameter = workpackage.parameter_dict
 
                     for file_obj in self._analyse[stepname]:
                         if step.alt_work_dir is not None:
@@ -266,53 +427,113 @@ class Analyser(object):
 
                         file_path = os.path.join(file_path, filename)
                         for path in glob.glob(file_path):
-                            # scan files
-                            LOGGER.debug(("    scan file {0}").format(path))
-
-                            new_result_dict, match_dict = \
-                                self._analyse_file(path, patternset,
-                                                   global_patternset,
-                                                   workpackage.parameterset,
-                                                   match_dict,
-                                                   file_obj.use)
-                            result[stepname][root_workpackage.id].update(
-                                new_result_dict)
-
-                # Set default pattern values if available and necessary
-                new_result_dict = result[stepname][root_workpackage.id]
-                for pattern in global_patternset.pattern_storage:
-                    if (pattern.default_value is not None) and \
-                            (pattern.name not in new_result_dict):
-                        default = pattern.default_value
-                        # Convert default value
-                        if pattern.content_type == "int":
-                            if default == "nan":
-                                default = float("nan")
-                            else:
-                                default = int(float(default))
-                        elif pattern.content_type == "float":
-                            default = float(default)
-                        new_result_dict[pattern.name] = default
-                        new_result_dict[pattern.name + "_cnt"] = 0
-                        new_result_dict[pattern.name + "_first"] = default
-                        new_result_dict[pattern.name + "_last"] = default
-                        if pattern.content_type in ["int", "float"]:
-                            new_result_dict.update(
-                                {pattern.name + "_sum": default,
-                                 pattern.name + "_min": default,
-                                 pattern.name + "_max": default,
-                                 pattern.name + "_avg": default,
-                                 pattern.name + "_sum2": default ** 2,
-                                 pattern.name + "_std": 0})
-
-                # Evaluate derived pattern
-                new_result_dict = self._eval_derived_pattern(
-                    global_patternset, root_workpackage.parameterset,
-                    result[stepname][root_workpackage.id])
-                result[stepname][root_workpackage.id].update(
-                    new_result_dict)
-
+                            if not os.path.isfile(path):
+                                continue
+                            # Add file specific uses to the global patternset
+                            uses = frozenset(file_obj.use)
+                            if uses not in global_uses:
+                                self._combine_and_check_patternsets(
+                                    global_patternset, uses)
+                                global_uses.add(uses)
+                            files.append((path, uses,
+                                          workpackage.parameterset))
+
+                pending.append((result[stepname][root_workpackage.id],
+                                root_workpackage, global_patternset, files))
+                file_cnt += len(files)
+                if procs <= 1 or file_cnt >= procs * self.BATCH_SIZE:
+                    self._analyse_workpackages(patternset, pending, procs)
+                    pending = list()
+                    file_cnt = 0
+
+        self._analyse_workpackages(patternset, pending, procs)
         self._analyse_result = result
+        self._cached_files = dict()
+
+    def _analyse_workpackages(self, patternset, pending, procs=1):
+        """Scan the files of the given root workpackages and evaluate their
+        results. If more than one process is used, the files are scanned by
+        a pool of forked worker processes, but their matches are still
+        combined in the serial file order."""
+        global _FILE_SCANS
+        # Cached matches and cache keys of all files
+        scans = list()
+        cache_keys = list()
+        for _, _, _, files in pending:
+            for path, uses, parameterset in files:
+                matches, cache_key = self._cached_matches(
+                    path, self._substituted_pattern(patternset, parameterset,
+                                                    uses))
+                scans.append(matches)
+                cache_keys.append(cache_key)
+        unscanned = [index for index, matches in enumerate(scans)
+                     if matches is None]
+        if procs > 1 and len(unscanned) > 1:
+            files = [file_info for _, _, _, files in pending
+                     for file_info in files]
+            _FILE_SCANS = list()
+            for index in unscanned:
+                path, uses, parameterset = files[index]
+                _FILE_SCANS.append((path, self._substituted_pattern(
+                    patternset, parameterset, uses)))
+            LOGGER.debug("    scan {0} files using {1} processes".format(
+                len(_FILE_SCANS), procs))
+            try:
+                with mp.get_context("fork").Pool(processes=procs) as pool:
+                    for index, matches in zip(
+                            unscanned, pool.map(_scan_file,
+                                                range(len(_FILE_SCANS)))):
+                        scans[index] = matches
+                        self._store_matches(cache_keys[index], matches)
+            finally:
+                _FILE_SCANS = None
+
+        scans = iter(scans)
+        cache_keys = iter(cache_keys)
+        for result_dict, root_workpackage, global_patternset, files in pending:
+            match_dict = dict()
+            for path, uses, parameterset in files:
+                # scan files
+                LOGGER.debug(("    scan file {0}").format(path))
+
+                new_result_dict, match_dict = \
+                    self._analyse_file(path, patternset, parameterset,
+                                       match_dict, uses, next(scans),
+                                       next(cache_keys))
+                result_dict.update(new_result_dict)
+
+            # Set default pattern values if available and necessary
+            for pattern in global_patternset.pattern_storage:
+                if (pattern.default_value is not None) and \
+                        (pattern.name not in result_dict):
+                    default = pattern.default_value
+                    # Convert default value
+                    if pattern.content_type == "int":
+                        if default == "nan":
+                            default = float("nan")
+                        else:
+                            default = int(float(default))
+                    elif pattern.content_type == "float":
+                        default = float(default)
+                    result_dict[pattern.name] = default
+                    result_dict[pattern.name + "_cnt"] = 0
+                    result_dict[pattern.name + "_first"] = default
+                    result_dict[pattern.name + "_last"] = default
+                    if pattern.content_type in ["int", "float"]:
+                        result_dict.update(
+                            {pattern.name + "_sum": default,
+                             pattern.name + "_min": default,
+                             pattern.name + "_max": default,
+                             pattern.name + "_avg": default,
+                             pattern.name + "_sum2": default ** 2,
+                             pattern.name + "_std": 0})
+
+            # Evaluate derived pattern
+            result_dict.update(self._eval_derived_pattern(
+                global_patternset, root_workpackage.parameterset,
+                result_dict))
+        self._file_pattern = dict()
+        self._pattern_hashes = dict()
 
     def _eval_derived_pattern(self, patternset, parameterset, result_dict):
         """Evaluate all derived pattern in patternset using parameterset
@@ -338,38 +559,43 @@ class Analyser(object):
                                                 par.value, stop=False)
         return new_result_dict
 
-    def _analyse_file(self, file_path, patternset, global_patternset,
-                      parameterset, match_dict=None, additional_uses=None):
-        """Scan given files with given pattern and produce a result
-        parameterset"""
-        if additional_uses is None:
-            additional_uses = set()
-        if match_dict is None:
-            match_dict = dict()
-
-        if not os.path.isfile(file_path):
-            return dict(), match_dict
-
-        local_patternset = patternset.copy()
-
-        # Add file specific uses
-        self._combine_and_check_patternsets(local_patternset, additional_uses)
-        self._combine_and_check_patternsets(global_patternset, additional_uses)
-
-        # Unique pattern/parameter check
-        if (not parameterset.is_compatible(
-                local_patternset.pattern_storage)) or \
-           (not parameterset.is_compatible(
-                local_patternset.derived_pattern_storage)):
-
-            incompatible_names = parameterset.get_incompatible_parameter(
-                local_patternset.pattern_storage)
-            incompatible_names.update(parameterset.get_incompatible_parameter(
-                local_patternset.derived_pattern_storage))
-            raise RuntimeError(("A pattern and a parameter (\"{0}\") "
-                                "using the same name in "
-                                "analyser \"{1}\"").format(
-                                    ",".join(incompatible_names), self._name))
+    def _file_patternset(self, patternset, uses):
+        """Return the combination of patternset and the file specific uses.
+        The combination is created and checked only once per analyse run."""
+        if uses not in self._file_patternsets:
+            file_patternset = patternset.copy()
+            self._combine_and_check_patternsets(file_patternset, uses)
+            self._file_patternsets[uses] = file_patternset
+        return self._file_patternsets[uses]
+
+    def _substituted_pattern(self, patternset, parameterset, uses):
+        """Return a list of (pattern, regex, line_local) tuples of all
+        pattern used by a file, substituted by using the given parameterset.
+        The list is reused for all files of the same workpackage and uses."""
+        key = (parameterset, parameterset.version, uses)
+        if key in self._file_pattern:
+            return self._file_pattern[key]
+
+        local_patternset = self._file_patternset(patternset, uses).copy()
+
+        # Unique pattern/parameter check (once per parameterset and uses)
+        if (parameterset, uses) not in self._compatible_parametersets:
+            if (not parameterset.is_compatible(
+                    local_patternset.pattern_storage)) or \
+               (not parameterset.is_compatible(
+                    local_patternset.derived_pattern_storage)):
+
+                incompatible_names = parameterset.get_incompatible_parameter(
+                    local_patternset.pattern_storage)
+                incompatible_names.update(
+                    parameterset.get_incompatible_parameter(
+                        local_patternset.derived_pattern_storage))
+                raise RuntimeError(("A pattern and a parameter (\"{0}\") "
+                                    "using the same name in "
+                                    "analyser \"{1}\"").format(
+                                        ",".join(incompatible_names),
+                                        self._name))
+            self._compatible_parametersets.add((parameterset, uses))
 
         # Get jube patternset
         jube_pattern = jube.pattern.get_jube_pattern()
@@ -378,110 +604,426 @@ class Analyser(object):
         local_patternset.pattern_substitution(
             [parameterset, jube_pattern.pattern_storage])
 
-        patternlist = [p for p in local_patternset.pattern_storage]
-
-        file_handle = open(file_path, "r")
-        # Read file content
-        data = file_handle.read()
-        for pattern in patternlist:
-            if pattern.name not in match_dict:
-                match_dict[pattern.name] = dict()
+        patternlist = list()
+        for pattern in local_patternset.pattern_storage:
             try:
-                mode = re.MULTILINE
-                if pattern.dotall:
-                    mode += re.DOTALL
-                regex = re.compile(pattern.value, mode)
+                regex, line_local = jube.util.util.compile_pattern(
+                    pattern.value, pattern.dotall)
             except re.error as ree:
                 raise RuntimeError(("Error inside pattern \"{0}\" : " +
                                     "\"{1}\" : {2}")
                                    .format(pattern.name, pattern.value, ree))
+            patternlist.append((pattern, regex, line_local))
+        self._file_pattern[key] = patternlist
+        return patternlist
+
+    @staticmethod
+    def _read_chunks(file_handle):
+        """Read the file content in chunks, which end at a line end"""
+        while True:
+            data = file_handle.read(Analyser.CHUNK_SIZE)
+            if data == "":
+                break
+            if not data.endswith("\n"):
+                data += file_handle.readline()
+            yield data
+
+    @staticmethod
+    def _convert_matches(pattern, regex, matches):
+        """Return the non empty matches of a regex converted to the pattern
+        type"""
+        # If there are different groups reduce result shape
+        if regex.groups > 1:
+            match_list = [group for match in matches for group in match]
+        else:
+            match_list = matches
+        return Analyser._convert_match_list(pattern, match_list)
+
+    @staticmethod
+    def _convert_match_list(pattern, match_list):
+        """Return the non empty matches of match_list converted to the
+        pattern type"""
+        # Remove empty matches
+        match_list = [match for match in match_list if match != ""]
+
+        # Convert to pattern type
+        try:
+            if pattern.content_type == "int":
+                return list(map(int, map(float, match_list)))
+            elif pattern.content_type == "float":
+                return list(map(float, match_list))
+            return match_list
+        except ValueError:
+            # Convert match by match to handle nan and invalid matches
+            pass
+        new_match_list = list()
+        for match in match_list:
+            try:
+                if pattern.content_type == "int":
+                    if match == "nan":
+                        new_match_list.append(float("nan"))
+                    else:
+                        new_match_list.append(int(float(match)))
+                elif pattern.content_type == "float":
+                    new_match_list.append(float(match))
+                else:
+                    new_match_list.append(match)
+            except ValueError:
+                LOGGER.warning(("\"{0}\" cannot be represented " +
+                                "as a \"{1}\"")
+                               .format(match, pattern.content_type))
+        return new_match_list
+
+    @staticmethod
+    def _file_matches(file_path, patternlist):
+        """Scan a file using all (pattern, regex, line_local) tuples of
+        patternlist. For every part of the file a dict is generated, which
+        maps the names of all found pattern to their matches"""
+        # Pattern, whose matches can cross a line end, must see the whole
+        # file at once
+        file_patternlist = [(pattern, regex) for pattern, regex, line_local
+                            in patternlist if not line_local]
+        if len(file_patternlist) > 0:
+            mapped_file = Analyser._map_file(file_path, file_patternlist)
+            if mapped_file is None:
+                file_handle = open(file_path, "r")
+                yield Analyser._data_matches(
+                    file_handle.read(),
+                    [(pattern, regex) for pattern, regex, _ in patternlist])
+                file_handle.close()
+                return
+            for pattern, regex in file_patternlist:
+                for matches in Analyser._mapped_file_matches(
+                        mapped_file, pattern, regex):
+                    yield matches
+            mapped_file.close()
+
+        # All other pattern can scan the file in parts
+        line_patternlist = [(pattern, regex) for pattern, regex, line_local
+                            in patternlist if line_local]
+        if len(line_patternlist) > 0:
+            file_handle = open(file_path, "r")
+            for data in Analyser._read_chunks(file_handle):
+                yield Analyser._data_matches(data, line_patternlist)
+            file_handle.close()
+
+    @staticmethod
+    def _map_file(file_path, patternlist):
+        """Return a read only memory map of the given file, if it can be
+        scanned by bytes versions of all (pattern, regex) tuples of
+        patternlist instead of reading it as text. This is only possible for
+        ASCII files, otherwise None is returned."""
+        if any(jube.util.util.compile_bytes_pattern(
+                regex.pattern, regex.flags) is None
+                for _, regex in patternlist):
+            return None
+        file_handle = open(file_path, "rb")
+        try:
+            mapped_file = mmap.mmap(file_handle.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # e.g. empty files cannot be mapped
+            return None
+        finally:
+            file_handle.close()
+        for pos in range(0, len(mapped_file), Analyser.CHUNK_SIZE):
+            if not mapped_file[pos:pos + Analyser.CHUNK_SIZE].isascii():
+                mapped_file.close()
+                return None
+        if any(mapped_file.find(char) >= 0 for char in _NON_TEXT_ASCII_BYTES):
+            mapped_file.close()
+            return None
+        return mapped_file
+
+    @staticmethod
+    def _mapped_file_matches(mapped_file, pattern, regex):
+        """Scan a memory mapped ASCII file using a bytes version of regex.
+        Only the matched groups are decoded. The matches are generated in
+        parts of up to MATCH_BATCH_SIZE matches."""
+        bytes_regex = jube.util.util.compile_bytes_pattern(regex.pattern,
+                                                           regex.flags)
+        match_iter = bytes_regex.finditer(mapped_file)
+        while True:
+            matches = itertools.islice(match_iter, Analyser.MATCH_BATCH_SIZE)
+            if regex.groups == 0:
+                match_list = list(map(operator.methodcaller("group"), matches))
+            else:
+                match_list = list(itertools.chain.from_iterable(map(
+                    operator.methodcaller("groups", b""), matches)))
+            if len(match_list) == 0:
+                break
+            # Mapped files cannot contain the separator, so all groups can
+            # be decoded at once
+            match_list = Analyser._convert_match_list(
+                pattern, b"\x1f".join(match_list).decode("ascii").split(
+                    "\x1f"))
+            if len(match_list) > 0:
+                yield {pattern.name: Analyser._summarize_matches(
+                    pattern, match_list)}
+
+    @staticmethod
+    def _data_matches(data, patternlist):
+        """Return a dict, which maps the names of all (pattern, regex)
+        tuples of patternlist to their matches found in data"""
+        matches = dict()
+        for pattern, regex in patternlist:
             # Run regular expression
-            matches = re.findall(regex, data)
-            # If there are different groups reduce result shape
-            if regex.groups > 1:
-                match_list = list()
-                for match in matches:
-                    match_list = match_list + list(match)
+            match_list = Analyser._convert_matches(pattern, regex,
+                                                   regex.findall(data))
+            if len(match_list) > 0:
+                matches[pattern.name] = Analyser._summarize_matches(
+                    pattern, match_list)
+        return matches
+
+    @staticmethod
+    def _summarize_matches(pattern, match_list):
+        """Return [cnt, first, last, values] of a non empty list of matches.
+        values contains all matches of numerical pattern, which are needed
+        to calculate the statistic values in the same order as they were
+        found (None for other pattern)."""
+        if pattern.content_type in ["int", "float"]:
+            values = match_list
+        else:
+            values = None
+        return [len(match_list), match_list[0], match_list[-1], values]
+
+    @staticmethod
+    def scan_file(file_path, patternlist):
+        """Scan a file using all (pattern, regex, line_local) tuples of
+        patternlist. Return a dict, which maps the names of all found
+        pattern to their [cnt, first, last, values] matches."""
+        file_matches = dict()
+        for matches in Analyser._file_matches(file_path, patternlist):
+            Analyser._merge_matches(file_matches, matches)
+        return file_matches
+
+    @staticmethod
+    def _merge_matches(file_matches, matches):
+        """Append the matches of a part of a file to the file_matches of the
+        former parts of the same file"""
+        for name, (cnt, first, last, values) in matches.items():
+            if name not in file_matches:
+                file_matches[name] = [cnt, first, last,
+                                      None if values is None
+                                      else list(values)]
             else:
-                match_list = matches
-            # Remove empty matches
-            match_list = [match for match in match_list if match != ""]
-
-            # Convert to pattern type
-            new_match_list = list()
-            for match in match_list:
-                try:
-                    if pattern.content_type == "int":
-                        if match == "nan":
-                            new_match_list.append(float("nan"))
-                        else:
-                            new_match_list.append(int(float(match)))
-                    elif pattern.content_type == "float":
-                        new_match_list.append(float(match))
-                    else:
-                        new_match_list.append(match)
-                except ValueError:
-                    LOGGER.warning(("\"{0}\" cannot be represented " +
-                                    "as a \"{1}\"")
-                                   .format(match, pattern.content_type))
-            match_list = new_match_list
+                file_matches[name][0] += cnt
+                file_matches[name][2] = last
+                if values is not None:
+                    file_matches[name][3] += values
+
+    @staticmethod
+    def _value_cnt(file_matches):
+        """Return the number of numerical matches stored in file_matches"""
+        return sum(len(values) for _, _, _, values in file_matches.values()
+                   if values is not None)
+
+    def _pattern_hash(self, patternlist):
+        """Return a hash of the substituted pattern of patternlist"""
+        key = id(patternlist)
+        if key not in self._pattern_hashes:
+            content = json.dumps([(pattern.name, pattern.content_type,
+                                   regex.pattern, regex.flags)
+                                  for pattern, regex, _ in patternlist])
+            self._pattern_hashes[key] = \
+                hashlib.sha1(content.encode("utf-8")).hexdigest()
+        return self._pattern_hashes[key]
+
+    def _cached_matches(self, file_path, patternlist):
+        """Return the cached matches of the given file, if neither the file
+        nor the pattern were changed since the last analyse (None
+        otherwise), and the key to store new matches of this file."""
+        if self._file_cache is None:
+            return None, None
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None, None
+        cache_key = (os.path.relpath(file_path, self._benchmark.bench_dir),
+                     [file_stat.st_size, file_stat.st_mtime_ns,
+                      file_stat.st_ino],
+                     self._pattern_hash(patternlist))
+        entry = self._cached_files.get(cache_key[0])
+        if not isinstance(entry, dict) or entry.get("stat") != cache_key[1]:
+            return None, cache_key
+        matches = entry.get("matches", dict()).get(cache_key[2])
+        if matches is not None:
+            LOGGER.debug("    use cached matches of file {0}"
+                         .format(file_path))
+            self._store_matches(cache_key, matches)
+        return matches, cache_key
+
+    def _store_matches(self, cache_key, file_matches):
+        """Store the matches of a file in the file cache"""
+        if cache_key is None or \
+                self._value_cnt(file_matches) > self.CACHE_MAX_VALUES:
+            return
+        name, file_stat, pattern_hash = cache_key
+        entry = self._file_cache.get(name)
+        if entry is None or entry["stat"] != file_stat:
+            entry = {"stat": file_stat, "matches": dict()}
+            self._file_cache[name] = entry
+        entry["matches"][pattern_hash] = file_matches
+
+    def _cache_scan(self, matches_iter, cache_key):
+        """Pass through the matches of the parts of a file, which are stored
+        in the file cache afterwards"""
+        file_matches = dict()
+        for matches in matches_iter:
+            if file_matches is not None:
+                self._merge_matches(file_matches, matches)
+                if self._value_cnt(file_matches) > self.CACHE_MAX_VALUES:
+                    file_matches = None
+            yield matches
+        if file_matches is not None:
+            self._store_matches(cache_key, file_matches)
+
+    @staticmethod
+    def _add_matches(pattern_dict, matches, content_type="string"):
+        """Add [cnt, first, last, values] matches to the PatternStatistic of
+        a single pattern. Numerical values are combined one by one in the
+        order they were found, which keeps the exact floating point
+        results. Larger lists of float values are combined by numpy, if it
+        is available."""
+        cnt, first, _, values = matches
+        # First match is default
+        if "first" not in pattern_dict:
+            pattern_dict["first"] = first
+
+        if values is not None:
+            if numpy is not None and content_type == "float" and \
+                    len(values) >= Analyser.NUMPY_MIN_VALUES:
+                Analyser._add_float_values(pattern_dict, values)
+            else:
+                Analyser._add_values(pattern_dict, values)
+            if isinstance(pattern_dict["sum2"], float) and \
+                    math.isinf(pattern_dict["sum2"]) and \
+                    any(isinstance(value, float) and
+                        not math.isinf(value) and math.isinf(value * value)
+                        for value in values):
+                LOGGER.warning(
+                    "Squared sum cannot be represented, " +
+                    "numerical result out of range.")
+                pattern_dict["sum2"] = math.nan
+            pattern_dict.add_values(values)
+
+        if "cnt" in pattern_dict:
+            pattern_dict["cnt"] += cnt
+        else:
+            pattern_dict["cnt"] = cnt
+
+    @staticmethod
+    def _add_values(pattern_dict, values):
+        """Add numerical values to min, max, sum and sum2"""
+        for option, function in (("min", min), ("max", max)):
+            if option in pattern_dict:
+                pattern_dict[option] = function(itertools.chain(
+                    (pattern_dict[option],), values))
+            else:
+                pattern_dict[option] = function(values)
+        if "sum" in pattern_dict:
+            pattern_dict["sum"] = functools.reduce(operator.add, values,
+                                                   pattern_dict["sum"])
+        else:
+            pattern_dict["sum"] = functools.reduce(operator.add, values)
+        squares = map(operator.mul, values, values)
+        if "sum2" in pattern_dict:
+            pattern_dict["sum2"] = functools.reduce(
+                operator.add, squares, pattern_dict["sum2"])
+        else:
+            pattern_dict["sum2"] = functools.reduce(operator.add, squares)
+
+    @staticmethod
+    def _add_float_values(pattern_dict, values):
+        """Add float values to min, max, sum and sum2 using numpy. The
+        results are the same as the results of _add_values."""
+        array = numpy.array(values, dtype=float)
+        for option, function, numpy_function in (
+                ("min", min, numpy.fmin), ("max", max, numpy.fmax)):
+            if option in pattern_dict:
+                start = pattern_dict[option]
+                rest = array
+            else:
+                start = values[0]
+                rest = array[1:]
+            # min and max keep a nan start value and ignore later nan
+            # values
+            if start != start or len(rest) == 0:
+                pattern_dict[option] = start
+                continue
+            value = numpy_function.reduce(rest).item()
+            if value == 0:
+                # The sign of the result depends on the order of the values
+                pattern_dict[option] = functools.reduce(
+                    function, rest.tolist(), start)
+            elif function(start, value) is value:
+                pattern_dict[option] = value
+            else:
+                pattern_dict[option] = start
+        # Cumulative sums add the values in the same order as the serial
+        # sum. Overflows are reported by _add_matches instead of numpy.
+        with numpy.errstate(over="ignore", invalid="ignore"):
+            for option, option_values in (
+                    ("sum", array), ("sum2", numpy.multiply(array, array))):
+                if option in pattern_dict:
+                    option_values = numpy.concatenate(
+                        ([pattern_dict[option]], option_values))
+                pattern_dict[option] = numpy.cumsum(option_values)[-1].item()
+
+    def _analyse_file(self, file_path, patternset, parameterset,
+                      match_dict=None, additional_uses=None,
+                      file_matches=None, cache_key=None):
+        """Scan given files with given pattern and produce a result
+        parameterset. file_matches can contain the result of scan_file, if
+        the file was already scanned. Otherwise the matches of the file are
+        stored in the file cache using cache_key."""
+        if additional_uses is None:
+            additional_uses = set()
+        if match_dict is None:
+            match_dict = dict()
 
-            if len(match_list) > 0:
-                # First match is default
-                if "first" not in match_dict[pattern.name]:
-                    match_dict[pattern.name]["first"] = match_list[0]
+        if not os.path.isfile(file_path):
+            return dict(), match_dict
 
-                for match in match_list:
-                    if pattern.content_type in ["int", "float"]:
-                        if "min" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["min"] = \
-                                min(match_dict[pattern.name]["min"], match)
-                        else:
-                            match_dict[pattern.name]["min"] = match
-                        if "max" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["max"] = \
-                                max(match_dict[pattern.name]["max"], match)
-                        else:
-                            match_dict[pattern.name]["max"] = match
-                        if "sum" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["sum"] += match
-                        else:
-                            match_dict[pattern.name]["sum"] = match
-                        try:
-                            if "sum2" in match_dict[pattern.name]:
-                                match_dict[pattern.name]["sum2"] += match ** 2
-                            else:
-                                match_dict[pattern.name]["sum2"] = match ** 2
-                        except OverflowError:
-                            LOGGER.warning(
-                                "Squared sum cannot be represented, " +
-                                "numerical result out of range.")
-                            match_dict[pattern.name]["sum2"] = math.nan
-
-                    if "cnt" in match_dict[pattern.name]:
-                        match_dict[pattern.name]["cnt"] += 1
-                    else:
-                        match_dict[pattern.name]["cnt"] = 1
-
-                if pattern.content_type in ["int", "float"]:
-                    if match_dict[pattern.name]["cnt"] > 0:
-                        match_dict[pattern.name]["avg"] = \
-                            (match_dict[pattern.name]["sum"] /
-                             match_dict[pattern.name]["cnt"])
-
-                    if match_dict[pattern.name]["cnt"] > 1:
-                        try:
-                            match_dict[pattern.name]["std"] = math.sqrt(
-                                (abs(match_dict[pattern.name]["sum2"] -
-                                     (match_dict[pattern.name]["sum"] ** 2 /
-                                      match_dict[pattern.name]["cnt"])) /
-                                 (match_dict[pattern.name]["cnt"] - 1)))
-                        except OverflowError:
-                            match_dict[pattern.name]["std"] = 0
-                    else:
-                        match_dict[pattern.name]["std"] = 0
+        # Add file specific uses
+        uses = frozenset(additional_uses)
+        patternlist = self._substituted_pattern(patternset, parameterset,
+                                                uses)
 
-                match_dict[pattern.name]["last"] = match_list[-1]
+        content_types = dict()
+        for pattern, _, _ in patternlist:
+            if pattern.name not in match_dict:
+                match_dict[pattern.name] = self.PatternStatistic()
+            content_types[pattern.name] = pattern.content_type
+        # Last match of every pattern found in the current file
+        last_matches = dict()
+
+        if file_matches is None:
+            file_matches = self._file_matches(file_path, patternlist)
+            if cache_key is not None:
+                file_matches = self._cache_scan(file_matches, cache_key)
+        else:
+            file_matches = [file_matches]
+        for matches in file_matches:
+            for name in matches:
+                self._add_matches(match_dict[name], matches[name],
+                                  content_types[name])
+                last_matches[name] = matches[name][2]
+
+        for pattern, _, _ in patternlist:
+            if pattern.name not in last_matches:
+                continue
+            if pattern.content_type in ["int", "float"]:
+                if match_dict[pattern.name]["cnt"] > 0:
+                    match_dict[pattern.name]["avg"] = \
+                        (match_dict[pattern.name]["sum"] /
+                         match_dict[pattern.name]["cnt"])
+
+                match_dict[pattern.name].flush()
+                match_dict[pattern.name]["std"] = \
+                    match_dict[pattern.name].standard_deviation()
+
+            match_dict[pattern.name]["last"] = last_matches[pattern.name]
 
         info_str = "      file \"{0}\" scanned pattern found:\n".format(
             os.path.basename(file_path))
@@ -491,7 +1033,6 @@ class Analyser(object):
              for _name, value in match_dict.items()],
             indent=9, align_right=True, auto_linebreak=True)
         LOGGER.debug(info_str)
-        file_handle.close()
 
         # Create result dict
         result_dict = dict()
@@ -22,8 +22,8 @@ from __future__ import (print_function,
                         division)
 
 import multiprocessing as mp
+import queue
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as DOM
 import logging
 import os
 import re
@@ -31,6 +31,8 @@ import stat
 import pprint
 import shutil
 import itertools
+import json
+import time
 import jube.parameter
 import jube.util.util
 import jube.util.output
@@ -64,6 +66,18 @@ class Benchmark(object):
             result.benchmark = self
         self._workpackages = dict()
         self._work_stat = jube.util.util.WorkStat()
+        # In-memory workpackage status table, see workpackage_status
+        self._status = None
+        self._workpackage_states = dict()
+        # Barriers of shared operations per step name
+        self._shared_barriers = dict()
+        # Workpackages changed since the last journal update
+        self._changed_workpackages = dict()
+        self._journal_entries = 0
+        # Waiting workpackages per watched file path and watched file paths
+        # per workpackage, only available while running in watch mode
+        self._watched_files = None
+        self._watched_workpackages = None
         self._comment = comment
         self._id = -1
         self._file_path_ref = file_path_ref
@@ -161,6 +175,11 @@ class Benchmark(object):
         if stepname in self._workpackages and \
                 workpackage_to_delete in self._workpackages[stepname]:
             self._workpackages[stepname].remove(workpackage_to_delete)
+            if self._status is not None and \
+                    workpackage_to_delete.id in self._workpackage_states:
+                self._status[stepname]["all"] -= 1
+                self._status[stepname][self._workpackage_states.pop(
+                    workpackage_to_delete.id)] -= 1
 
     @property
     def work_stat(self):
@@ -185,25 +204,79 @@ class Benchmark(object):
     @property
     def workpackage_status(self):
         """Retun workpackage information dict"""
+        if self._status is None:
+            self._reconcile_workpackage_status()
         result_dict = dict()
         for stepname in self._workpackages:
-            result_dict[stepname] = {"all": 0,
-                                     "open": 0,
-                                     "wait": 0,
-                                     "error": 0,
-                                     "done": 0}
-            for workpackage in self._workpackages[stepname]:
-                result_dict[stepname]["all"] += 1
-                if workpackage.done:
-                    result_dict[stepname]["done"] += 1
-                elif workpackage.error:
-                    result_dict[stepname]["error"] += 1
-                elif workpackage.started:
-                    result_dict[stepname]["wait"] += 1
-                else:
-                    result_dict[stepname]["open"] += 1
+            if stepname in self._status:
+                result_dict[stepname] = dict(self._status[stepname])
+            else:
+                result_dict[stepname] = {"all": 0,
+                                         "open": 0,
+                                         "wait": 0,
+                                         "error": 0,
+                                         "done": 0}
         return result_dict
 
+    @staticmethod
+    def _workpackage_state(workpackage):
+        """Return status table category of given workpackage"""
+        if workpackage.done:
+            return "done"
+        elif workpackage.error:
+            return "error"
+        elif workpackage.started:
+            return "wait"
+        else:
+            return "open"
+
+    def _reconcile_workpackage_status(self):
+        """Build status table by checking all workpackages"""
+        self._status = dict()
+        self._workpackage_states = dict()
+        for workpackages in self._workpackages.values():
+            for workpackage in workpackages:
+                self.update_workpackage_status(workpackage)
+
+    def shared_operation_barrier(self, step, operation_number, cycle):
+        """Return the barrier of the given shared operation of a step in
+        the given cycle. The barrier is created on first request."""
+        barriers = self._shared_barriers.setdefault(step.name, dict())
+        if (operation_number, cycle) not in barriers:
+            barriers[(operation_number, cycle)] = \
+                jube.workpackage.SharedOperationBarrier(
+                    self, step, operation_number, cycle)
+        return barriers[(operation_number, cycle)]
+
+    def update_workpackage_status(self, workpackage):
+        """Update the status table entry of given workpackage. Must be
+        called whenever the state of a workpackage changes."""
+        if workpackage.done:
+            # a finished workpackage passed all shared operations
+            for barrier in self._shared_barriers.get(
+                    workpackage.step.name, dict()).values():
+                barrier.arrive(workpackage)
+        if self._status is None:
+            # Table will be build by a full scan once it is needed
+            return
+        new_state = Benchmark._workpackage_state(workpackage)
+        old_state = self._workpackage_states.get(workpackage.id)
+        if new_state == old_state:
+            return
+        stepname = workpackage.step.name
+        if stepname not in self._status:
+            self._status[stepname] = {"all": 0,
+                                      "open": 0,
+                                      "wait": 0,
+                                      "error": 0,
+                                      "done": 0}
+        if old_state is None:
+            self._status[stepname]["all"] += 1
+        else:
+            self._status[stepname][old_state] -= 1
+        self._status[stepname][new_state] += 1
+        self._workpackage_states[workpackage.id] = new_state
+
     @property
     def benchmark_status(self):
         """Retun global workpackage information dict"""
@@ -326,6 +399,8 @@ class Benchmark(object):
         structure."""
         self._workpackages = dict()
         self._work_stat = jube.util.util.WorkStat()
+        self._status = None
+        self._shared_barriers = dict()
 
         # Create workpackage storage
         for step_name in self._steps:
@@ -341,22 +416,36 @@ class Benchmark(object):
                     workpackage.queued = True
                     self._work_stat.put(workpackage)
 
-    def analyse(self, show_info=True, specific_analyser_name=None):
-        """Run analyser"""
+    def analyse(self, show_info=True, specific_analyser_name=None,
+                procs=None):
+        """Run analyser, procs overwrites the number of processes used by
+        the analysers"""
 
         if show_info:
             LOGGER.info(">>> Start analyse")
 
         if specific_analyser_name is not None and \
                 specific_analyser_name in self._analyser:
-            self._analyser[specific_analyser_name].analyse()
+            analysers = [self._analyser[specific_analyser_name]]
         else:
-            for analyser in self._analyser.values():
-                analyser.analyse()
-        if ((not jube.conf.DEBUG_MODE) and
-                (os.access(self.bench_dir, os.W_OK))):
+            analysers = self._analyser.values()
+        # Matches of files scanned by a former analyse
+        use_cache = ((not jube.conf.DEBUG_MODE) and
+                     (os.access(self.bench_dir, os.W_OK)))
+        cache_filename = os.path.join(self.bench_dir,
+                                      jube.conf.ANALYSE_CACHE_FILENAME)
+        if use_cache:
+            file_cache = self._read_analyse_cache(cache_filename)
+        for analyser in analysers:
+            if use_cache:
+                analyser.analyse(procs, file_cache.get(analyser.name, dict()))
+                file_cache[analyser.name] = analyser.file_cache
+            else:
+                analyser.analyse(procs)
+        if use_cache:
             self.write_analyse_data(os.path.join(self.bench_dir,
                                                  jube.conf.ANALYSE_FILENAME))
+            self._write_analyse_cache(cache_filename, file_cache)
         if show_info:
             LOGGER.info(">>> Analyse finished")
 
@@ -442,13 +531,35 @@ class Benchmark(object):
             analyser_etree.attrib["name"] = analyser_name
             for etree in self._analyser[analyser_name].analyse_etree_repr():
                 analyser_etree.append(etree)
-        xml = jube.util.output.element_tree_tostring(
-            analyse_etree, encoding="UTF-8")
-        # Using dom for pretty-print
-        dom = DOM.parseString(xml.encode("UTF-8"))
-        fout = open(filename, "wb")
-        fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
-        fout.close()
+        jube.util.output.write_pretty_xml(filename, analyse_etree)
+
+    def _read_analyse_cache(self, filename):
+        """Read the file matches of a former analyse, stored per
+        analyser name"""
+        if not os.path.isfile(filename):
+            return dict()
+        try:
+            with open(filename, "r") as file_handle:
+                file_cache = json.load(file_handle)
+        except (OSError, ValueError):
+            # Ignore an incomplete or unreadable cache, all files are
+            # scanned again
+            LOGGER.debug("Analyse cache {0} cannot be read".format(filename))
+            return dict()
+        if not isinstance(file_cache, dict):
+            return dict()
+        return dict((name, analyser_cache)
+                    for name, analyser_cache in file_cache.items()
+                    if name in self._analyser and
+                    isinstance(analyser_cache, dict))
+
+    @staticmethod
+    def _write_analyse_cache(filename, file_cache):
+        """Write the file matches of the current analyse"""
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "w") as file_handle:
+            json.dump(file_cache, file_handle)
+        os.replace(temp_filename, filename)
 
     def _create_new_workpackages_for_workpackage(self, workpackage):
         """Create and return new workpackages if given workpackage
@@ -490,6 +601,10 @@ class Benchmark(object):
                         parent.add_children(new_workpackage)
 
                 self._workpackages[dependent_step.name] += new_workpackages
+                for new_workpackage in new_workpackages:
+                    self.update_workpackage_status(new_workpackage)
+                    self._changed_workpackages[new_workpackage.id] = \
+                        new_workpackage
                 all_new_workpackages += new_workpackages
             if possible_combination > 0:
                 LOGGER.debug(("  {0} workpackages combinations were skipped"
@@ -552,6 +667,7 @@ class Benchmark(object):
                                     update_mode=jube.parameter.JUBE_MODE):
                                 workpackage.iteration_siblings.add(child)
                                 child.iteration_siblings.add(workpackage)
+                                self._changed_workpackages[child.id] = child
 
         return new_workpackages
 
@@ -565,6 +681,9 @@ class Benchmark(object):
         LOGGER.debug("Create benchmark directory")
         self._create_bench_dir()
 
+        # Start with an empty script evaluation cache
+        self.reset_script_cache()
+
         # Change logfile
         jube.log.change_logfile_name(os.path.join(
             self.bench_dir, jube.conf.LOGFILE_RUN_NAME))
@@ -592,8 +711,20 @@ class Benchmark(object):
 
         self.run()
 
-    def run(self):
-        """Run benchmark"""
+    def reset_script_cache(self):
+        """Reset the script evaluation cache. If the cache scope is
+        "benchmark", the results stored inside the benchmark directory are
+        loaded."""
+        jube.util.util.SCRIPT_CACHE.clear()
+        if jube.util.util.script_cache_scope() == "benchmark":
+            jube.util.util.SCRIPT_CACHE.filename = os.path.join(
+                self.bench_dir, jube.conf.SCRIPT_CACHE_FILENAME)
+
+    def run(self, watch=None):
+        """Run benchmark. If watch is given, the benchmark stays loaded and
+        the done_files (and error_files/break_files) of pending workpackages
+        are checked every watch seconds until no workpackage is waiting
+        anymore."""
         title = "benchmark: {0}".format(self._name)
         title += "\nid: {0}".format(self._id)
         if jube.conf.DEBUG_MODE:
@@ -608,93 +739,99 @@ class Benchmark(object):
             jube.util.output.print_loading_bar(
                 status["done"], status["all"], status["wait"], status["error"])
 
-        # Handle all workpackages in given order
-        while not self._work_stat.empty():
-            workpackage = self._work_stat.get()
-
-            run_parallel = False
-
-            def collect_result(val):
-                """used collect return values from pool.apply_async"""
-                # run postprocessing of each wp
-                for i, wp in enumerate(self._workpackages[val["step_name"]]):
-                    if wp.id == val["id"]:
-                        if(len(val) == 2):  # workpackage is done or its execution was erroneous
-                            pass
-                        else:
-                            # update corresponding wp in self._workpackage with modified wp
-                            wp.env = val["env"]
-                            # restore the parameters containing a method of a class,
-                            # which needed to be deleted within the multiprocess
-                            # execution to avoid excessive memory usage
-                            for p in wp._parameterset.all_parameters:
-                                if(p.search_method(propertyString="eval_helper",
-                                                   recursiveProperty="based_on")):
-                                    val["parameterset"].add_parameter(p)
-                            wp.parameterset = val["parameterset"]
-                            wp.cycle = val["cycle"]
-                        self.wp_post_run_config(wp)
+        # Worker pool shared by all steps using procs > 1. It is created on
+        # first use and kept alive until the whole run is finished, so
+        # workpackages of different steps can be executed concurrently.
+        pool = None
+        pool_size = max([step.procs for step in self._steps.values()] + [1])
+        # save current logfile name to restore logs in the right logfile
+        current_logfile_name = jube.log.LOGFILE_NAME
+        # finished parallel executions, filled by the pool callbacks
+        finished = queue.Queue()
+        # number of running parallel workpackages per step
+        running = dict()
+        # parallel workpackages waiting for a free process of their step
+        waiting = dict()
+        # queued workpackages, which were released by another parallel
+        # workpackage in the meantime and must run again
+        rerun = set()
+        # parallel workpackages, which must pass a shared operation inside
+        # of the main process
+        serial = set()
+        if watch is not None:
+            self._start_watching()
+
+        try:
+            while True:
+                # Handle all workpackages in given order
+                while not self._work_stat.empty():
+                    workpackage = self._work_stat.get()
+                    if workpackage.done or workpackage.step.procs <= 1 or \
+                            workpackage in serial:
+                        serial.discard(workpackage)
+                        if not workpackage.done:
+                            workpackage.run()
+                        self.wp_post_run_config(workpackage)
+                        # Store workpackage information
+                        self._store_workpackage_information(workpackage)
+                    else:
+                        # procs limits the number of concurrently running
+                        # workpackages of a single step
+                        name = workpackage.step.name
+                        if running.get(name, 0) >= workpackage.step.procs:
+                            waiting.setdefault(name, list()).append(
+                                workpackage)
+                            continue
+                        if pool is None:
+                            pool = mp.Pool(processes=pool_size)
+                        running[name] = running.get(name, 0) + 1
+                        pool.apply_async(
+                            workpackage.run, args=('p',),
+                            callback=lambda val, wp=workpackage:
+                            finished.put((wp, val)),
+                            error_callback=lambda e, wp=workpackage:
+                            finished.put((wp, e)))
+
+                    # Collect parallel workpackages finished in the meantime
+                    while not finished.empty():
+                        self._collect_parallel_result(
+                            finished.get(), running, waiting, rerun,
+                            serial)
+
+                if sum(running.values()) == 0:
+                    if watch is None or \
+                            not self._wait_for_watched_files(watch):
                         break
-
-            def log_e(e):
-                """used to print error_callback from pool.apply_async"""
-                print(e)
-            # TODO
-            # writeXML position(y) - replace by database
-            # TODO END
-            if not workpackage.done:
-                # execute wps in parallel which have the same name
-                if workpackage.step.procs > 1:
-                    run_parallel = True
-                    procs = workpackage.step.procs
-                    name = workpackage.step.name
-                    pool = mp.Pool(processes=procs)
-
-                    # save current logfile name to restore logs in the right logfile
-                    current_logfile_name = jube.log.LOGFILE_NAME
-
-                    # add wps to the parallel pool as long as they have the same name
-                    while True:
-                        pool.apply_async(workpackage.run, args=('p',),
-                                         callback=collect_result, error_callback=log_e)
-
-                        if not self._work_stat.empty():
-                            workpackage = self._work_stat.get()
-                            # push back as first element of _work_stat and
-                            # terminate parallel loop
-                            if workpackage.step.name != name:
-                                self._work_stat.push_back(workpackage)
-                                break
-                        else:
-                            break
-
-                    pool.close()
-                    pool.join()
-                else:
-                    workpackage.run()
-
-            if run_parallel == True:
-                # merge parallel run log files into the main run log file and
-                # delete the parallel logs
-                log_fname = jube.log.LOGFILE_NAME.split('/')[-1]
-                filenames = [file for file in os.listdir(self.bench_dir)
-                             if file.startswith(log_fname.split('.')[0]) and
-                             file != log_fname]
-                filenames.sort(key=lambda o: int(re.split('_|\.', o)[1]))
-                with open(current_logfile_name, 'a') as outfile:
-                    for fname in filenames:
-                        with open(os.path.join(self.bench_dir, fname), 'r') as infile:
-                            contents = infile.read()
-                            outfile.write(contents)
-                        os.remove(os.path.join(self.bench_dir, fname))
-
-                run_parallel = False
-            else:
-                self.wp_post_run_config(workpackage)
-
-            # Store workpackage information
-            self.write_workpackage_information(
-                os.path.join(self.bench_dir, jube.conf.WORKPACKAGES_FILENAME))
+                    continue
+                # Nothing left to start, wait for the next parallel result
+                self._collect_parallel_result(finished.get(), running,
+                                              waiting, rerun, serial)
+        finally:
+            self._watched_files = None
+            self._watched_workpackages = None
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if pool is not None:
+            # merge parallel run log files into the main run log file and
+            # delete the parallel logs
+            log_fname = jube.log.LOGFILE_NAME.split('/')[-1]
+            filenames = [file for file in os.listdir(self.bench_dir)
+                         if file.startswith(log_fname.split('.')[0]) and
+                         file != log_fname]
+            filenames.sort(key=lambda o: int(re.split('_|\.', o)[1]))
+            with open(current_logfile_name, 'a') as outfile:
+                for fname in filenames:
+                    with open(os.path.join(self.bench_dir, fname),
+                              'r') as infile:
+                        contents = infile.read()
+                        outfile.write(contents)
+                    os.remove(os.path.join(self.bench_dir, fname))
+
+        # Compact workpackage journal
+        self.write_workpackage_information(
+            os.path.join(self.bench_dir, jube.conf.WORKPACKAGES_FILENAME))
 
         print("\n")
         status_data = [("stepname", "all", "open", "wait", "error", "done")]
@@ -726,11 +863,148 @@ class Benchmark(object):
                      "--id {1}").format(self._outpath, self._id))
         LOGGER.info(jube.util.output.text_line() + "\n")
 
+    def _start_watching(self):
+        """Collect the watched files of all waiting workpackages. Afterwards
+        only executed or requeued workpackages are checked again."""
+        self._watched_files = dict()
+        self._watched_workpackages = dict()
+        for workpackages in self._workpackages.values():
+            for workpackage in workpackages:
+                self._update_watched_files(workpackage)
+
+    def _update_watched_files(self, workpackage):
+        """Update the watched files of a workpackage, which was executed or
+        requeued. Queued workpackages are not watched until they were
+        executed. Already existing files (e.g. a break_file, which does not
+        finish the waiting) are not watched again."""
+        if self._watched_files is None:
+            return
+        for path in self._watched_workpackages.pop(workpackage, list()):
+            workpackages = self._watched_files[path]
+            workpackages.remove(workpackage)
+            if len(workpackages) == 0:
+                del self._watched_files[path]
+        if workpackage.queued:
+            return
+        paths = set(path for path in workpackage.pending_watch_files()
+                    if not os.path.exists(path))
+        if len(paths) > 0:
+            self._watched_workpackages[workpackage] = paths
+            for path in paths:
+                self._watched_files.setdefault(path, list()).append(
+                    workpackage)
+
+    def _wait_for_watched_files(self, interval):
+        """Wait until at least one done_file, error_file or break_file of
+        the waiting workpackages exists and requeue all workpackages
+        waiting for the available files. Every interval seconds each
+        directory containing watched files is listed only once. Return False
+        if no workpackage is waiting for a done_file."""
+        if len(self._watched_files) == 0:
+            return False
+
+        directories = dict()
+        for path in self._watched_files:
+            directories.setdefault(os.path.dirname(path), set()).add(
+                os.path.basename(path))
+        LOGGER.debug("Watching {0} file(s) in {1} directories".format(
+            len(self._watched_files), len(directories)))
+
+        available = list()
+        try:
+            while True:
+                for directory, filenames in directories.items():
+                    try:
+                        found = filenames.intersection(os.listdir(directory))
+                    except OSError:
+                        continue
+                    available += [os.path.join(directory, filename)
+                                  for filename in found]
+                if len(available) > 0:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            LOGGER.info("\nStop watching pending workpackages")
+            return False
+
+        workpackages = list()
+        for path in available:
+            workpackages += self._watched_files[path]
+        workpackages = list(dict.fromkeys(workpackages))
+        self._work_stat.put_all(workpackages)
+        for workpackage in workpackages:
+            self._update_watched_files(workpackage)
+        return True
+
+    def _collect_parallel_result(self, result, running, waiting, rerun,
+                                 serial):
+        """Handle a workpackage executed by the worker pool. result is a
+        tuple of the workpackage and the return value (or raised exception)
+        of its run method. rerun contains all queued workpackages, which
+        were released by another worker process and must run again.
+        Workpackages stopped at a shared operation are added to serial."""
+        workpackage, val = result
+        # workpackage state was changed by another process
+        workpackage.reconcile_state()
+        name = workpackage.step.name
+        running[name] -= 1
+        # free process slot can be used by the next waiting workpackage
+        if len(waiting.get(name, list())) > 0:
+            self._work_stat.push_back(waiting[name].pop(0))
+
+        if isinstance(val, BaseException):
+            print(val)
+            return
+
+        if len(val) > 2:
+            # update the workpackage with the state of the finished
+            # execution
+            workpackage.env = val["env"]
+            # restore the parameters containing a method of a class,
+            # which needed to be deleted within the multiprocess
+            # execution to avoid excessive memory usage
+            for p in workpackage.parameterset.all_parameters:
+                if(p.search_method(propertyString="eval_helper",
+                                   recursiveProperty="based_on")):
+                    val["parameterset"].add_parameter(p)
+            workpackage.parameterset = val["parameterset"]
+            workpackage.cycle = val["cycle"]
+        self.wp_post_run_config(workpackage)
+
+        # Store workpackage information
+        self._store_workpackage_information(workpackage)
+
+        # Only workpackages released by the worker process were changed by
+        # it, their requeue done inside of the worker process is lost.
+        # Shared operations are executed by the main process, so this list
+        # is usually empty.
+        released_ids = set(val.get("released", list()))
+        released = [other for other in self._workpackages[name]
+                    if other.id in released_ids] if released_ids else list()
+        for other in released:
+            other.reconcile_state()
+            self.update_workpackage_status(other)
+            if other.queued:
+                rerun.add(other)
+        self._work_stat.put_all(released)
+
+        if val.get("shared_pending", False):
+            # the main process executes the shared operation or waits for
+            # the remaining workpackages
+            rerun.discard(workpackage)
+            serial.add(workpackage)
+            self._work_stat.put_all([workpackage])
+        elif workpackage in rerun:
+            rerun.remove(workpackage)
+            if not workpackage.done:
+                self._work_stat.put_all([workpackage])
+
     def wp_post_run_config(self, workpackage):
         """additional processing of workpackage:
         - update status bar
         - build up queue after restart
         """
+        self.update_workpackage_status(workpackage)
         self._create_new_workpackages_for_workpackage(workpackage)
 
         # Update queues (move waiting workpackages to work queue
@@ -746,17 +1020,10 @@ class Benchmark(object):
                 status["done"], status["all"], status["wait"],
                 status["error"])
         workpackage.queued = False
+        self._update_watched_files(workpackage)
 
-        for mode in ("only_started", "all"):
-            for child in workpackage.children:
-                all_done = True
-                for parent in child.parents:
-                    all_done = all_done and parent.done
-                if all_done:
-                    if (mode == "only_started" and child.started) or \
-                            (mode == "all" and (not child.queued)):
-                        child.queued = True
-                        self._work_stat.put(child)
+        # Queue all children, whose parents are finished now
+        self._work_stat.put_all(self._work_stat.finish(workpackage))
 
     def _create_bench_dir(self):
         """Create the directory for a benchmark."""
@@ -812,13 +1079,7 @@ class Benchmark(object):
             benchmark_etree.attrib["outpath"] = outpath
 
         benchmarks_etree.append(benchmark_etree)
-        xml = jube.util.output.element_tree_tostring(
-            benchmarks_etree, encoding="UTF-8")
-        # Using dom for pretty-print
-        dom = DOM.parseString(xml.encode('UTF-8'))
-        fout = open(filename, "wb")
-        fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
-        fout.close()
+        jube.util.output.write_pretty_xml(filename, benchmarks_etree)
 
     def reset_all_workpackages(self):
         """Reset workpackage state"""
@@ -826,26 +1087,75 @@ class Benchmark(object):
             for workpackage in workpackages:
                 workpackage.done = False
 
+    def _store_workpackage_information(self, workpackage):
+        """Store information of the given (processed) workpackage and all
+        other changed workpackages by appending them to the workpackage
+        journal. The journal is compacted into the workpackage file, once
+        it contains more entries than there are workpackages, which keeps
+        the costs per stored workpackage constant."""
+        self._changed_workpackages[workpackage.id] = workpackage
+        with open(os.path.join(self.bench_dir,
+                               jube.conf.WORKPACKAGES_JOURNAL_FILENAME),
+                  "a") as journal:
+            for changed_workpackage in self._changed_workpackages.values():
+                journal.write(json.dumps(
+                    {"id": changed_workpackage.id,
+                     "workpackage": ET.tostring(
+                         changed_workpackage.etree_repr(),
+                         encoding="unicode")}) + "\n")
+        self._journal_entries += len(self._changed_workpackages)
+        self._changed_workpackages = dict()
+
+        workpackage_cnt = sum([len(workpackages) for workpackages in
+                               self._workpackages.values()])
+        if self._journal_entries > \
+                max(workpackage_cnt,
+                    jube.conf.WORKPACKAGES_JOURNAL_MIN_ENTRIES):
+            self.write_workpackage_information(
+                os.path.join(self.bench_dir, jube.conf.WORKPACKAGES_FILENAME))
+
     def write_workpackage_information(self, filename):
         """All workpackage information will be written to given file
-        using xml representation"""
-        # Create root-tag and append workpackages
-        workpackages_etree = ET.Element("workpackages")
-        for workpackages in self._workpackages.values():
-            for workpackage in workpackages:
-                workpackages_etree.append(workpackage.etree_repr())
-        xml = jube.util.output.element_tree_tostring(
-            workpackages_etree, encoding="UTF-8")
-        # Using dom for pretty-print
-        dom = DOM.parseString(xml.encode("UTF-8"))
-        fout = open(filename, "wb")
-        fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
-        fout.close()
+        using xml representation. An existing workpackage journal in the
+        same directory becomes obsolete and is removed."""
+        # Create root-tag and stream all workpackages
+        jube.util.output.write_pretty_xml(
+            filename + ".tmp", ET.Element("workpackages"),
+            (workpackage.etree_repr()
+             for workpackages in self._workpackages.values()
+             for workpackage in workpackages))
+        os.replace(filename + ".tmp", filename)
+
+        journal_filename = os.path.join(
+            os.path.dirname(filename),
+            jube.conf.WORKPACKAGES_JOURNAL_FILENAME)
+        if os.path.exists(journal_filename):
+            os.remove(journal_filename)
+        self._changed_workpackages = dict()
+        self._journal_entries = 0
 
     def set_workpackage_information(self, workpackages, work_stat):
         """Set new workpackage information"""
         self._workpackages = workpackages
         self._work_stat = work_stat
+        self.reconcile_workpackage_states()
+        # Status table is reconciled with the filesystem on next request
+        self._status = None
+        self._shared_barriers = dict()
+
+    def reconcile_workpackage_states(self):
+        """Synchronise the cached state of all workpackages with the
+        filesystem. The benchmark directory is scanned once, only existing
+        workpackage directories are scanned afterwards."""
+        try:
+            existing_dirs = set(os.listdir(self.bench_dir))
+        except FileNotFoundError:
+            existing_dirs = set()
+        for workpackages in self._workpackages.values():
+            for workpackage in workpackages:
+                workpackage.reconcile_state(
+                    scan=os.path.basename(workpackage.workpackage_dir) in
+                    existing_dirs)
 
     @property
     def bench_dir(self):
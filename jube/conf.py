@@ -33,6 +33,16 @@ UPDATE_VERSION_URL = "http://apps.fz-juelich.de/jsc/jube/source/version"
 UPDATE_URL = "http://apps.fz-juelich.de/jsc/jube/source/download.php"
 STANDARD_SHELL = "/bin/sh"
 EXIT_ON_ERROR = False
+# cache results of shell and perl parameter evaluations: "none", "run"
+# (in memory) or "benchmark" (stored inside the benchmark directory),
+# can be overwritten by the environment variable JUBE_SCRIPT_CACHE, single
+# parameters can enable the cache by cache="true"
+SCRIPT_CACHE = "none"
+SCRIPT_CACHE_SCOPES = ("none", "run", "benchmark")
+# number of processes used to create the workpackages of a step (1 creates
+# them serially), can be overwritten by the environment variable
+# JUBE_CREATION_PROCS
+CREATION_PROCS = 1
 
 # input/output
 DEFAULT_SEPARATOR = ","
@@ -40,8 +50,13 @@ ZERO_FILL_DEFAULT = 6
 DEFAULT_WIDTH = 70
 MAX_TABLE_CELL_WIDTH = 40
 HIDE_ANIMATIONS = False
-VERBOSE_STDOUT_READ_CHUNK_SIZE = 50
-VERBOSE_STDOUT_POLL_SLEEP = 0.05
+PROCESS_READ_CHUNK_SIZE = 65536
+# timeout (in seconds) to check if a process was finished, while waiting
+# for its output
+PROCESS_POLL_TIMEOUT = 0.05
+# pass the environment of a finished "do" by using "env -0" and a pipe,
+# if supported (otherwise the ENVIRONMENT_INFO file is used)
+ENVIRONMENT_PIPE = True
 SYSLOG_FMT_STRING = "jube[%(process)s]: %(message)s"
 PREPROCESS_MAX_ITERATION = 10
 
@@ -51,7 +66,10 @@ WORKPACKAGE_ERROR_FILENAME = "error"
 DO_LOG_FILENAME = "do_log"
 CONFIGURATION_FILENAME = "configuration.xml"
 WORKPACKAGES_FILENAME = "workpackages.xml"
+WORKPACKAGES_JOURNAL_FILENAME = "workpackages_journal.jsonl"
+SCRIPT_CACHE_FILENAME = "script_cache.jsonl"
 ANALYSE_FILENAME = "analyse.xml"
+ANALYSE_CACHE_FILENAME = "analyse_cache.json"
 RESULT_DIRNAME = "result"
 ENVIRONMENT_INFO = "jube_environment_information.dat"
 TIMESTAMPS_INFO = "timestamps"
@@ -72,3 +90,9 @@ DEFAULT_LOGGING_MODE = "default"
 # other
 ERROR_MSG_LINES = 5
 MAX_RECURSIVE_SUB = 5
+# minimum number of journal entries before the workpackage journal is
+# compacted into the workpackage file
+WORKPACKAGES_JOURNAL_MIN_ENTRIES = 1000
+# default interval (in seconds) between two done_file checks of
+# "jube continue --watch"
+WATCH_POLL_INTERVAL = 5
@@ -43,6 +43,7 @@ import sys
 import re
 import copy
 import hashlib
+import json
 import jube.log
 from jube.util.version import StrictVersion
 
@@ -482,8 +483,12 @@ class Parser(object):
             raise IOError("Workpackage configuration file not found: \"{0}\""
                           .format(self._filename))
         tree = ET.parse(self._filename)
+        elements = Parser._replay_workpackage_journal(
+            list(tree.getroot()),
+            os.path.join(os.path.dirname(self._filename),
+                         jube.conf.WORKPACKAGES_JOURNAL_FILENAME))
         max_id = -1
-        for element in tree.getroot():
+        for element in elements:
             Parser._check_tag(element, ["workpackage"])
             # Read XML-data
             (workpackage_id, step_name, parameterset, parents,
@@ -581,19 +586,37 @@ class Parser(object):
         work_stat = jube.util.util.WorkStat()
         for step_name in benchmark.steps:
             workpackages[step_name] = list()
-        # First put started wps inside the queue
-        for mode in ("only_started", "all"):
-            for workpackage in tmp.values():
-                if len(workpackage.parents) == 0:
-                    if (mode == "only_started" and workpackage.started) or \
-                       (mode == "all" and (not workpackage.queued)):
-                        workpackage.queued = True
-                        work_stat.put(workpackage)
-                if mode == "all":
-                    workpackages[workpackage.step.name].append(workpackage)
+        for workpackage in tmp.values():
+            workpackages[workpackage.step.name].append(workpackage)
+        # Queue all root workpackages, started ones first
+        work_stat.put_all([workpackage for workpackage in tmp.values()
+                           if len(workpackage.parents) == 0])
 
         return workpackages, work_stat
 
+    @staticmethod
+    def _replay_workpackage_journal(elements, journal_filename):
+        """Apply the entries of the workpackage journal to the given list
+        of workpackage etree elements. Later entries replace earlier ones
+        with the same id, new workpackages are appended."""
+        if not os.path.isfile(journal_filename):
+            return elements
+        LOGGER.debug("Replaying {0}".format(journal_filename))
+        elements_by_id = dict()
+        for element in elements:
+            elements_by_id[int(element.get("id"))] = element
+        with open(journal_filename, "r") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Incomplete last entry of an interrupted run
+                    LOGGER.debug("Skip incomplete journal entry")
+                    break
+                elements_by_id[int(entry["id"])] = \
+                    ET.fromstring(entry["workpackage"])
+        return list(elements_by_id.values())
+
     @staticmethod
     def _extract_workpackage_data(workpackage_etree):
         """Extract workpackage information from etree
@@ -921,6 +944,8 @@ class Parser(object):
         do_log_file = None if do_log_file == "false" else do_log_file
         do_log_file = jube.conf.DO_LOG_FILENAME if do_log_file == "True" else do_log_file
         do_log_file = jube.conf.DO_LOG_FILENAME if do_log_file == "true" else do_log_file
+        shell_session = etree_step.get("shell_session",
+                                       "false").strip().lower() == "true"
         shared_name = etree_step.get("shared")
         if shared_name is not None:
             shared_name = shared_name.strip()
@@ -932,7 +957,7 @@ class Parser(object):
 
         step = jube.step.Step(name, depend, iterations, alt_work_dir,
                                shared_name, export, max_wps, active, suffix,
-                               cycles, procs, do_log_file)
+                               cycles, procs, do_log_file, shell_session)
         for element in etree_step:
             Parser._check_tag(element, valid_tags)
             if element.tag == "do":
@@ -1009,7 +1034,8 @@ class Parser(object):
                                               "name").strip()
         reduce_iteration = \
             etree_analyser.get("reduce", "true").strip().lower() == "true"
-        analyser = jube.analyser.Analyser(name, reduce_iteration)
+        procs = int(etree_analyser.get("procs", "1").strip())
+        analyser = jube.analyser.Analyser(name, reduce_iteration, procs)
         LOGGER.debug("  Parsing <analyser name=\"{0}\">".format(name))
         for element in etree_analyser:
             Parser._check_tag(element, valid_tags)
@@ -1417,6 +1443,11 @@ class Parser(object):
                     .format(parameter_update_mode, name))
             export_str = param.get("export", default="false").strip()
             export = export_str.lower() == "true"
+            cache_str = param.get("cache")
+            if cache_str is None:
+                cache = None
+            else:
+                cache = cache_str.strip().lower() == "true"
 
             duplicate = param.get("duplicate", "none").strip()
             if duplicate is None:
@@ -1456,7 +1487,8 @@ class Parser(object):
                 jube.parameter.Parameter.create_parameter(
                     name, value, separator, parameter_type, selected_value,
                     parameter_mode, parameter_unit, export, update_mode=parameter_update_mode,
-                    idx=idx, eval_helper=None, fixed=False, duplicate=duplicate)
+                    idx=idx, eval_helper=None, fixed=False, duplicate=duplicate,
+                    cache=cache)
             parameters.append(parameter)
         return parameters
 
@@ -613,7 +613,11 @@ def _continue_benchmark(benchmark_folder, args):
         benchmark_folder, jube.conf.LOGFILE_CONTINUE_NAME))
 
     # Run existing benchmark
-    benchmark.run()
+    benchmark.reset_script_cache()
+    if args.watch:
+        benchmark.run(watch=args.interval)
+    else:
+        benchmark.run()
 
     # Run analyse
     if args.analyse or args.result:
@@ -652,7 +656,7 @@ def _analyse_benchmark(benchmark_folder, args):
     LOGGER.info(jube.util.output.text_boxed(
         ("Analyse benchmark \"{0}\" id: {1}").format(benchmark.name,
                                                      benchmark.id)))
-    benchmark.analyse()
+    benchmark.analyse(procs=args.procs)
     if os.path.isfile(
             os.path.join(benchmark_folder, jube.conf.ANALYSE_FILENAME)):
         LOGGER.info(">>> Analyse data storage: {0}".format(os.path.join(
@@ -883,7 +887,15 @@ def gen_subparser_conf():
             ("-a", "--analyse"):
                 {"action": "store_true", "help": "run analyse"},
             ("-r", "--result"):
-                {"action": "store_true", "help": "show results"}
+                {"action": "store_true", "help": "show results"},
+            ("--watch",):
+                {"action": "store_true",
+                 "help": "keep running until no workpackage waits for " +
+                 "its done_file anymore"},
+            ("--interval",):
+                {"type": float, "default": jube.conf.WATCH_POLL_INTERVAL,
+                 "help": "seconds between two done_file checks in " +
+                 "watch mode"}
         }
     }
 
@@ -904,7 +916,10 @@ def gen_subparser_conf():
             ("--include-path",):
                 {"nargs": "+", "help": "directory containing include files"},
             ("-t", "--tag"):
-                {"nargs": "+", "help": "select tags"}
+                {"nargs": "+", "help": "select tags"},
+            ("--procs",):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to scan the files"}
         }
     }
 
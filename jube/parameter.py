@@ -30,6 +30,7 @@ import jube.conf
 import jube.log
 import re
 import inspect
+import sys
 
 LOGGER = jube.log.get_logger(__name__)
 
@@ -43,6 +44,55 @@ UPDATE_MODES = (JUBE_MODE, NEVER_MODE, STEP_MODE,
                 CYCLE_MODE, USE_MODE, ALWAYS_MODE)
 
 
+def _constant_view_entry(parameter):
+    """Entry of a parameter inside the constant view"""
+    if parameter.is_template or \
+            parameter.mode in jube.conf.ALLOWED_SCRIPTTYPES or \
+            parameter.mode in jube.conf.ALLOWED_ADVANCED_MODETYPES:
+        return None
+    return parameter
+
+
+def _template_view_entry(parameter):
+    """Entry of a parameter inside the template view"""
+    return parameter if parameter.is_template else None
+
+
+def _export_view_entry(parameter):
+    """Entry of a parameter inside the export view"""
+    if parameter.is_template or not parameter.export:
+        return None
+    return parameter
+
+
+def _value_view_entry(parameter):
+    """Entry of a parameter inside the value view"""
+    if _constant_view_entry(parameter) is None:
+        return None
+    return parameter.value
+
+
+def _substitution_view_entry(parameter):
+    """Entry of a parameter inside the substitution view"""
+    if _constant_view_entry(parameter) is None:
+        return None
+    # Avoid evaluation of fixed parameter content
+    if parameter.is_fixed and "$" in parameter.value:
+        return re.sub(r"\$", "$$", parameter.value)
+    return parameter.value
+
+
+# Derived views of a Parameterset: view name -> (dictionary type, function
+# returning the entry of a parameter or None if it is not part of the view)
+_PARAMETERSET_VIEWS = {
+    "constant": (dict, _constant_view_entry),
+    "template": (dict, _template_view_entry),
+    "export": (dict, _export_view_entry),
+    "value": (jube.util.util.SubstitutionDict, _value_view_entry),
+    "substitution": (jube.util.util.SubstitutionDict,
+                     _substitution_view_entry)}
+
+
 class Parameterset(object):
 
     """A parameterset represent a template or a specific product space. It
@@ -51,18 +101,79 @@ class Parameterset(object):
     def __init__(self, name="", duplicate="replace"):
         self._name = name
         self._duplicate = duplicate
-        self._parameters = dict()
+        # Parameter objects are never changed after they were added,
+        # therefore they are shared between copies of the Parameterset
+        self._parameters = jube.util.util.CopyOnWriteDict()
+        # Derived views of the parameters (see _PARAMETERSET_VIEWS), which
+        # are computed once and updated whenever the parameterset changes.
+        # The views are shared between copies and never changed in place.
+        self._views = dict()
+        self._version = 0
 
     def clear(self):
         """Remove all stored parameters"""
-        self._parameters = dict()
+        self._parameters = jube.util.util.CopyOnWriteDict()
+        self.__changed()
 
     def copy(self):
-        """Returns a deepcopy of the Parameterset"""
+        """Returns a copy of the Parameterset, which shares its parameters
+        with the original one until one of them is changed"""
         new_parameterset = Parameterset(self._name, self._duplicate)
-        new_parameterset.add_parameterset(self)
+        new_parameterset._parameters = self._parameters.copy()
+        new_parameterset._views = dict(self._views)
         return new_parameterset
 
+    def __changed(self, name=None, existed=True):
+        """Mark the parameterset as changed. If only the parameter name was
+        added, replaced or deleted the cached views are updated, otherwise
+        they are dropped. existed marks whether the parameter name was
+        available before the change."""
+        views = self._views
+        self._views = dict()
+        self._version += 1
+        if name is None:
+            return
+        parameter = self._parameters.get(name)
+        for view_name, view in views.items():
+            if parameter is None:
+                entry = None
+            else:
+                entry = _PARAMETERSET_VIEWS[view_name][1](parameter)
+            if name in view:
+                view = view.copy()
+                if entry is None:
+                    del view[name]
+                else:
+                    view[name] = entry
+            elif entry is not None:
+                # The position of an existing parameter inside the view is
+                # unknown, the view will be created again when needed
+                if existed:
+                    continue
+                view = view.copy()
+                view[name] = entry
+            self._views[view_name] = view
+
+    def __view(self, name):
+        """Return the derived view name, it is only created if it is not
+        cached yet"""
+        view = self._views.get(name)
+        if view is None:
+            view_type, view_entry = _PARAMETERSET_VIEWS[name]
+            view = view_type(
+                (parameter.name, entry) for parameter, entry in
+                ((parameter, view_entry(parameter))
+                 for parameter in self._parameters.values())
+                if entry is not None)
+            self._views[name] = view
+        return view
+
+    @property
+    def version(self):
+        """Return the version of the Parameterset, which is increased on
+        every change"""
+        return self._version
+
     @property
     def name(self):
         """Return name of the Parameterset"""
@@ -76,10 +187,7 @@ class Parameterset(object):
     @property
     def has_templates(self):
         """This Parameterset contains template paramters?"""
-        for parameter in self._parameters.values():
-            if parameter.is_template:
-                return True
-        return False
+        return len(self.template_parameter_dict) > 0
 
     @property
     def parameter_dict(self):
@@ -100,14 +208,15 @@ class Parameterset(object):
         """Add all parameters from given parameterset, existing ones will
         be overwritten"""
         for parameter in parameterset:
-            self.add_parameter(parameter.copy())
+            self.add_parameter(parameter)
         return self
 
     def update_parameterset(self, parameterset):
         """Overwrite existing parameters. Do not add new parameters"""
         for parameter in parameterset:
             if parameter.name in self:
-                self._parameters[parameter.name] = parameter.copy()
+                self._parameters[parameter.name] = parameter
+                self.__changed(parameter.name)
 
     def concat_parameter(self, parameter):
         """Concatenate a new parameter to a potentially existing one."""
@@ -121,7 +230,8 @@ class Parameterset(object):
                             parameter._name, value, parameter._separator, parameter._type,
                             parameter._mode, parameter._unit, parameter._export,
                             parameter._update_mode, parameter._idx,
-                            parameter._eval_helper, parameter._duplicate)
+                            parameter._eval_helper, parameter._duplicate,
+                            parameter._cache)
         else:
             return parameter
 
@@ -148,6 +258,7 @@ class Parameterset(object):
         """Add a new parameter"""
         if parameter.name not in self._parameters.keys():
             self._parameters[parameter.name] = parameter
+            self.__changed(parameter.name, existed=False)
         else:
             # Check whether only the duplicate option of two parameters is
             # identical, otherwise the behaviour is undefined.
@@ -186,6 +297,7 @@ class Parameterset(object):
                 raise Exception("The execution was aborted due to an unknown error "+
                     "when adding a parameter. Please contact the JUBE developers "+
                     "to resolve this situation.")
+            self.__changed(parameter.name)
 
     def delete_parameter(self, parameter):
         """Delete a parameter"""
@@ -196,30 +308,39 @@ class Parameterset(object):
             name = parameter
         if name in self._parameters:
             del self._parameters[name]
+            self.__changed(name)
 
     @property
     def constant_parameter_dict(self):
-        """Return dictionary representation of all constant parameters"""
-        return dict([(parameter.name, parameter)
-                     for parameter in self._parameters.values()
-                     if (not parameter.is_template) and
-                        (parameter.mode not in
-                         jube.conf.ALLOWED_SCRIPTTYPES.union(
-                             jube.conf.ALLOWED_ADVANCED_MODETYPES))])
+        """Return dictionary representation of all constant parameters.
+        The dictionary is cached and must not be changed."""
+        return self.__view("constant")
 
     @property
     def template_parameter_dict(self):
-        """Return dictionary representation of all template parameters"""
-        return dict([(parameter.name, parameter)
-                     for parameter in self._parameters.values()
-                     if parameter.is_template])
+        """Return dictionary representation of all template parameters.
+        The dictionary is cached and must not be changed."""
+        return self.__view("template")
 
     @property
     def export_parameter_dict(self):
-        """Return dictionary representation of all export parameters"""
-        return dict([(parameter.name, parameter)
-                     for parameter in self._parameters.values()
-                     if (not parameter.is_template) and parameter.export])
+        """Return dictionary representation of all export parameters.
+        The dictionary is cached and must not be changed."""
+        return self.__view("export")
+
+    @property
+    def value_dict(self):
+        """Return dictionary name -> value of all constant parameters.
+        The dictionary is cached and must not be changed."""
+        return self.__view("value")
+
+    @property
+    def substitution_dict(self):
+        """Return dictionary name -> value of all constant parameters used
+        for the substitution of other parameters. The content of fixed
+        parameters is escaped to avoid its evaluation. The dictionary is
+        cached and must not be changed."""
+        return self.__view("substitution")
 
     def get_updatable_parameter(self, mode, keep_index=False):
         """Returns a parameterset containing all updatable
@@ -251,18 +372,21 @@ class Parameterset(object):
         """Return a set of incompatible parameter names between the current
         and the given parameterset"""
         result = set()
-        # Find parameternames which exists in both parametersets
-        intersection = set(self.all_parameter_names) & \
-            set(parameterset.all_parameter_names)
-        for name in intersection:
-            if (not (self[name].update_allowed(update_mode) or
+        other_update_mode = \
+            NEVER_MODE if (update_mode == USE_MODE) else update_mode
+        # Find parameternames which exists in both parametersets, shared
+        # parameter objects are always equivalent and can be skipped
+        for name in self._parameters.common_keys(parameterset._parameters):
+            parameter = self._parameters[name]
+            other_parameter = parameterset._parameters[name]
+            if parameter is other_parameter:
+                continue
+            if (not (parameter.update_allowed(update_mode) or
                      # In case of the USE_MODE (in the beginning of a
                      # new step) only the actual new parameterset and its
                      # mode is relevant
-                     parameterset[name].update_allowed(
-                         NEVER_MODE if (update_mode == USE_MODE) else
-                         update_mode)) and
-                    not self[name].is_equivalent(parameterset[name])):
+                     other_parameter.update_allowed(other_update_mode)) and
+                    not parameter.is_equivalent(other_parameter)):
                 result.add(name)
         return result
 
@@ -277,21 +401,21 @@ class Parameterset(object):
 
     def expand_templates(self):
         """Expand all remaining templates in the Parameterset and returns the
-        resulting parametersets
+        resulting parametersets. The parametersets are created lazily and
+        share all parameter objects which are not part of the expansion.
         """
         parameter_list = list()
         # Create all possible constant parameter representations
         for parameter in self.template_parameter_dict.values():
-            expanded_parameter_list = list()
-            for static_param in parameter.expand():
-                expanded_parameter_list.append(static_param)
-            parameter_list.append(expanded_parameter_list)
+            parameter_list.append(list(parameter.expand()))
         # Generator
-        for parameters in itertools.product(*parameter_list):
-            parameterset = self.copy()
+        for indices in itertools.product(
+                *[range(len(parameters)) for parameters in parameter_list]):
+            parameterset = Parameterset(self._name, self._duplicate)
+            parameterset._parameters = self._parameters.copy()
             # Addition of the constant parameters will overwrite the templates
-            for parameter in parameters:
-                parameterset.add_parameter(parameter)
+            for parameters, index in zip(parameter_list, indices):
+                parameterset.add_parameter(parameters[index])
             yield parameterset
 
     def __contains__(self, parameter):
@@ -338,6 +462,19 @@ class Parameterset(object):
         """Substitute all parameter inside the parameterset. Parameters from
         additional_parameterset will be used for substitution but will not be
         added to the set. final_sub marks the last substitution process."""
+        # Create dependencies, only parameters of this set are taken into
+        # account, the additional parametersets do not change
+        depend_dict = dict()
+        dependents = dict()
+        for par in self:
+            if not par.is_template:
+                self.__add_dependencies(par, depend_dict, dependents)
+
+        # Parameters which must be (force) evaluated again because they or
+        # one of their inputs changed
+        pending = set(depend_dict)
+        force_pending = set(depend_dict)
+
         set_changed = True
         count = 0
         while set_changed and (not self.has_templates) and \
@@ -345,29 +482,23 @@ class Parameterset(object):
             set_changed = False
             count += 1
 
-            # Create dependencies
-            depend_dict = dict()
-            for par in self:
-                if not par.is_template:
-                    depend_dict[par.name] = set()
-                    for other_par in self:
-                        # search for parameter usage
-                        if par.depends_on(other_par):
-                            depend_dict[par.name].add(other_par.name)
-
             # Resolve dependencies
-            substitution_list = [self._parameters[name] for name in
-                                 jube.util.util.resolve_depend(depend_dict)]
+            substitution_list = \
+                jube.util.util.resolve_depend(depend_dict)
 
             # Do substition and evaluation if possible
             set_changed = self.__substitute_parameters_in_list(
-                substitution_list, additional_parametersets)
+                substitution_list, additional_parametersets,
+                pending=pending, force_pending=force_pending,
+                depend_dict=depend_dict, dependents=dependents)
 
             # Run forced evaluation if there were no further changes
             if not set_changed:
                 set_changed = self.__substitute_parameters_in_list(
                     substitution_list, additional_parametersets,
-                    force_evaluation=True)
+                    force_evaluation=True, pending=force_pending,
+                    force_pending=pending, depend_dict=depend_dict,
+                    dependents=dependents)
 
         if final_sub:
             parameter = [par for par in self]
@@ -383,24 +514,58 @@ class Parameterset(object):
                     if param_changed:
                         self.add_parameter(new_par)
 
-    def __substitute_parameters_in_list(self, parameter_list,
+    def __add_dependencies(self, parameter, depend_dict, dependents):
+        """Add the dependencies of parameter to the dependency graph given
+        by depend_dict and its reverse dependents"""
+        for name in depend_dict.get(parameter.name, ()):
+            dependents[name].discard(parameter.name)
+        depend_dict[parameter.name] = set(
+            name for name in parameter._depending_parameter
+            if name in self._parameters)
+        for name in depend_dict[parameter.name]:
+            dependents.setdefault(name, set()).add(parameter.name)
+
+    def __substitute_parameters_in_list(self, name_list,
                                         additional_parametersets=None,
-                                        force_evaluation=False):
-        """Substitute all parameter inside the given parameter_list.
+                                        force_evaluation=False,
+                                        pending=None, force_pending=None,
+                                        depend_dict=None, dependents=None):
+        """Substitute all parameter inside the given name_list.
         Parameters from additional_parameterset will be used for substitution
         but will not be added to the set. force_evaluation will force
-        script parameter evaluation"""
+        script parameter evaluation.
+        Only parameters inside pending are handled, changed parameters and
+        the parameters depending on them are added to pending and
+        force_pending again. depend_dict and dependents are updated."""
         set_changed = False
-        for par in parameter_list:
+        parametersets = [self]
+        if additional_parametersets is not None:
+            parametersets += additional_parametersets
+        for name in name_list:
+            if name not in pending:
+                continue
+            pending.discard(name)
+            par = self._parameters[name]
+            # Plain text without any variable cannot change
+            if par.mode == "text" and "$" not in par.value and \
+                    par.eval_helper is None:
+                continue
             if par.can_substitute_and_evaluate(self):
-                parametersets = [self]
-                if additional_parametersets is not None:
-                    parametersets += additional_parametersets
                 new_par, param_changed = \
                     par.substitute_and_evaluate(
                         parametersets, force_evaluation=force_evaluation)
                 if param_changed:
                     self.add_parameter(new_par)
+                    new_par = self._parameters[name]
+                    if new_par.is_template:
+                        depend_dict.pop(name, None)
+                    else:
+                        self.__add_dependencies(new_par, depend_dict,
+                                                dependents)
+                    # Inputs of depending parameters changed
+                    changed = dependents.get(name, set()) | set([name])
+                    pending.update(changed)
+                    force_pending.update(changed)
                 set_changed = set_changed or param_changed
         return set_changed
 
@@ -414,34 +579,43 @@ class Parameter(object):
     parameter_regex = \
         re.compile(r"(?<!\$)(?:\$\$)*\$(?!\$)(\{)?(\w+?)(?(1)\}|(?=\W|$))")
 
+    # Large benchmarks hold millions of parameters, therefore no instance
+    # dictionary is used and all short descriptive strings are interned
+    __slots__ = ("_name", "_value", "_separator", "_type", "_mode", "_unit",
+                 "_based_on", "_export", "_idx", "_update_mode",
+                 "_eval_helper", "_duplicate", "_cache", "_signature")
+
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
-                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
-        self._name = name
+                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none",
+                 cache=None):
+        self._name = sys.intern(name)
         self._value = value
         if separator is None:
             self._separator = jube.conf.DEFAULT_SEPARATOR
         else:
-            self._separator = separator
-        self._type = parameter_type
-        self._mode = parameter_mode
-        self._unit = unit
+            self._separator = sys.intern(separator)
+        self._type = sys.intern(parameter_type)
+        self._mode = sys.intern(parameter_mode)
+        self._unit = sys.intern(unit)
         self._based_on = None
         self._export = export
         self._idx = idx
         if update_mode in UPDATE_MODES:
-            self._update_mode = update_mode
+            self._update_mode = sys.intern(update_mode)
         else:
             self._update_mode = NEVER_MODE
         self._eval_helper = eval_helper
-        self._duplicate=duplicate
+        self._duplicate = sys.intern(duplicate)
+        self._cache = cache
+        self._signature = None
 
     @staticmethod
     def create_parameter(name, value, separator=None, parameter_type="string",
                          selected_value=None, parameter_mode="text", unit="",
                          export=False, no_templates=False,
                          update_mode=NEVER_MODE, idx=-1, eval_helper=None,
-                         fixed=False, duplicate="none"):
+                         fixed=False, duplicate="none", cache=None):
         """Parameter constructor.
         Return a Static- or TemplateParameter based on the given data."""
         if separator is None:
@@ -465,22 +639,24 @@ class Parameter(object):
             if fixed:
                 result = FixedParameter(name, value, separator, parameter_type,
                                         parameter_mode, unit, export, update_mode,
-                                        idx, eval_helper, duplicate)
+                                        idx, eval_helper, duplicate, cache)
             else:
                 result = StaticParameter(name, value, separator,
                                          parameter_type, parameter_mode, unit,
-                                         export, update_mode, idx, eval_helper, duplicate)
+                                         export, update_mode, idx, eval_helper, duplicate,
+                                         cache)
         else:
             result = TemplateParameter(name, values, separator, parameter_type,
                                        parameter_mode, unit, export, update_mode,
-                                       idx, eval_helper, duplicate)
+                                       idx, eval_helper, duplicate, cache)
 
         if selected_value is not None:
             tmp = result
             parameter_mode = "text"
             result = FixedParameter(name, selected_value, separator,
                                     parameter_type, parameter_mode, unit, export,
-                                    update_mode, idx, eval_helper, duplicate)
+                                    update_mode, idx, eval_helper, duplicate,
+                                    cache)
             result.based_on = tmp
         return result
 
@@ -521,6 +697,7 @@ class Parameter(object):
     def idx(self, new_idx):
         """Sets a new parameteridx"""
         self._idx = new_idx
+        self._signature = None
 
     @property
     def separator(self):
@@ -560,6 +737,12 @@ class Parameter(object):
         """Return if parameter should be exported"""
         return self._export
 
+    @property
+    def cache(self):
+        """Return if script evaluation results can be cached (None if the
+        global script cache scope is used)"""
+        return self._cache
+
     @property
     def mode(self):
         """Return parameter mode"""
@@ -582,8 +765,14 @@ class Parameter(object):
 
     @based_on.setter
     def based_on(self, parameter):
-        """The Parameter based on another one"""
-        self._based_on = parameter
+        """The Parameter based on another one. Only the root of the based_on
+        graph is stored, because no intermediate parameter is needed
+        anymore (see based_on_root and is_equivalent)"""
+        if parameter is None:
+            self._based_on = None
+        else:
+            self._based_on = parameter.based_on_root
+        self._signature = None
 
     @property
     def based_on_mode(self):
@@ -626,30 +815,33 @@ class Parameter(object):
         """Return duplicate option"""
         return self._duplicate
 
-    def is_equivalent(self, parameter, first_check=True):
+    @property
+    def signature(self):
+        """Return hashable signature (root value, selection) of the
+        parameter. The selection is None for parameters which are not based
+        on another one, otherwise it contains the selected value and its
+        index within the root template. The signature is cached, because
+        the value of a parameter never changes."""
+        if self._signature is None:
+            root_value = self.based_on_value
+            if self._based_on is None:
+                self._signature = (root_value, None)
+            else:
+                self._signature = (root_value, (self._value, self._idx))
+        return self._signature
+
+    def is_equivalent(self, parameter):
         """Checks whether the given and the current Parameter based on
         equivalent templates and (if expanded) contain the same value and
         were on the same place within the original template
         """
-        result = True
-        if ((self._based_on is not None) and
-                (parameter.based_on is not None) and first_check):
-            result = self.value == parameter.value and \
-                self.idx == parameter.idx
-        elif (self._based_on is None) and (parameter.based_on is None):
-            result = self.value == parameter.value
-        if (self._based_on is not None) or (parameter.based_on is not None):
-            if (self._based_on is not None):
-                self_based_on = self._based_on
-            else:
-                self_based_on = self
-            if (parameter.based_on is not None):
-                other_based_on = parameter.based_on
-            else:
-                other_based_on = parameter
-            result = result and self_based_on.is_equivalent(other_based_on,
-                                                            False)
-        return result
+        if self is parameter:
+            return True
+        root_value, selection = self.signature
+        other_root_value, other_selection = parameter.signature
+        return root_value == other_root_value and \
+            (selection is None or other_selection is None or
+             selection == other_selection)
 
     def etree_repr(self, use_current_selection=False):
         """Return etree object representation"""
@@ -679,11 +871,20 @@ class Parameter(object):
             parameter_etree.attrib["export"] = "true"
         if self._unit != "":
             parameter_etree.attrib["unit"] = self._unit
+        if self._cache is not None:
+            parameter_etree.attrib["cache"] = \
+                "true" if self._cache else "false"
 
         return parameter_etree
 
+    def attribute_dict(self):
+        """Return dictionary of all attributes (replacement for __dict__)"""
+        return dict((name, getattr(self, name))
+                    for cls in type(self).__mro__
+                    for name in getattr(cls, "__slots__", ()))
+
     def __repr__(self):
-        return "Parameter({0})".format(self.__dict__)
+        return "Parameter({0})".format(self.attribute_dict())
 
     def __getitem__(self, propertyString):
         return getattr(self, propertyString)
@@ -693,15 +894,18 @@ class StaticParameter(Parameter):
 
     """A StaticParameter can be substituted and evaluated."""
 
+    __slots__ = ("_depending_parameter",)
+
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
-                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
+                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none",
+                 cache=None):
         Parameter.__init__(self, name, value, separator, parameter_type,
                            parameter_mode, unit, export, update_mode, idx,
-                           eval_helper, duplicate)
+                           eval_helper, duplicate, cache)
         self._depending_parameter = \
-            set([other_par[1] for other_par in
-                 re.findall(Parameter.parameter_regex, self._value)])
+            frozenset([other_par[1] for other_par in
+                       re.findall(Parameter.parameter_regex, self._value)])
 
     def can_substitute_and_evaluate(self, parameterset):
         """A parameter can be substituted and evaluated if there are no
@@ -730,16 +934,14 @@ class StaticParameter(Parameter):
         value = self._value
         if not final_sub and "$" in value:
             value = jube.util.util.expand_dollar_count(value)
-        parameter_dict = dict()
-        if parametersets is not None:
-            for parameterset in parametersets:
-                for name, param in parameterset.\
-                        constant_parameter_dict.items():
-                    # Avoid evaluation of fixed parameter content
-                    if param.is_fixed and "$" in param.value:
-                        parameter_dict[name] = re.sub(r"\$", "$$", param.value)
-                    else:
-                        parameter_dict[name] = param.value
+        if parametersets is None or len(parametersets) == 0:
+            parameter_dict = jube.util.util.SubstitutionDict()
+        elif len(parametersets) == 1:
+            parameter_dict = parametersets[0].substitution_dict
+        else:
+            parameter_dict = jube.util.util.SubstitutionDict.merge(
+                [parameterset.substitution_dict
+                 for parameterset in parametersets])
         value = jube.util.util.substitution(value, parameter_dict)
         # Run parameter evaluation, if value is fully expanded and
         # Parameter is a script
@@ -766,8 +968,16 @@ class StaticParameter(Parameter):
                 # Run script evaluation
                 LOGGER.debug("Evaluate parameter: {0}".format(self._name))
                 if self._mode in jube.conf.ALLOWED_SCRIPTTYPES:
-                    value = jube.util.util.script_evaluation(
-                        value, self._mode)
+                    evaluated = None
+                    if self._mode == "python":
+                        # Numeric parameters can be used as variables of a
+                        # single compiled expression
+                        evaluated = jube.util.util.bound_python_evaluation(
+                            self._value, parameter_dict)
+                    if evaluated is None:
+                        evaluated = jube.util.util.script_evaluation(
+                            value, self._mode, self._cache)
+                    value = evaluated
                 if self._mode == "env":
                     try:
                         value = os.environ[value]
@@ -814,7 +1024,8 @@ class StaticParameter(Parameter):
                                                idx=self._idx,
                                                eval_helper=None,
                                                fixed=final_sub,
-                                               duplicate=self._duplicate)
+                                               duplicate=self._duplicate,
+                                               cache=self._cache)
             param.based_on = self
         else:
             param = self
@@ -843,6 +1054,8 @@ class TemplateParameter(Parameter):
     which can be accessed by a single name. To use the template in a specific
     environment, it must be expanded."""
 
+    __slots__ = ()
+
     @property
     def value(self):
         """Return Template values"""
@@ -863,7 +1076,8 @@ class TemplateParameter(Parameter):
                                            unit = self._unit,
                                            export=self._export,
                                            update_mode=self._update_mode,
-                                           idx=index, duplicate=self._duplicate)
+                                           idx=index, duplicate=self._duplicate,
+                                           cache=self._cache)
             static_param.based_on = self
             yield static_param
 
@@ -874,13 +1088,16 @@ class FixedParameter(StaticParameter):
     It represents a fixed value.
     """
 
+    __slots__ = ()
+
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
-                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
+                 update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none",
+                 cache=None):
         StaticParameter.__init__(self, name, value, separator, parameter_type,
                                  parameter_mode, unit, export, update_mode, idx,
-                                 eval_helper, duplicate)
-        self._depending_parameter = set()
+                                 eval_helper, duplicate, cache)
+        self._depending_parameter = frozenset()
 
     def substitute_and_evaluate(self, parametersets=None,
                                 final_sub=False, no_templates=False,
@@ -98,9 +98,11 @@ class Patternset(object):
         return self._name
 
     def copy(self):
-        """Returns a copy of the Parameterset"""
+        """Returns a copy of the Patternset, which shares its pattern with
+        the original one until one of them is changed"""
         new_patternset = Patternset(self._name)
-        new_patternset.add_patternset(self)
+        new_patternset._pattern = self._pattern.copy()
+        new_patternset._derived_pattern = self._derived_pattern.copy()
         return new_patternset
 
     def is_compatible(self, patternset):
@@ -167,6 +169,8 @@ class Pattern(jube.parameter.StaticParameter):
     """A pattern can be used to scan a result file, using regular expression,
     or to represent a derived pattern."""
 
+    __slots__ = ("_derived", "_default", "_dotall")
+
     def __init__(self, name, value, pattern_mode="pattern",
                  content_type="string", unit="", default=None, dotall=False):
         self._derived = pattern_mode != "pattern"
@@ -283,7 +287,7 @@ class Pattern(jube.parameter.StaticParameter):
         return pattern_etree
 
     def __repr__(self):
-        return "Pattern({0})".format(self.__dict__)
+        return "Pattern({0})".format(self.attribute_dict())
 
 
 def get_jube_pattern():
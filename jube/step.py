@@ -22,9 +22,13 @@ from __future__ import (print_function,
                         division)
 
 import subprocess
+import multiprocessing as mp
+import codecs
+import selectors
+import shlex
+import uuid
 import os
 import re
-import time
 import xml.etree.ElementTree as ET
 import jube.util.util
 import jube.conf
@@ -43,7 +47,8 @@ class Step(object):
 
     def __init__(self, name, depend, iterations=1, alt_work_dir=None,
                  shared_name=None, export=False, max_wps="0",
-                 active="true", suffix="", cycles=1, procs=1, do_log_file=None):
+                 active="true", suffix="", cycles=1, procs=1, do_log_file=None,
+                 shell_session=False):
         self._name = name
         self._use = list()
         self._operations = list()
@@ -58,6 +63,7 @@ class Step(object):
         self._cycles = cycles
         self._procs = procs
         self._do_log_file = do_log_file
+        self._shell_session = shell_session
 
     def etree_repr(self):
         """Return etree object representation"""
@@ -86,6 +92,8 @@ class Step(object):
             step_etree.attrib["procs"] = str(self._procs)
         if self._do_log_file != None:
             step_etree.attrib["do_log_file"] = str(self._do_log_file)
+        if self._shell_session:
+            step_etree.attrib["shell_session"] = "true"
         for use in self._use:
             use_etree = ET.SubElement(step_etree, "use")
             use_etree.text = jube.conf.DEFAULT_SEPARATOR.join(use)
@@ -158,6 +166,11 @@ class Step(object):
         """Return do log file name"""
         return self._do_log_file
 
+    @property
+    def shell_session(self):
+        """Return if all operations of a workpackage share one shell"""
+        return self._shell_session
+
     @property
     def work_dir(self):
         """Return alternative working directory"""
@@ -233,6 +246,21 @@ class Step(object):
                             incompatible_parameters=None):
         """Create workpackages for current step using given
         benchmark context"""
+        creation = WorkpackageCreation(benchmark, self,
+                                       jube.util.util.creation_procs())
+        self._collect_workpackages(creation, benchmark, global_parameterset,
+                                   local_parameterset, used_sets,
+                                   iteration_base, parents,
+                                   incompatible_parameters)
+        creation.flush()
+        return creation.workpackages
+
+    def _collect_workpackages(self, creation, benchmark, global_parameterset,
+                              local_parameterset=None, used_sets=None,
+                              iteration_base=0, parents=None,
+                              incompatible_parameters=None):
+        """Expand the parameter space of the current step and pass every
+        resulting parameterset to the given WorkpackageCreation"""
         if used_sets is None:
             used_sets = set()
 
@@ -251,12 +279,8 @@ class Step(object):
         if parents is None:
             parents = list()
 
-        new_workpackages = list()
-
         # Create parameter dictionary for substitution
-        parameter_dict = \
-            dict([[par.name, par.value] for par in
-                  global_parameterset.constant_parameter_dict.values()])
+        parameter_dict = global_parameterset.value_dict
 
         # Filter for parametersets in uses
         parameterset_names = \
@@ -303,102 +327,62 @@ class Step(object):
                              "between current and parent steps. \nParameter " +
                              "'{0}' is/are already defined different.".format(
                                  ",".join(incompatible_names)))
-                return new_workpackages
+                return
 
         # update parameters
         global_parameterset.update_parameterset(update_parameters)
 
         # Set tag-mode evaluation helper function to allow access to tag list
-        # during paramter evaluation
+        # during paramter evaluation (parameters are shared between
+        # parametersets, therefore the helper is set on a copy)
+        tag_parameterset = jube.parameter.Parameterset()
         for parameter in global_parameterset.all_parameters:
             if parameter.mode == "tag":
+                parameter = parameter.copy()
                 parameter.eval_helper = \
                     lambda tag: tag if tag in benchmark.tags else ""
+                tag_parameterset.add_parameter(parameter)
+        global_parameterset.update_parameterset(tag_parameterset)
 
-        # Expand templates
-        parametersets = [global_parameterset]
-        change = True
-        while change:
-            change = False
-            new_parametersets = list()
-            for parameterset in parametersets:
-                parameterset.parameter_substitution()
-                # Maybe new templates were created
-                if parameterset.has_templates:
-                    LOGGER.debug("Expand parameter templates:\n{0}".format(
-                        "\n".join("    \"{0}\": {1}".format(i, j.value)
-                                  for i, j in parameterset.
-                                  template_parameter_dict.items())))
-                    new_parametersets += \
-                        [new_parameterset for new_parameterset in
-                         parameterset.expand_templates()]
-                    change = True
-                else:
-                    new_parametersets += [parameterset]
-            parametersets = new_parametersets
-
-        # Create workpackages
-        for parameterset in parametersets:
+        # Expand templates and create workpackages
+        for parameterset in self._expand_parameterset(global_parameterset):
             workpackage_parameterset = local_parameterset.copy()
             workpackage_parameterset.update_parameterset(parameterset)
             if new_sets_found:
-                new_workpackages += \
-                    self.create_workpackages(benchmark, parameterset,
-                                             workpackage_parameterset,
-                                             used_sets, iteration_base,
-                                             parents,
-                                             incompatible_parameters.copy())
+                self._collect_workpackages(creation, benchmark, parameterset,
+                                           workpackage_parameterset,
+                                           used_sets, iteration_base,
+                                           parents,
+                                           incompatible_parameters.copy())
             else:
                 # Check if all incompatible_parameters were updated
                 if len(incompatible_parameters) > 0:
-                    return new_workpackages
-                # Create new workpackage
-                created_workpackages = list()
-                for iteration in range(self.iterations):
-                    workpackage = jube.workpackage.Workpackage(
-                        benchmark=benchmark,
-                        step=self,
-                        parameterset=parameterset.copy(),
-                        local_parameter_names=[
-                            par.name for par in workpackage_parameterset],
-                        iteration=iteration_base * self.iterations + iteration,
-                        cycle=0)
-
-                    # --- Link parent workpackages ---
-                    for parent in parents:
-                        workpackage.add_parent(parent)
-
-                    # --- Add workpackage JUBE parameterset ---
-                    workpackage.parameterset.add_parameterset(
-                        workpackage.get_jube_parameterset())
-
-                    # --- Final parameter substitution ---
-                    workpackage.parameterset.parameter_substitution(
-                        final_sub=True)
-
-                    # --- Check parameter type ---
-                    for parameter in workpackage.parameterset:
-                        if not parameter.is_template:
-                            jube.util.util.convert_type(parameter.name,
-                                                        parameter.parameter_type,
-                                                        parameter.value)
-
-                    # --- Enable workpackage dir cache ---
-                    workpackage.allow_workpackage_dir_caching()
-
-                    if workpackage.active:
-                        created_workpackages.append(workpackage)
-                    else:
-                        jube.workpackage.Workpackage.\
-                            reduce_workpackage_id_counter()
-
-                for workpackage in created_workpackages:
-                    workpackage.iteration_siblings.update(
-                        set(created_workpackages))
-
-                new_workpackages += created_workpackages
+                    return
+                creation.add(parameterset,
+                             [par.name for par in workpackage_parameterset],
+                             iteration_base, parents)
 
-        return new_workpackages
+    @staticmethod
+    def _expand_parameterset(parameterset):
+        """Substitute and expand the given parameterset until no templates
+        are left. The resulting parametersets are generated one by one in
+        the same order a complete expansion would create them."""
+        expansions = [iter([parameterset])]
+        while expansions:
+            parameterset = next(expansions[-1], None)
+            if parameterset is None:
+                expansions.pop()
+                continue
+            parameterset.parameter_substitution()
+            # Maybe new templates were created
+            if parameterset.has_templates:
+                LOGGER.debug("Expand parameter templates:\n{0}".format(
+                    "\n".join("    \"{0}\": {1}".format(i, j.value)
+                              for i, j in parameterset.
+                              template_parameter_dict.items())))
+                expansions.append(parameterset.expand_templates())
+            else:
+                yield parameterset
 
     @property
     def alt_work_dir(self):
@@ -437,6 +421,201 @@ class Step(object):
         return depend_history
 
 
+# WorkpackageCreation, whose workpackages are evaluated by the forked
+# worker processes
+_CREATION = None
+
+
+def _evaluate_workpackage(task):
+    """Evaluate a single workpackage of the current WorkpackageCreation
+    inside a worker process. Return its active state and all parameters,
+    which were changed by the final substitution, or the raised exception.
+    The based_on references of the parameters are restored by the main
+    process."""
+    leaf_index, iteration, workpackage_id = task
+    workpackage = _CREATION.new_workpackage(
+        _CREATION.pending[leaf_index], iteration, workpackage_id)
+    parameterset = workpackage.parameterset.copy()
+    try:
+        active = WorkpackageCreation.evaluate(workpackage)
+    except Exception as exception:
+        return exception
+    changed_parameters = list()
+    for parameter in workpackage.parameterset:
+        if parameter is not parameterset[parameter.name]:
+            parameter = parameter.copy()
+            parameter.based_on = None
+            changed_parameters.append(parameter)
+    return active, changed_parameters
+
+
+class WorkpackageCreation(object):
+
+    """Creates the workpackages of a step in the order of their added
+    parametersets. If more than one process is used, all parametersets are
+    collected first and the final substitution of the workpackages is done
+    by a single pool of forked worker processes. Each workpackage is
+    evaluated using the id it would get if all former workpackages were
+    active (or as inactive as in their last evaluation). Evaluations using
+    a wrong id are repeated, therefore ids, order and parameter values match
+    a serial creation."""
+
+    def __init__(self, benchmark, step, procs=1):
+        self._benchmark = benchmark
+        self._step = step
+        self._procs = procs
+        self._pending = list()
+        self._workpackages = list()
+
+    @property
+    def workpackages(self):
+        """Return all created workpackages"""
+        return self._workpackages
+
+    @property
+    def pending(self):
+        """Return all added parametersets, which were not processed yet"""
+        return self._pending
+
+    def add(self, parameterset, local_parameter_names, iteration_base,
+            parents):
+        """Add the parameterset of new workpackages"""
+        self._pending.append((parameterset.copy(), local_parameter_names,
+                              iteration_base, parents))
+        # The worker processes only know the parametersets, which were
+        # added before they were forked
+        if self._procs <= 1:
+            self.flush()
+
+    def flush(self):
+        """Create the workpackages of all pending parametersets"""
+        results = None
+        if self._procs > 1 and \
+                len(self._pending) * self._step.iterations > 1:
+            results = iter(self._parallel_evaluation())
+        for leaf in self._pending:
+            created_workpackages = list()
+            for iteration in range(self._step.iterations):
+                # Inactive workpackages are dropped in both cases, they
+                # neither use an id nor become a child of their parents
+                workpackage_id = jube.workpackage.Workpackage.id_counter
+                if results is None:
+                    workpackage = self.new_workpackage(leaf, iteration,
+                                                       workpackage_id)
+                    active = self.evaluate(workpackage)
+                else:
+                    result = next(results)
+                    if isinstance(result, Exception):
+                        raise result
+                    active, changed_parameters = result
+                    if active:
+                        workpackage = self._restore_workpackage(
+                            leaf, iteration, workpackage_id,
+                            changed_parameters)
+                if active:
+                    jube.workpackage.Workpackage.id_counter += 1
+                    created_workpackages.append(workpackage)
+
+            for workpackage in created_workpackages:
+                workpackage.iteration_siblings.update(
+                    set(created_workpackages))
+
+            self._workpackages += created_workpackages
+        self._pending = list()
+
+    def new_workpackage(self, leaf, iteration, workpackage_id=None):
+        """Create a not yet evaluated workpackage for the given pending
+        parameterset"""
+        parameterset, local_parameter_names, iteration_base, parents = leaf
+        workpackage = jube.workpackage.Workpackage(
+            benchmark=self._benchmark,
+            step=self._step,
+            parameterset=parameterset.copy(),
+            local_parameter_names=list(local_parameter_names),
+            workpackage_id=workpackage_id,
+            iteration=iteration_base * self._step.iterations + iteration,
+            cycle=0)
+
+        # --- Link parent workpackages ---
+        for parent in parents:
+            workpackage.add_parent(parent)
+
+        # --- Add workpackage JUBE parameterset ---
+        workpackage.parameterset.add_parameterset(
+            workpackage.get_jube_parameterset())
+        return workpackage
+
+    @staticmethod
+    def evaluate(workpackage):
+        """Run the final substitution of the given workpackage and return
+        its active state"""
+        # --- Final parameter substitution ---
+        workpackage.parameterset.parameter_substitution(final_sub=True)
+
+        # --- Check parameter type ---
+        for parameter in workpackage.parameterset:
+            if not parameter.is_template:
+                jube.util.util.convert_type(parameter.name,
+                                            parameter.parameter_type,
+                                            parameter.value)
+
+        # --- Enable workpackage dir cache ---
+        workpackage.allow_workpackage_dir_caching()
+
+        return workpackage.active
+
+    def _restore_workpackage(self, leaf, iteration, workpackage_id,
+                             changed_parameters):
+        """Create an evaluated workpackage by using the parameters changed by
+        the final substitution inside a worker process"""
+        workpackage = self.new_workpackage(leaf, iteration, workpackage_id)
+        parameterset = jube.parameter.Parameterset()
+        for parameter in changed_parameters:
+            parameter.based_on = workpackage.parameterset[parameter.name]
+            parameterset.add_parameter(parameter)
+        workpackage.parameterset.update_parameterset(parameterset)
+        workpackage.allow_workpackage_dir_caching()
+        return workpackage
+
+    def _parallel_evaluation(self):
+        """Evaluate all pending workpackages inside forked worker processes.
+        Return the results in workpackage order."""
+        global _CREATION
+        tasks = [(leaf_index, iteration)
+                 for leaf_index in range(len(self._pending))
+                 for iteration in range(self._step.iterations)]
+        workpackage_ids = [None] * len(tasks)
+        results = [None] * len(tasks)
+        LOGGER.debug("Evaluate {0} workpackages using {1} processes".format(
+            len(tasks), self._procs))
+        _CREATION = self
+        try:
+            with mp.get_context("fork").Pool(processes=self._procs) as pool:
+                while True:
+                    # Evaluate all workpackages, whose expected id changed
+                    workpackage_id = \
+                        jube.workpackage.Workpackage.id_counter
+                    reevaluate = list()
+                    for index, result in enumerate(results):
+                        if workpackage_ids[index] != workpackage_id:
+                            workpackage_ids[index] = workpackage_id
+                            reevaluate.append(index)
+                        if result is None or \
+                                isinstance(result, Exception) or result[0]:
+                            workpackage_id += 1
+                    if len(reevaluate) == 0:
+                        break
+                    for index, result in zip(
+                            reevaluate, pool.map(
+                                _evaluate_workpackage,
+                                [tasks[index] + (workpackage_ids[index],)
+                                 for index in reevaluate])):
+                        results[index] = result
+        finally:
+            _CREATION = None
+        return results
+
+
 class Operation(object):
 
     """The Operation-class represents a single instruction, which will be
@@ -456,6 +635,9 @@ class Operation(object):
         self._shared = shared
         self._work_dir = work_dir
 
+    # True if "env -0" can be used, evaluated on first use
+    _environment_pipe = None
+
     @property
     def do(self):
         """Get do"""
@@ -507,12 +689,34 @@ class Operation(object):
         active_str = jube.util.util.substitution(self._active, parameter_dict)
         return jube.util.util.eval_bool(active_str)
 
+    def watched_file_paths(self, parameter_dict, work_dir):
+        """Return the paths of the done_file, error_file and break_file of
+        the operation, when it is executed in the given work_dir. Files which
+        are not used by the operation are skipped."""
+        if self._work_dir is not None and len(self._work_dir) > 0:
+            new_work_dir = jube.util.util.substitution(
+                self._work_dir, parameter_dict)
+            new_work_dir = os.path.expandvars(os.path.expanduser(new_work_dir))
+            work_dir = os.path.join(work_dir, new_work_dir)
+        paths = list()
+        for filename in (self._async_filename, self._error_filename,
+                         self._break_filename):
+            if filename is not None:
+                filename = jube.util.util.substitution(filename,
+                                                       parameter_dict)
+                filename = os.path.expandvars(os.path.expanduser(filename))
+                paths.append(os.path.abspath(os.path.join(work_dir,
+                                                          filename)))
+        return paths
+
     def execute(self, parameter_dict, work_dir, only_check_pending=False,
-                environment=None, pid=None, dolog=None):
+                environment=None, pid=None, dolog=None, session=None):
         """Execute the operation. work_dir must be set to the given context
         path. The parameter_dict used for inline substitution.
         If only_check_pending is set to True, the operation will not be
         executed, only the async_file will be checked.
+        If a ShellSession is given, the operation is executed inside of
+        this session instead of a new shell.
         Return operation status:
         True => operation finished
         False => operation pending
@@ -598,63 +802,78 @@ class Operation(object):
                     os.path.abspath(stdout_path)))
                 LOGGER.debug("    stderr: {0}".format(
                     os.path.abspath(stderr_path)))
-                try:
-                    if jube.conf.VERBOSE_LEVEL > 1:
-                        stdout_handle = subprocess.PIPE
-                    else:
-                        stdout_handle = stdout
-
+                if (session is not None) and \
+                        (jube.conf.VERBOSE_LEVEL <= 1) and \
+                        Operation.environment_pipe_supported():
                     if dolog != None:
                         dolog.store_do(do=do, shell=shell, work_dir=os.path.abspath(
                             work_dir), parameter_dict=parameter_dict, shared=self.shared)
-
-                    sub = subprocess.Popen(
-                        [shell, "-c",
-                         "{0} && env > \"{1}\"".format(do,
-                                                       abs_info_file_path)],
-                        cwd=work_dir, stdout=stdout_handle,
-                        stderr=stderr, shell=False,
-                        env=env)
-                except OSError:
+                    # stdout and stderr are appended by the session itself
                     stdout.close()
                     stderr.close()
-                    raise RuntimeError(("Error (returncode <> 0) while " +
-                                        "running \"{0}\" in " +
-                                        "directory \"{1}\"")
-                                       .format(do, os.path.abspath(work_dir)))
+                    returncode, new_env = session.execute(
+                        do, shell, work_dir, stdout_path, stderr_path, env)
+                    # keep the environment, if the shell was terminated
+                    env = new_env if new_env is not None else dict(env)
+                else:
+                    # Environment is written to a pipe or, if not supported, to
+                    # the environment info file
+                    env_pipe = Operation.environment_pipe_supported()
+                    env_read = None
+                    env_write = None
+                    try:
+                        if jube.conf.VERBOSE_LEVEL > 1:
+                            stdout_handle = subprocess.PIPE
+                        else:
+                            stdout_handle = stdout
 
-                # stdout verbose output
-                if jube.conf.VERBOSE_LEVEL > 1:
-                    while True:
-                        read_out = sub.stdout.read(
-                            jube.conf.VERBOSE_STDOUT_READ_CHUNK_SIZE)
-                        if (not read_out):
-                            break
+                        if dolog != None:
+                            dolog.store_do(do=do, shell=shell, work_dir=os.path.abspath(
+                                work_dir), parameter_dict=parameter_dict, shared=self.shared)
+
+                        if env_pipe:
+                            env_read, env_write = os.pipe()
+                            command = "{0} && env -0 > /dev/fd/{1}".format(
+                                do, env_write)
+                            pass_fds = (env_write,)
                         else:
-                            try:
-                                print(read_out.decode(errors="ignore"), end="")
-                            except TypeError:
-                                print(read_out.decode("utf-8", "ignore"),
-                                      end="")
-                            try:
-                                stdout.write(read_out)
-                            except TypeError:
-                                try:
-                                    stdout.write(read_out.decode(
-                                        errors="ignore"))
-                                except TypeError:
-                                    stdout.write(read_out.decode("utf-8",
-                                                                 "ignore"))
-                            time.sleep(jube.conf.VERBOSE_STDOUT_POLL_SLEEP)
-                    sub.communicate()
-
-                returncode = sub.wait()
-
-                # Close filehandles
-                stdout.close()
-                stderr.close()
-
-                env = Operation.read_process_environment(work_dir, pid=pid)
+                            command = "{0} && env > \"{1}\"".format(
+                                do, abs_info_file_path)
+                            pass_fds = ()
+
+                        sub = subprocess.Popen(
+                            [shell, "-c", command],
+                            cwd=work_dir, stdout=stdout_handle,
+                            stderr=stderr, shell=False,
+                            env=env, pass_fds=pass_fds)
+                    except OSError:
+                        stdout.close()
+                        stderr.close()
+                        if env_read is not None:
+                            os.close(env_read)
+                        raise RuntimeError(("Error (returncode <> 0) while " +
+                                            "running \"{0}\" in " +
+                                            "directory \"{1}\"")
+                                           .format(do, os.path.abspath(work_dir)))
+                    finally:
+                        if env_write is not None:
+                            os.close(env_write)
+
+                    env_data = Operation._communicate(
+                        sub, env_read, stdout if stdout_handle ==
+                        subprocess.PIPE else None)
+
+                    returncode = sub.wait()
+
+                    # Close filehandles
+                    stdout.close()
+                    stderr.close()
+
+                    if env_pipe:
+                        env = Operation.parse_process_environment(env_data)
+                    else:
+                        env = Operation.read_process_environment(work_dir,
+                                                                 pid=pid)
 
                 # Read and store new environment
                 if (environment is not None) and (returncode == 0):
@@ -760,6 +979,82 @@ class Operation(object):
     def __repr__(self):
         return self._do
 
+    @staticmethod
+    def environment_pipe_supported():
+        """Check once if the environment of a finished "do" can be passed
+        by "env -0" through a pipe instead of the environment info file"""
+        if Operation._environment_pipe is None:
+            Operation._environment_pipe = False
+            if jube.conf.ENVIRONMENT_PIPE and os.path.isdir("/dev/fd"):
+                try:
+                    output = subprocess.check_output(
+                        ["env", "-0"], env={"JUBE_ENV_TEST": "1"},
+                        stderr=subprocess.DEVNULL)
+                    Operation._environment_pipe = \
+                        output == b"JUBE_ENV_TEST=1\0"
+                except (OSError, subprocess.CalledProcessError):
+                    pass
+        return Operation._environment_pipe
+
+    @staticmethod
+    def _communicate(sub, env_read=None, stdout=None):
+        """Wait for the given subprocess. Collect the data written to the
+        env_read pipe and, if stdout is given, copy the stdout pipe of the
+        subprocess to the console and to stdout. Return the collected
+        environment data."""
+        env_data = list()
+        selector = selectors.DefaultSelector()
+        if env_read is not None:
+            selector.register(env_read, selectors.EVENT_READ)
+        if stdout is not None:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            selector.register(sub.stdout, selectors.EVENT_READ)
+        while len(selector.get_map()) > 0:
+            events = selector.select(jube.conf.PROCESS_POLL_TIMEOUT)
+            for key, _ in events:
+                data = os.read(key.fd, jube.conf.PROCESS_READ_CHUNK_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                elif key.fileobj == env_read:
+                    env_data.append(data)
+                else:
+                    text = decoder.decode(data)
+                    print(text, end="")
+                    stdout.write(text)
+            # Background processes started by the "do" can keep the
+            # environment pipe open, after the shell itself was finished.
+            # Its environment is completely written at this point.
+            if len(events) == 0 and env_read is not None and \
+                    env_read in selector.get_map() and \
+                    sub.poll() is not None:
+                os.set_blocking(env_read, False)
+                try:
+                    while True:
+                        data = os.read(env_read,
+                                       jube.conf.PROCESS_READ_CHUNK_SIZE)
+                        if not data:
+                            break
+                        env_data.append(data)
+                except BlockingIOError:
+                    pass
+                selector.unregister(env_read)
+        selector.close()
+        if env_read is not None:
+            os.close(env_read)
+        if stdout is not None:
+            sub.stdout.close()
+        return b"".join(env_data)
+
+    @staticmethod
+    def parse_process_environment(env_data):
+        """Parse NUL-delimited environment data created by "env -0"."""
+        env = dict()
+        for entry in env_data.split(b"\0"):
+            name, sep, value = entry.partition(b"=")
+            if sep:
+                env[os.fsdecode(name)] = os.fsdecode(value)
+        return env
+
     @staticmethod
     def read_process_environment(work_dir, remove_after_read=True, pid=None):
         """Read standard environment info file in given directory."""
@@ -787,6 +1082,116 @@ class Operation(object):
         return env
 
 
+class ShellSession(object):
+
+    """A ShellSession is a long-lived shell process, which executes the
+    operations of a single workpackage one after another. Return code and
+    environment of each operation are sent back through the stdout pipe of
+    the shell, terminated by a random sentinel. Changes of the environment
+    done by JUBE are sent to the shell as export/unset commands.
+    """
+
+    NAME_REGEX = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+    def __init__(self):
+        self._process = None
+        self._shell = None
+        self._env = None
+        self._sentinel = uuid.uuid4().hex
+        self._end_regex = re.compile(
+            b"\\x00" + self._sentinel.encode() + b" ([0-9]+)\\x00$")
+
+    def _start(self, shell, environment):
+        """Start a new shell process using the given environment"""
+        self._process = subprocess.Popen(
+            [shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, shell=False, env=environment)
+        self._shell = shell
+        self._env = dict(environment)
+
+    def _environment_commands(self, environment):
+        """Return shell commands to update the environment of the shell to
+        the given environment. Return None if this is not possible."""
+        commands = list()
+        for name in self._env:
+            if name not in environment:
+                if not ShellSession.NAME_REGEX.match(name):
+                    return None
+                commands.append("unset {0}\n".format(name))
+        for name, value in environment.items():
+            if self._env.get(name) != value:
+                if not ShellSession.NAME_REGEX.match(name):
+                    return None
+                commands.append("export {0}={1}\n".format(
+                    name, shlex.quote(value)))
+        return "".join(commands)
+
+    def execute(self, do, shell, work_dir, stdout_path, stderr_path,
+                environment):
+        """Execute do inside of the session. stdout and stderr are appended
+        to the given files. Return the return code and the new environment
+        (None if the shell was terminated by the do)."""
+        commands = None
+        if (self._process is not None) and (self._shell == shell):
+            commands = self._environment_commands(environment)
+        if commands is None:
+            self.close()
+            self._start(shell, environment)
+            commands = ""
+        commands += ("cd {0} && {{ eval {1}\n}} >> {2} 2>> {3} < /dev/null\n"
+                     "__jube_rc=$?\n"
+                     "if [ $__jube_rc -eq 0 ]; then env -0; fi\n"
+                     "printf '\\0%s %s\\0' {4} $__jube_rc\n").format(
+                         shlex.quote(os.path.abspath(work_dir)),
+                         shlex.quote(do),
+                         shlex.quote(os.path.abspath(stdout_path)),
+                         shlex.quote(os.path.abspath(stderr_path)),
+                         self._sentinel)
+
+        data = bytearray()
+        match = None
+        try:
+            self._process.stdin.write(os.fsencode(commands))
+            self._process.stdin.flush()
+            fileno = self._process.stdout.fileno()
+            while match is None:
+                read_data = os.read(fileno, jube.conf.PROCESS_READ_CHUNK_SIZE)
+                if not read_data:
+                    break
+                data += read_data
+                if data.endswith(b"\0"):
+                    match = self._end_regex.search(
+                        data, max(0, len(data) - len(self._sentinel) - 32))
+        except BrokenPipeError:
+            pass
+
+        if match is None:
+            # Shell was terminated (e.g. by "exit" within the do)
+            returncode = self._process.wait()
+            self.close()
+            return returncode, None
+
+        returncode = int(match.group(1))
+        if returncode != 0:
+            # the state of the shell is unknown, use a new one next time
+            self.close()
+            return returncode, None
+        env = Operation.parse_process_environment(bytes(data[:match.start()]))
+        self._env = dict(env)
+        return returncode, env
+
+    def close(self):
+        """Terminate the shell process"""
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+
+
 class DoLog(object):
 
     """A DoLog class containing the operations and information for setting up the do log."""
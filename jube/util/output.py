@@ -26,6 +26,7 @@ import textwrap
 import copy
 import sys
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
 
 def text_boxed(text):
@@ -210,6 +211,49 @@ def element_tree_tostring(element, encoding=None):
     return "".join(dat.decode(encoding) for dat in file_dummy.data)
 
 
+def xml_indent(element, space="  ", level=0):
+    """Indent element tree in place to create a pretty-printed output.
+    ElementTree.indent replacement for Python versions older than 3.9."""
+    if hasattr(ET, "indent"):
+        ET.indent(element, space=space, level=level)
+        return
+    if len(element) > 0:
+        child_indentation = "\n" + (level + 1) * space
+        if not element.text or not element.text.strip():
+            element.text = child_indentation
+        for child in element:
+            xml_indent(child, space, level + 1)
+            if not child.tail or not child.tail.strip():
+                child.tail = child_indentation
+        if not child.tail.strip():
+            child.tail = "\n" + level * space
+
+
+def write_pretty_xml(filename, element, children=None, space="  "):
+    """Write element as pretty-printed UTF-8 xml file. The optional children
+    iterable is appended to element one child at a time, which allows to
+    write large files without keeping the whole element tree in memory."""
+    with open(filename, "wb") as fout:
+        fout.write('<?xml version="1.0" encoding="UTF-8"?>\n'.encode(
+            "UTF-8"))
+        if children is None:
+            xml_indent(element, space)
+            fout.write(ET.tostring(element, encoding="unicode").encode(
+                "UTF-8"))
+        else:
+            fout.write("<{0}{1}>".format(element.tag, "".join(
+                [" {0}={1}".format(name, quoteattr(value))
+                 for name, value in element.attrib.items()])).encode(
+                     "UTF-8"))
+            for child in children:
+                child.tail = None
+                xml_indent(child, space, 1)
+                fout.write(("\n" + space + ET.tostring(
+                    child, encoding="unicode")).encode("UTF-8"))
+            fout.write("\n</{0}>".format(element.tag).encode("UTF-8"))
+        fout.write("\n".encode("UTF-8"))
+
+
 def format_value(format_string, value):
     """Return formated value"""
     if (type(value) is not int) and \
@@ -22,6 +22,11 @@ from __future__ import (print_function,
                         division)
 
 from collections import deque
+from collections.abc import MutableMapping, ValuesView, ItemsView
+import ast
+import functools
+import hashlib
+import json
 import re
 import string
 import operator
@@ -33,6 +38,13 @@ import jube.conf
 import grp
 import pwd
 
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
 
 LOGGER = jube.log.get_logger(__name__)
 
@@ -86,47 +98,98 @@ class Queue:
 
 class WorkStat(object):
 
-    """Workpackage queuing handler"""
+    """Workpackage scheduler
+
+    A workpackage becomes ready as soon as all of its parents are finished.
+    Every workpackage keeps a counter of its unfinished parents, which is
+    decremented once per finished parent, so the scheduling costs of a
+    finished workpackage only depend on its number of children. max_wps
+    limits the number of active (queued but not yet finished)
+    workpackages of a step."""
 
     def __init__(self):
         self._work_list = Queue()
-        self._cnt_work = dict()
+        # ids of active workpackages per step
+        self._active = dict()
         self._wait_lists = dict()
+        # number of unfinished parents per workpackage id
+        self._open_parents = dict()
+        # ids of finished workpackages
+        self._finished = set()
 
     def put(self, workpackage):
         """Add some workpackage to queue"""
+        name = workpackage.step.name
+        if name not in self._active:
+            self._active[name] = set()
+        active = self._active[name]
+
+        if workpackage.id in active:
+            # Workpackage already owns a slot of its step
+            self._work_list.put(workpackage)
+            return
 
         # Substitute max_wps if needed
         max_wps = int(substitution(workpackage.step.max_wps,
                                    workpackage.parameter_dict))
 
-        if (max_wps == 0) or \
-           (workpackage.started) or \
-           (workpackage.step.name not in self._cnt_work) or \
-           (self._cnt_work[workpackage.step.name] < max_wps):
+        if (max_wps == 0) or (workpackage.started) or \
+           (len(active) < max_wps):
+            active.add(workpackage.id)
             self._work_list.put(workpackage)
-            if workpackage.step.name not in self._cnt_work:
-                self._cnt_work[workpackage.step.name] = 1
-            else:
-                self._cnt_work[workpackage.step.name] += 1
         else:
-            if workpackage.step.name not in self._wait_lists:
-                self._wait_lists[workpackage.step.name] = Queue()
-            self._wait_lists[workpackage.step.name].put(workpackage)
+            if name not in self._wait_lists:
+                self._wait_lists[name] = Queue()
+            self._wait_lists[name].put(workpackage)
+
+    def put_all(self, workpackages):
+        """Add all given workpackages, which are not queued yet, to the
+        queue. Already started workpackages are added first."""
+        workpackages = list(workpackages)
+        for workpackage in \
+                [wp for wp in workpackages if wp.started] + \
+                [wp for wp in workpackages if not wp.started]:
+            if not workpackage.queued:
+                workpackage.queued = True
+                self.put(workpackage)
 
     def update_queues(self, last_workpackage):
         """Check if a workpackage can move from waiting to work queue"""
-        if last_workpackage.done:
-            self._cnt_work[last_workpackage.step.name] -= 1
-            if (last_workpackage.step.name in self._wait_lists) and \
-               (not self._wait_lists[last_workpackage.step.name].empty()):
-                workpackage = \
-                    self._wait_lists[last_workpackage.step.name].get_nowait()
-                # Check if workpackage was started from another position
-                if not workpackage.started:
-                    self.put(workpackage)
-                else:
-                    self.update_queues(last_workpackage)
+        if not last_workpackage.done:
+            return
+        name = last_workpackage.step.name
+        if last_workpackage.id not in self._active.get(name, set()):
+            return
+        self._active[name].remove(last_workpackage.id)
+        wait_list = self._wait_lists.get(name)
+        while (wait_list is not None) and (not wait_list.empty()):
+            workpackage = wait_list.get_nowait()
+            # Check if workpackage was started from another position
+            if (workpackage.id not in self._active[name]) and \
+                    (not workpackage.done):
+                self.put(workpackage)
+                break
+
+    def finish(self, workpackage):
+        """Mark a done workpackage as finished. Return all of its children,
+        whose parents are all finished now."""
+        if (not workpackage.done) or (workpackage.id in self._finished):
+            return list()
+        self._finished.add(workpackage.id)
+        ready = list()
+        for child in workpackage.children:
+            if child.id in self._open_parents:
+                self._open_parents[child.id] -= 1
+            else:
+                # Children are created dynamically, so the counter is
+                # initialised by their first finished parent
+                self._open_parents[child.id] = \
+                    len([parent for parent in child.parents
+                         if parent.id not in self._finished])
+            if self._open_parents[child.id] == 0:
+                del self._open_parents[child.id]
+                ready.append(child)
+        return ready
 
     def get(self):
         """Get some workpackage from work queue"""
@@ -199,6 +262,15 @@ def id_dir(base_dir, id_number):
                                        id_number=id_number))
 
 
+# Number of cached parsed templates and expanded texts
+SUBSTITUTION_CACHE_SIZE = 4096
+
+_DOLLAR_COUNT_REGEX = \
+    re.compile(r"(^(?=\$)|[^$])((?:\$\$)+?)((?:\${3})?(?:[^$]|$))")
+_SINGLE_DOLLAR_REGEX = re.compile(r"\$(?=([\s]|$))")
+
+
+@functools.lru_cache(maxsize=SUBSTITUTION_CACHE_SIZE)
 def expand_dollar_count(text):
     # Replace a even number of $ by $$$$, because they will be
     # substituted to $$. Even number will stay the same, odd number
@@ -207,30 +279,281 @@ def expand_dollar_count(text):
     # $$$ -> $$$ -> $
     # $$$$ -> $$$$$$$$ -> $$$$
     # $$$$$ -> $$$$$$$ -> $$$
-    return re.sub(r"(^(?=\$)|[^$])((?:\$\$)+?)((?:\${3})?(?:[^$]|$))", r"\1\2\2\3", text)
+    return _DOLLAR_COUNT_REGEX.sub(r"\1\2\2\3", text)
+
+
+@functools.lru_cache(maxsize=SUBSTITUTION_CACHE_SIZE)
+def _template_tokens(text):
+    """Parse text in the same way as string.Template. Return a tuple of
+    literal strings and (name, placeholder) tuples."""
+    tokens = list()
+    literal = list()
+    pos = 0
+    for match in string.Template.pattern.finditer(text):
+        literal.append(text[pos:match.start()])
+        pos = match.end()
+        name = match.group("named") or match.group("braced")
+        if name is not None:
+            tokens.append("".join(literal))
+            tokens.append((name, match.group()))
+            literal = list()
+        else:
+            # escaped $$ or invalid placeholder
+            literal.append("$")
+    literal.append(text[pos:])
+    tokens.append("".join(literal))
+    return tuple(tokens)
+
+
+def _template_substitute(text, mapping):
+    """Equivalent to string.Template(text).safe_substitute(mapping) for
+    mappings containing string values"""
+    tokens = _template_tokens(text)
+    if len(tokens) == 1:
+        return tokens[0]
+    return "".join([mapping.get(token[0], token[1])
+                    if isinstance(token, tuple) else token
+                    for token in tokens])
+
+
+def _substitution_dicts(substitution_dict):
+    """Return the string and the escaped ($ -> $$) representation of all
+    values of substitution_dict"""
+    str_substitution_dict = dict([(k, str(v)) for k, v in
+                                  substitution_dict.items()])
+    # Preserve non evaluated parameter before starting substitution
+    local_substitution_dict = dict([(k, v.replace("$", "$$"))
+                                    if "$" in v else (k, v) for k, v in
+                                    str_substitution_dict.items()])
+    return str_substitution_dict, local_substitution_dict
+
+
+class SubstitutionDict(dict):
+
+    """Dictionary of substitution values. The representations needed by
+    substitution() are created once and updated when single entries are
+    changed."""
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._substitution_dicts = None
+
+    @property
+    def substitution_dicts(self):
+        """Return the string and the escaped representation of all values"""
+        if self._substitution_dicts is None:
+            self._substitution_dicts = _substitution_dicts(self)
+        return self._substitution_dicts
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        if self._substitution_dicts is not None:
+            str_substitution_dict, local_substitution_dict = \
+                self._substitution_dicts
+            value = str(value)
+            str_substitution_dict[key] = value
+            local_substitution_dict[key] = value.replace("$", "$$") \
+                if "$" in value else value
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        if self._substitution_dicts is not None:
+            del self._substitution_dicts[0][key]
+            del self._substitution_dicts[1][key]
+
+    def __ior__(self, other):
+        self._substitution_dicts = None
+        return dict.__ior__(self, other)
+
+    def clear(self):
+        self._substitution_dicts = None
+        dict.clear(self)
+
+    def pop(self, *args):
+        self._substitution_dicts = None
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._substitution_dicts = None
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._substitution_dicts = None
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._substitution_dicts = None
+        dict.update(self, *args, **kwargs)
+
+    def __reduce__(self):
+        # The representations are created again after unpickling
+        return (SubstitutionDict, (dict(self),))
+
+    def copy(self):
+        result = SubstitutionDict(self)
+        if self._substitution_dicts is not None:
+            result._substitution_dicts = \
+                (dict(self._substitution_dicts[0]),
+                 dict(self._substitution_dicts[1]))
+        return result
+
+    @staticmethod
+    def merge(substitution_dicts):
+        """Return a new SubstitutionDict containing the entries of all
+        given SubstitutionDicts, later entries overwrite earlier ones. The
+        existing representations are merged instead of created again."""
+        result = SubstitutionDict()
+        str_substitution_dict = dict()
+        local_substitution_dict = dict()
+        for substitution_dict in substitution_dicts:
+            dict.update(result, substitution_dict)
+            str_dict, local_dict = substitution_dict.substitution_dicts
+            str_substitution_dict.update(str_dict)
+            local_substitution_dict.update(local_dict)
+        result._substitution_dicts = (str_substitution_dict,
+                                      local_substitution_dict)
+        return result
+
+
+class CopyOnWriteDict(MutableMapping):
+
+    """Dictionary whose copies share an immutable base dictionary. Changes
+    are stored in a small overlay, which is merged into a new base once it
+    gets too large. The iteration order is the same as the order of a
+    normal dictionary with the same history of changes."""
+
+    # Minimum overlay size before it is merged into a new base
+    MIN_MERGE_SIZE = 16
+
+    def __init__(self, *args, **kwargs):
+        self._base = dict(*args, **kwargs)
+        self._overlay = dict()
+        # Keys of the base, which were deleted (and maybe added again)
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        value = self._overlay.get(key, self._overlay)
+        if value is not self._overlay:
+            return value
+        if key in self._deleted:
+            raise KeyError(key)
+        return self._base[key]
+
+    def __contains__(self, key):
+        return key in self._overlay or \
+            (key in self._base and key not in self._deleted)
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+        if len(self._overlay) > max(self.MIN_MERGE_SIZE,
+                                    len(self._base) // 2):
+            self._base = dict(self._iter_merged_items())
+            self._overlay = dict()
+            self._deleted = set()
+
+    def __delitem__(self, key):
+        if key in self._overlay:
+            del self._overlay[key]
+        elif key not in self:
+            raise KeyError(key)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __iter__(self):
+        if not self._overlay and not self._deleted:
+            return iter(self._base)
+        return self._iter_merged()
+
+    def _iter_merged(self):
+        """Iterate over the keys of the base and the overlay"""
+        for key, _ in self._iter_merged_items():
+            yield key
+
+    def _iter_merged_items(self):
+        """Iterate over the items of the base and the overlay"""
+        overlay = self._overlay
+        deleted = self._deleted
+        for key, value in self._base.items():
+            if key not in deleted:
+                yield key, overlay.get(key, value)
+        for key, value in overlay.items():
+            if key not in self._base or key in deleted:
+                yield key, value
+
+    def keys(self):
+        if not self._overlay and not self._deleted:
+            return self._base.keys()
+        return MutableMapping.keys(self)
+
+    def values(self):
+        if not self._overlay and not self._deleted:
+            return self._base.values()
+        return _CopyOnWriteValuesView(self)
+
+    def items(self):
+        if not self._overlay and not self._deleted:
+            return self._base.items()
+        return _CopyOnWriteItemsView(self)
+
+    def common_keys(self, other):
+        """Return set of all keys contained in both dictionaries. If both
+        dictionaries share the same base, the keys whose values are still
+        taken from this base map to identical values and are left out."""
+        keys = \
+            ((self._base.keys() - self._deleted) | self._overlay.keys()) & \
+            ((other._base.keys() - other._deleted) | other._overlay.keys())
+        if self._base is other._base:
+            keys &= self._overlay.keys() | other._overlay.keys()
+        return keys
+
+    def __len__(self):
+        return len(self._base) - len(self._deleted) + \
+            sum(1 for key in self._overlay
+                if key not in self._base or key in self._deleted)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        """Return a copy sharing the same base"""
+        result = CopyOnWriteDict()
+        result._base = self._base
+        result._overlay = dict(self._overlay)
+        result._deleted = set(self._deleted)
+        return result
+
+
+class _CopyOnWriteValuesView(ValuesView):
+
+    """Values view of a CopyOnWriteDict without single key lookups"""
+
+    def __iter__(self):
+        for _, value in self._mapping._iter_merged_items():
+            yield value
+
+
+class _CopyOnWriteItemsView(ItemsView):
+
+    """Items view of a CopyOnWriteDict without single key lookups"""
+
+    def __iter__(self):
+        return self._mapping._iter_merged_items()
 
 
 def substitution(text, substitution_dict):
     """Substitute templates given by parameter_dict inside of text"""
+    # Nothing to substitute
+    if "$" not in text:
+        return text
+    if isinstance(substitution_dict, SubstitutionDict):
+        str_substitution_dict, local_substitution_dict = \
+            substitution_dict.substitution_dicts
+    else:
+        str_substitution_dict, local_substitution_dict = \
+            _substitution_dicts(substitution_dict)
+
     changed = True
     count = 0
-    # All values must be string values (handle Python 2 separatly)
-    try:
-        str_substitution_dict = \
-            dict([(k, str(v).decode("utf-8", errors="ignore")) for k, v in
-                  substitution_dict.items()])
-    except TypeError:
-        str_substitution_dict = \
-            dict([(k, str(v).decode("utf-8", "ignore")) for k, v in
-                  substitution_dict.items()])
-    except AttributeError:
-        str_substitution_dict = dict([(k, str(v)) for k, v in
-                                      substitution_dict.items()])
-    # Preserve non evaluated parameter before starting substitution
-    local_substitution_dict = dict([(k, re.sub(r"\$", "$$", v)
-                                     if "$" in v else v) for k, v in
-                                    str_substitution_dict.items()])
-
     # Run multiple times to allow recursive parameter substitution
     while changed and count < jube.conf.MAX_RECURSIVE_SUB:
         count += 1
@@ -238,13 +561,12 @@ def substitution(text, substitution_dict):
         # Save double $$
         text = expand_dollar_count(text) \
             if "$" in text else text
-        tmp = string.Template(text)
-        new_text = tmp.safe_substitute(local_substitution_dict)
+        new_text = _template_substitute(text, local_substitution_dict)
         changed = new_text != orig_text
         text = new_text
     # Final substitution to remove $$
-    tmp = string.Template(text)
-    return re.sub("\$(?=([\s]|$))","$$",tmp.safe_substitute(str_substitution_dict))
+    text = _template_substitute(text, str_substitution_dict)
+    return _SINGLE_DOLLAR_REGEX.sub("$$", text) if "$" in text else text
 
 
 def convert_type(name, value_type, value, stop=True):
@@ -275,10 +597,107 @@ def convert_type(name, value_type, value, stop=True):
     return result_value
 
 
-def script_evaluation(cmd, script_type):
-    """cmd will be evaluated with given script language"""
+class ScriptCache(object):
+
+    """Cache of shell and perl evaluation results. The results are
+    addressed by a hash of the script type, the used shell, the command,
+    the current working directory and the values of all environment
+    variables used inside the command. If a filename is set, the results
+    are also stored in and loaded from this file."""
+
+    env_regex = re.compile(r"\$\{?([^\d\W]\w*)", re.UNICODE)
+
+    def __init__(self):
+        self._results = dict()
+        self._filename = None
+
+    @property
+    def filename(self):
+        """Return the file used to store the cache"""
+        return self._filename
+
+    @filename.setter
+    def filename(self, filename):
+        """Use filename to store the cache, existing results are loaded"""
+        if filename == self._filename:
+            return
+        self._filename = filename
+        if filename is None or not os.path.isfile(filename):
+            return
+        file_handle = open(filename, "r")
+        for line in file_handle:
+            try:
+                entry = json.loads(line)
+                self._results[entry["key"]] = entry["value"]
+            except (ValueError, KeyError):
+                # Ignore incomplete entries of an interrupted run
+                pass
+        file_handle.close()
+
+    @staticmethod
+    def key(cmd, script_type, shell):
+        """Return the cache key of the given command"""
+        env_names = sorted(set(ScriptCache.env_regex.findall(cmd)))
+        content = json.dumps([script_type, shell, cmd, os.getcwd(),
+                              [(name, os.environ.get(name))
+                               for name in env_names]])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached result or None"""
+        return self._results.get(key)
+
+    def put(self, key, value):
+        """Add a new result to the cache"""
+        self._results[key] = value
+        if self._filename is not None:
+            file_handle = open(self._filename, "a")
+            file_handle.write(json.dumps({"key": key, "value": value}) + "\n")
+            file_handle.close()
+
+    def clear(self):
+        """Remove all cached results"""
+        self._results = dict()
+        self._filename = None
+
+
+SCRIPT_CACHE = ScriptCache()
+
+
+def script_cache_scope():
+    """Return the scope of the script evaluation cache"""
+    scope = jube.conf.SCRIPT_CACHE
+    if "JUBE_SCRIPT_CACHE" in os.environ:
+        alt_scope = os.environ["JUBE_SCRIPT_CACHE"].strip().lower()
+        if len(alt_scope) > 0:
+            scope = alt_scope
+    if scope not in jube.conf.SCRIPT_CACHE_SCOPES:
+        raise ValueError(("Unknown script cache scope \"{0}\", use " +
+                          "one of: {1}").format(
+                              scope, ", ".join(jube.conf.SCRIPT_CACHE_SCOPES)))
+    return scope
+
+
+def creation_procs():
+    """Return the number of processes used to create workpackages"""
+    procs = str(jube.conf.CREATION_PROCS)
+    if "JUBE_CREATION_PROCS" in os.environ:
+        alt_procs = os.environ["JUBE_CREATION_PROCS"].strip()
+        if len(alt_procs) > 0:
+            procs = alt_procs
+    if not procs.isdigit() or int(procs) < 1:
+        raise ValueError(("Invalid number of workpackage creation " +
+                          "processes \"{0}\"").format(procs))
+    return int(procs)
+
+
+def script_evaluation(cmd, script_type, cache=None):
+    """cmd will be evaluated with given script language. Results of shell
+    and perl commands are cached, if the cache scope is not "none" (cache is
+    None), always (cache is True, in memory if the scope is "none") or
+    never (cache is False)."""
     if script_type == "python":
-        return str(eval(cmd))
+        return str(eval(compile_expression(cmd)))
     elif script_type in ["perl", "shell"]:
         if script_type == "perl":
             cmd = "perl -e \"print " + cmd + "\""
@@ -289,6 +708,16 @@ def script_evaluation(cmd, script_type):
             alt_shell = os.environ["JUBE_EXEC_SHELL"].strip()
             if len(alt_shell) > 0:
                 shell = alt_shell
+
+        cache_key = None
+        if cache is None:
+            cache = script_cache_scope() != "none"
+        if cache:
+            cache_key = ScriptCache.key(cmd, script_type, shell)
+            result = SCRIPT_CACHE.get(cache_key)
+            if result is not None:
+                return result
+
         sub = subprocess.Popen([shell, "-c", cmd], stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE, shell=False)
 
@@ -308,9 +737,180 @@ def script_evaluation(cmd, script_type):
                                  .format(cmd, stderr))
                 except UnicodeDecodeError:
                     pass
+            if cache_key is not None:
+                SCRIPT_CACHE.put(cache_key, stdout)
             return stdout
 
 
+@functools.lru_cache(maxsize=SUBSTITUTION_CACHE_SIZE)
+def compile_expression(cmd):
+    """Return the compiled code object of the python expression cmd"""
+    return compile(cmd, "<string>", "eval")
+
+
+# Number of cached compiled analyse pattern
+PATTERN_CACHE_SIZE = 1024
+
+_NEWLINE = ord("\n")
+# Character categories, which do not contain a newline character
+_NON_NEWLINE_CATEGORIES = (sre_constants.CATEGORY_DIGIT,
+                           sre_constants.CATEGORY_NOT_SPACE,
+                           sre_constants.CATEGORY_WORD,
+                           sre_constants.CATEGORY_NOT_LINEBREAK)
+_REPEAT_OPCODES = tuple(getattr(sre_constants, opcode) for opcode in
+                        ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                        if hasattr(sre_constants, opcode))
+
+
+def _matches_newline(items):
+    """Check if a parsed character set can match a newline character"""
+    negate = False
+    found = False
+    for opcode, argument in items:
+        if opcode == sre_constants.NEGATE:
+            negate = True
+        elif opcode == sre_constants.LITERAL:
+            found = found or argument == _NEWLINE
+        elif opcode == sre_constants.RANGE:
+            found = found or argument[0] <= _NEWLINE <= argument[1]
+        elif opcode == sre_constants.CATEGORY:
+            found = found or argument not in _NON_NEWLINE_CATEGORIES
+        else:
+            # Unknown set members might contain a newline
+            return True
+    return found != negate
+
+
+def _line_local(parsed):
+    """Check if a parsed regular expression (without DOTALL) can only
+    match inside a single line without looking at the beginning or the end
+    of the whole text"""
+    for opcode, argument in parsed:
+        if opcode == sre_constants.LITERAL:
+            if argument == _NEWLINE:
+                return False
+        elif opcode == sre_constants.NOT_LITERAL:
+            if argument != _NEWLINE:
+                return False
+        elif opcode == sre_constants.IN:
+            if _matches_newline(argument):
+                return False
+        elif opcode == sre_constants.AT:
+            if argument in (sre_constants.AT_BEGINNING_STRING,
+                            sre_constants.AT_END_STRING):
+                return False
+        elif opcode in _REPEAT_OPCODES:
+            if not _line_local(argument[2]):
+                return False
+        elif opcode == sre_constants.SUBPATTERN:
+            if argument[1] & sre_constants.SRE_FLAG_DOTALL or \
+                    not _line_local(argument[3]):
+                return False
+        elif opcode == sre_constants.BRANCH:
+            if not all(_line_local(branch) for branch in argument[1]):
+                return False
+        elif opcode in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if not _line_local(argument[1]):
+                return False
+        elif opcode == sre_constants.GROUPREF_EXISTS:
+            if not all(_line_local(branch) for branch in argument[1:]
+                       if branch is not None):
+                return False
+        elif opcode == getattr(sre_constants, "ATOMIC_GROUP", None):
+            if not _line_local(argument):
+                return False
+        elif opcode not in (sre_constants.ANY, sre_constants.GROUPREF):
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern, dotall=False):
+    """Return the compiled regular expression of an analyse pattern and
+    whether all of its matches are limited to a single line. Such a
+    pattern finds the same matches in a text and in all parts of the text,
+    which are split at line ends."""
+    flags = re.MULTILINE
+    if dotall:
+        flags |= re.DOTALL
+    regex = re.compile(pattern, flags)
+    line_local = not regex.flags & re.DOTALL and \
+        _line_local(sre_parse.parse(pattern, flags))
+    return regex, line_local
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_bytes_pattern(pattern, flags):
+    """Return the given ASCII regular expression compiled as bytes pattern,
+    to be used to scan the raw content of ASCII files. None is returned if
+    the pattern cannot be represented as bytes pattern."""
+    if not pattern.isascii():
+        return None
+    try:
+        return re.compile(pattern.encode("ascii"), flags & ~re.UNICODE)
+    except re.error:
+        return None
+
+# $name or ${name}, which is not directly connected to other names, numbers,
+# attributes or $
+_BOUND_VARIABLE_REGEX = re.compile(
+    r"(?<![\w.$])\$(?:\{([_a-zA-Z][_a-zA-Z0-9]*)\}|"
+    r"([_a-zA-Z][_a-zA-Z0-9]*))(?![\w.$])")
+# Non negative numbers, which can be used as an atom within an expression
+_BOUND_NUMBER_REGEX = re.compile(r"(?:0|[1-9][0-9]*)(?:\.[0-9]+)?$")
+
+
+@functools.lru_cache(maxsize=SUBSTITUTION_CACHE_SIZE)
+def _bound_expression(expression):
+    """Compile the python expression, every $name or ${name} is replaced by
+    a python variable. Return the code object and a tuple of
+    (parameter name, variable name) tuples or None if the parameters cannot
+    be used as variables without changing the meaning of the expression."""
+    names = dict()
+
+    def replace(match):
+        """Return variable name of the matched parameter"""
+        name = match.group(1) or match.group(2)
+        names[name] = "__jube_parameter_" + name
+        return names[name]
+
+    source, count = _BOUND_VARIABLE_REGEX.subn(replace, expression)
+    if count == 0 or "$" in source:
+        return None
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError:
+        return None
+    # Every replaced parameter must be a variable read, otherwise it was
+    # used inside of a string, as keyword or as assignment target
+    variables = set(names.values())
+    if count != sum(1 for node in ast.walk(tree)
+                    if isinstance(node, ast.Name) and
+                    isinstance(node.ctx, ast.Load) and node.id in variables):
+        return None
+    return compile(source, "<string>", "eval"), tuple(names.items())
+
+
+def bound_python_evaluation(expression, values):
+    """Evaluate the python expression by using the numbers inside values as
+    variables for $name and ${name} instead of compiling each substituted
+    expression text. Return the result string or None if the expression or
+    the values do not allow this (the expression must be substituted and
+    evaluated by using script_evaluation in this case)."""
+    bound = _bound_expression(expression)
+    if bound is None:
+        return None
+    code, names = bound
+    namespace = dict(globals())
+    for name, variable in names:
+        value = values.get(name)
+        if not isinstance(value, str) or \
+                not _BOUND_NUMBER_REGEX.match(value):
+            return None
+        namespace[variable] = float(value) if "." in value else int(value)
+    return str(eval(code, namespace))
+
+
 def eval_bool(cmd):
     """Evaluate a bool expression"""
     if cmd.lower() == "true":
@@ -319,7 +919,7 @@ def eval_bool(cmd):
         return False
     else:
         try:
-            return bool(eval(cmd))
+            return bool(eval(compile_expression(cmd)))
         except SyntaxError as se:
             raise ValueError(
                 ("\"{0}\" could not be evaluated and handled as boolean "
@@ -395,47 +995,43 @@ def read_timestamps(path):
 def resolve_depend(depend_dict):
     """Generate a serialization of dependent steps.
 
-    Return a list with a possible order of execution.
+    Return a list with a possible order of execution. Items which cannot be
+    resolved (cyclic dependencies or dependencies to unknown items) are
+    skipped.
     """
-    def find_next(dependencies, finished):
-        """Returns the next possible items to be processed and remainder.
-
-        dependencies  Dictionary containing the dependencies
-        finished      Set which is already processed
-        """
-        possible = set()
-        remain = dict()
-
-        for key, val in dependencies.items():
-            if val.issubset(finished):
-                possible.add(key)
-            else:
-                remain[key] = val
-
-        possible.difference_update(finished)
-        # no advance
-        if dependencies and not possible:
-            unresolved_steps = set(dependencies) - finished
-            unresolved_dependencies = set()
-            for step in unresolved_steps:
-                unresolved_dependencies.update(depend_dict[step] -
-                                               finished)
-            infostr = ("unresolved steps: {0}".
-                       format(",".join(unresolved_steps)) + "\n" +
-                       "unresolved dependencies: {0}".
-                       format(",".join(unresolved_dependencies)))
-            LOGGER.warning(infostr)
-
-        return (possible, remain)
-
-    finished = set()
-    work_list = list()
+    # Number of not yet resolved dependencies and reverse dependencies
+    # of each item
+    open_cnt = dict()
+    dependents = dict()
+    ready = deque()
+    for key, val in depend_dict.items():
+        open_cnt[key] = len(val)
+        for dependency in val:
+            dependents.setdefault(dependency, list()).append(key)
+        if not val:
+            ready.append(key)
 
-    work, remain = find_next(depend_dict, finished)
-    while work:
-        work_list += list(work)
-        finished.update(work)
-        work, remain = find_next(remain, finished)
+    work_list = list()
+    while ready:
+        key = ready.popleft()
+        work_list.append(key)
+        for dependent in dependents.get(key, ()):
+            open_cnt[dependent] -= 1
+            if open_cnt[dependent] == 0:
+                ready.append(dependent)
+
+    # no advance
+    if len(work_list) < len(depend_dict):
+        finished = set(work_list)
+        unresolved_steps = set(depend_dict) - finished
+        unresolved_dependencies = set()
+        for step in unresolved_steps:
+            unresolved_dependencies.update(depend_dict[step] - finished)
+        infostr = ("unresolved steps: {0}".
+                   format(",".join(unresolved_steps)) + "\n" +
+                   "unresolved dependencies: {0}".
+                   format(",".join(unresolved_dependencies)))
+        LOGGER.warning(infostr)
 
     return work_list
 
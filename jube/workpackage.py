@@ -64,10 +64,17 @@ class Workpackage(object):
         self._children = list()
         self._iteration_siblings = set()
         self._queued = False
+        # Workpackage stopped in a worker process at a shared operation
+        self._shared_pending = False
+        # ids of the other workpackages released by the last run
+        self._released_ids = list()
         self._env = dict(os.environ)
         self._cycle = cycle
         self._workpackage_dir_caching_enabled = False
         self._workpackage_dir_cache = None
+        # Cached state of the workpackage directory, None if unknown
+        self._started = None
+        self._state_files = None
 
     def etree_repr(self):
         """Return etree object representation"""
@@ -124,11 +131,9 @@ class Workpackage(object):
 
     @property
     def parameter_dict(self):
-        """get all available parameter inside a dict"""
-        # Collect parameter for substitution
-        parameter = dict([[par.name, par.value] for par in
-                          self._parameterset.constant_parameter_dict.values()])
-        return parameter
+        """get all available parameter inside a dict. The dictionary is
+        cached by the parameterset and must not be changed."""
+        return self._parameterset.value_dict
 
     @property
     def env(self):
@@ -166,38 +171,73 @@ class Workpackage(object):
         # Evaluate active state
         return jube.util.util.eval_bool(active)
 
+    def reconcile_state(self, scan=True):
+        """Synchronise cached workpackage state with the filesystem by
+        scanning the workpackage directory once. scan=False can be used
+        if the caller already knows, that the directory does not exist.
+        Return True if the cached state was changed."""
+        old_state = (self._started, self._state_files)
+        self._state_files = set()
+        self._started = False
+        if scan:
+            try:
+                self._state_files = set(entry.name for entry in
+                                        os.scandir(self.workpackage_dir))
+                self._started = True
+            except FileNotFoundError:
+                pass
+        return old_state != (self._started, self._state_files)
+
+    def _state_file_exists(self, filename):
+        """Check if a state file exists inside the workpackage directory"""
+        if self._state_files is None:
+            self.reconcile_state()
+        exist = filename in self._state_files
+        if jube.conf.DEBUG_MODE:
+            exist = exist or (filename + "_DEBUG") in self._state_files
+        return exist
+
+    def _set_state_file(self, filename, content=None):
+        """Create (content is not None) or remove a state file inside the
+        workpackage directory"""
+        if jube.conf.DEBUG_MODE:
+            filename = filename + "_DEBUG"
+        path = os.path.join(self.workpackage_dir, filename)
+        if content is not None:
+            fout = open(path, "w")
+            fout.write(content)
+            fout.close()
+            if self._state_files is not None:
+                self._state_files.add(filename)
+        elif self._state_files is None or filename in self._state_files:
+            if os.path.exists(path):
+                os.remove(path)
+            if self._state_files is not None:
+                self._state_files.discard(filename)
+
     @property
     def done(self):
         """Workpackage done?"""
-        done_file = os.path.join(self.workpackage_dir,
-                                 jube.conf.WORKPACKAGE_DONE_FILENAME)
-        exist = os.path.exists(done_file)
-        if jube.conf.DEBUG_MODE:
-            exist = exist or os.path.exists(done_file + "_DEBUG")
-        return exist
+        return self._state_file_exists(jube.conf.WORKPACKAGE_DONE_FILENAME)
 
     @done.setter
     def done(self, set_done):
         """Set/reset Workpackage done"""
-        done_file = os.path.join(self.workpackage_dir,
-                                 jube.conf.WORKPACKAGE_DONE_FILENAME)
-        if jube.conf.DEBUG_MODE:
-            done_file = done_file + "_DEBUG"
         if set_done:
-            fout = open(done_file, "w")
-            fout.write(jube.util.util.now_str())
-            fout.close()
+            self._set_state_file(jube.conf.WORKPACKAGE_DONE_FILENAME,
+                                 jube.util.util.now_str())
             self._remove_operation_info_files()
         else:
-            if os.path.exists(done_file):
-                os.remove(done_file)
+            self._set_state_file(jube.conf.WORKPACKAGE_DONE_FILENAME)
+        self._benchmark.update_workpackage_status(self)
 
     @property
     def error(self):
         """Workpackage error?"""
-        error_file = os.path.join(self.workpackage_dir,
-                                  jube.conf.WORKPACKAGE_ERROR_FILENAME)
-        return os.path.exists(error_file)
+        error_file = jube.conf.WORKPACKAGE_ERROR_FILENAME
+        if self._state_files is None:
+            self.reconcile_state()
+        return error_file in self._state_files
 
     def set_error(self, set_error, msg=""):
         """Set/reset Workpackage error"""
@@ -207,9 +247,15 @@ class Workpackage(object):
             fout = open(error_file, "w")
             fout.write(msg)
             fout.close()
+            if self._state_files is not None:
+                self._state_files.add(jube.conf.WORKPACKAGE_ERROR_FILENAME)
         else:
             if os.path.exists(error_file):
                 os.remove(error_file)
+            if self._state_files is not None:
+                self._state_files.discard(
+                    jube.conf.WORKPACKAGE_ERROR_FILENAME)
+        self._benchmark.update_workpackage_status(self)
 
     @property
     def queued(self):
@@ -224,7 +270,9 @@ class Workpackage(object):
     @property
     def started(self):
         """Workpackage started?"""
-        return os.path.exists(self.workpackage_dir)
+        if self._started is None:
+            self.reconcile_state()
+        return self._started
 
     def operation_done_but_pending(self, operation_number):
         """Check if an operation was executed, but the result is still
@@ -252,32 +300,54 @@ class Workpackage(object):
             result = False
         return result
 
+    def pending_watch_files(self):
+        """Return the paths of the done_file, error_file and break_file of
+        the operation, whose done_file the workpackage is waiting for. Each
+        of these files can continue the workpackage. Return an empty list if
+        the workpackage does not wait for any done_file."""
+        if self.done or self.error or not self.started:
+            return list()
+        parameter_dict = self.parameter_dict
+        for operation_number, operation in enumerate(self._step.operations):
+            if self.operation_done(operation_number + 1) or \
+                    not operation.active(parameter_dict):
+                continue
+            # Only an already executed operation can wait for its done_file
+            if (operation.async_filename is None) or \
+                    (not self.operation_done(operation_number)):
+                return list()
+            if operation.shared:
+                shared_parameter = dict(parameter_dict)
+                for jube_parameter in self.get_jube_parameterset()\
+                        .all_parameter_names:
+                    if jube_parameter in shared_parameter:
+                        del shared_parameter[jube_parameter]
+                return operation.watched_file_paths(
+                    shared_parameter, self._step.shared_folder_path(
+                        self._benchmark.bench_dir, shared_parameter))
+            work_dir = self.alt_work_dir(parameter_dict)
+            if work_dir is None:
+                work_dir = self.work_dir
+            return operation.watched_file_paths(parameter_dict, work_dir)
+        return list()
+
     def operation_done(self, operation_number, set_done=None):
         """Mark/checks operation status"""
-        done_file = os.path.join(self.workpackage_dir,
-                                 "wp_{0}_{1:02d}".format(
-                                     jube.conf.WORKPACKAGE_DONE_FILENAME,
-                                     operation_number))
+        done_file = "wp_{0}_{1:02d}".format(
+            jube.conf.WORKPACKAGE_DONE_FILENAME, operation_number)
         if set_done is None:
-            exist = os.path.exists(done_file)
-            if jube.conf.DEBUG_MODE:
-                exist = exist or os.path.exists(done_file + "_DEBUG")
-            return exist
+            return self._state_file_exists(done_file)
         else:
-            if jube.conf.DEBUG_MODE:
-                done_file = done_file + "_DEBUG"
-            elif ((set_done and not os.path.exists(done_file)) or
-                  (not set_done and os.path.exists(done_file))):
+            if not jube.conf.DEBUG_MODE and \
+                    (set_done != self._state_file_exists(done_file)):
                 jube.util.util.update_timestamps(
                     os.path.join(self._benchmark.bench_dir,
                                  jube.conf.TIMESTAMPS_INFO),
                     "change")
             if set_done:
-                fout = open(done_file, "w")
-                fout.close()
+                self._set_state_file(done_file, "")
             else:
-                if os.path.exists(done_file):
-                    os.remove(done_file)
+                self._set_state_file(done_file)
             return set_done
 
     def _remove_operation_info_files(self):
@@ -290,6 +360,8 @@ class Workpackage(object):
         for children in self.children:
             children.remove(remove_config_from_benchmark=True)
         shutil.rmtree(self.workpackage_dir, ignore_errors=True)
+        self.reconcile_state(scan=False)
+        self._benchmark.update_workpackage_status(self)
 
         # Remove shared folder if all workpackages of the current step were
         # removed
@@ -524,6 +596,9 @@ class Workpackage(object):
                                    .format(self.workpackage_dir))
             os.mkdir(self.workpackage_dir)
             os.mkdir(self.work_dir)
+            if self._state_files is not None:
+                self._started = True
+            self._benchmark.update_workpackage_status(self)
 
         # Create symbolic link to parent workpackage folder
         for parent in self._parents:
@@ -565,12 +640,9 @@ class Workpackage(object):
                 self._workpackage_dir_cache is None:
             suffix = self.step.suffix
             if suffix != "":
-                # Collect parameter for substitution
-                parameter = \
-                    dict([[par.name, par.value] for par in
-                          self._parameterset.constant_parameter_dict.values()])
                 # Parameter substitution
-                suffix = jube.util.util.substitution(suffix, parameter)
+                suffix = jube.util.util.substitution(suffix,
+                                                     self.parameter_dict)
                 suffix = "_" + os.path.expandvars(os.path.expanduser(suffix))
             path = "{path}_{step_name}{suffix}".format(
                 path=jube.util.util.id_dir(
@@ -610,112 +682,102 @@ class Workpackage(object):
         continue_cycle = True
         doLog = jube.step.DoLog(log_dir=os.path.dirname(
             self.work_dir), log_file=self.step._do_log_file, initial_env=self.env, cycle=self._cycle)
-        for operation_number, operation in enumerate(self._step.operations):
-            # Check if the operation is activated
-            active = operation.active(parameter)
-            if not active:
-                self.operation_done(operation_number, True)
-            # Do nothing, if the next operation is already finished.
-            # Otherwise a removed async_file will result in a new
-            # pending operation, if there are two async-operations in
-            # a row
-            elif not self.operation_done(operation_number + 1):
-                # shared operation
+        # all not shared operations can use the same shell process, it
+        # terminates as soon as the session is closed or garbage collected
+        session = None
+        if self._step.shell_session and not jube.conf.DEBUG_MODE:
+            session = jube.step.ShellSession()
+        try:
+            for operation_number, operation in \
+                    enumerate(self._step.operations):
                 if operation.shared:
-                    # wait for all other workpackages and check if shared
-                    # operation already finished
-                    shared_done = False
-                    for workpackage in \
-                            self._benchmark.workpackages[self._step.name]:
-                        # All workpackages must reach the same position in
-                        # the program
-                        if operation_number > 0:
-                            continue_op = continue_op and \
-                                ((workpackage.operation_done(
-                                    operation_number - 1) and
-                                  (not workpackage.operation_done_but_pending(
-                                      operation_number - 1))
-                                  ) or
-                                 workpackage.done) and \
-                                workpackage.cycle == self._cycle
-                        # Check if another workpackage already finalized
-                        # the operation, only if the operation was active
-                        # for this particular workpackage
-                        shared_done = shared_done or \
-                            ((workpackage.operation_done(
-                                operation_number + 1) or workpackage.done
-                              ) and
-                             operation.active(workpackage.parameter_dict))
-
-                    # If a workpackage is removed and restarted, a shared
-                    # operation will not be re-executed, user should be warned
-                    if shared_done and not self.operation_done(
-                            operation_number):
-                        LOGGER.warning(
-                            "\nShared operation in {0} was already executed".
-                            format(self._step.name))
-
-                    # All older workpackages in tree must be done
-                    for step_name in self._step.get_depend_history(
-                            self._benchmark):
-                        for workpackage in self._benchmark.workpackages[
-                                step_name]:
-                            continue_op = continue_op and workpackage.done
-
-                    if continue_op and not shared_done:
-                        # remove workpackage specific parameter
-                        shared_parameter = dict(parameter)
-                        for jube_parameter in self.get_jube_parameterset()\
-                                .all_parameter_names:
-                            if jube_parameter in shared_parameter:
-                                del shared_parameter[jube_parameter]
-
-                        # work_dir = shared_dir
-                        shared_dir = \
-                            self._step.shared_folder_path(
-                                self._benchmark.bench_dir, shared_parameter)
-
-                        LOGGER.debug("====== {0} - shared ======"
-                                     .format(self._step.name))
+                    # All previous operations are finished, so the workpackage
+                    # reached the barrier of the shared operation
+                    barrier = self._benchmark.shared_operation_barrier(
+                        self._step, operation_number, self._cycle)
+                    barrier.arrive(self)
+                # Check if the operation is activated
+                active = operation.active(parameter)
+                if not active:
+                    self.operation_done(operation_number, True)
+                # Do nothing, if the next operation is already finished.
+                # Otherwise a removed async_file will result in a new
+                # pending operation, if there are two async-operations in
+                # a row
+                elif not self.operation_done(operation_number + 1):
+                    # The barrier state of a worker process can be outdated,
+                    # therefore shared operations are only executed by the
+                    # main process, which also releases the workpackages
+                    if operation.shared and (pid is not None):
+                        if not self.operation_done(operation_number) or \
+                                operation.async_filename is not None:
+                            self._shared_pending = True
+                            continue_op = False
+                    # shared operation
+                    elif operation.shared:
+                        # wait for all other workpackages and check if shared
+                        # operation already finished
+                        shared_done = barrier.executed
+
+                        # If a workpackage is removed and restarted, a
+                        # shared operation will not be re-executed, user
+                        # should be warned
+                        if shared_done and not self.operation_done(
+                                operation_number):
+                            LOGGER.warning(
+                                "\nShared operation in {0} was already "
+                                "executed".format(self._step.name))
 
+                        # All workpackages must reach the same position in
+                        # the program and all older workpackages in tree must
+                        # be done
+                        continue_op = continue_op and barrier.complete
+
+                        if continue_op and not shared_done:
+                            # remove workpackage specific parameter
+                            shared_parameter = dict(parameter)
+                            for jube_parameter in self.get_jube_parameterset()\
+                                    .all_parameter_names:
+                                if jube_parameter in shared_parameter:
+                                    del shared_parameter[jube_parameter]
+
+                            # work_dir = shared_dir
+                            shared_dir = \
+                                self._step.shared_folder_path(
+                                    self._benchmark.bench_dir,
+                                    shared_parameter)
+
+                            LOGGER.debug("====== {0} - shared ======"
+                                         .format(self._step.name))
+
+                            continue_op, continue_cycle = operation.execute(
+                                parameter_dict=shared_parameter,
+                                work_dir=shared_dir,
+                                environment=self._env,
+                                only_check_pending=self.operation_done(
+                                    operation_number),
+                                dolog=doLog)
+
+                            # update and requeue all workpackages
+                            self._released_ids += [
+                                workpackage.id for workpackage in
+                                barrier.release(continue_op, continue_cycle)
+                                if workpackage is not self]
+                            LOGGER.debug("======================={0}"
+                                         .format(len(self._step.name) * "="))
+                    else:
                         continue_op, continue_cycle = operation.execute(
-                            parameter_dict=shared_parameter,
-                            work_dir=shared_dir,
+                            parameter_dict=parameter, work_dir=work_dir,
                             environment=self._env,
                             only_check_pending=self.operation_done(
-                                operation_number),
-                            dolog=doLog)
-
-                        # update all workpackages
-                        for workpackage in self._benchmark.workpackages[
-                                self._step.name]:
-                            # if the operation wasn't active in the shared
-                            # operation it must not be triggered to
-                            # restart
-                            if operation.active(
-                                    workpackage.parameter_dict):
-                                if not workpackage.started:
-                                    workpackage.create_workpackage_dir()
-                                workpackage.operation_done(
-                                    operation_number, True)
-                                if continue_op and not continue_cycle:
-                                    workpackage.done = True
-                                # requeue other workpackages
-                                if not workpackage.queued and continue_op:
-                                    self._benchmark.work_stat.put(
-                                        workpackage)
-                        LOGGER.debug("======================={0}"
-                                     .format(len(self._step.name) * "="))
-                else:
-                    continue_op, continue_cycle = operation.execute(
-                        parameter_dict=parameter, work_dir=work_dir,
-                        environment=self._env,
-                        only_check_pending=self.operation_done(
-                            operation_number), pid=pid,
-                        dolog=doLog)
-                    self.operation_done(operation_number, True)
-            if not continue_op or not continue_cycle:
-                break
+                                operation_number), pid=pid,
+                            dolog=doLog, session=session)
+                        self.operation_done(operation_number, True)
+                if not continue_op or not continue_cycle:
+                    break
+        finally:
+            if session is not None:
+                session.close()
         return continue_op, continue_cycle
 
     def run(self, mode='s'):
@@ -732,6 +794,9 @@ class Workpackage(object):
                 self.benchmark.bench_dir,
                 log_fname.replace('.', '_{}.').format(proc_id) if (('_'+str(proc_id)) not in log_fname) else log_fname))
 
+        self._shared_pending = False
+        self._released_ids = list()
+
         # Workpackage already done or error?
         if self.done or self.error:
             # the return value is only relevant for the parallel case, for now
@@ -916,8 +981,99 @@ class Workpackage(object):
             parameterDeletionList = None
 
         return {"id": self._id, "step_name": self._step.name, "env": self._env,
-                "cycle": self._cycle, "parameterset": self._parameterset}
+                "cycle": self._cycle, "parameterset": self._parameterset,
+                "shared_pending": self._shared_pending,
+                "released": self._released_ids}
 
     @staticmethod
     def reduce_workpackage_id_counter():
         Workpackage.id_counter = Workpackage.id_counter - 1
+
+
+class SharedOperationBarrier(object):
+
+    """A SharedOperationBarrier synchronises all workpackages of a step
+    reaching the same shared operation within the same cycle. Workpackages
+    are counted once when they arrive, the shared operation is executed
+    once, when all workpackages arrived, and all workpackages are released
+    afterwards.
+    """
+
+    def __init__(self, benchmark, step, operation_number, cycle):
+        self._benchmark = benchmark
+        self._step = step
+        self._operation_number = operation_number
+        self._operation = step.operations[operation_number]
+        self._cycle = cycle
+        self._arrived = set()
+        self._active = dict()
+        self._history_done = False
+        self._executed = False
+        # Restore the state of workpackages of a former run
+        for workpackage in benchmark.workpackages[step.name]:
+            if workpackage.done or (
+                    workpackage.cycle == cycle and
+                    (operation_number == 0 or
+                     (workpackage.operation_done(operation_number - 1) and
+                      not workpackage.operation_done_but_pending(
+                          operation_number - 1)))):
+                self._arrived.add(workpackage.id)
+            if not self._executed and \
+                    (workpackage.operation_done(operation_number + 1) or
+                     workpackage.done) and self.active(workpackage):
+                self._executed = True
+
+    def arrive(self, workpackage):
+        """Mark the workpackage as arrived"""
+        if workpackage.done or workpackage.cycle == self._cycle:
+            self._arrived.add(workpackage.id)
+
+    def active(self, workpackage):
+        """Check if the shared operation is active for the workpackage"""
+        if workpackage.id not in self._active:
+            self._active[workpackage.id] = \
+                self._operation.active(workpackage.parameter_dict)
+        return self._active[workpackage.id]
+
+    @property
+    def executed(self):
+        """Shared operation was already executed"""
+        return self._executed
+
+    @property
+    def complete(self):
+        """Check if all workpackages of the step arrived and all
+        workpackages of the steps in the dependency history are done"""
+        if self._operation_number > 0 and \
+                len(self._arrived) < \
+                len(self._benchmark.workpackages[self._step.name]):
+            return False
+        if not self._history_done:
+            self._history_done = all(
+                workpackage.done
+                for step_name in self._step.get_depend_history(
+                    self._benchmark)
+                for workpackage in self._benchmark.workpackages[step_name])
+        return self._history_done
+
+    def release(self, continue_op, continue_cycle):
+        """Update all workpackages after the shared operation was executed
+        and requeue them, if the operation is not pending anymore. Return
+        all updated workpackages."""
+        if continue_op:
+            self._executed = True
+        released = list()
+        for workpackage in self._benchmark.workpackages[self._step.name]:
+            # if the operation wasn't active in the shared operation it
+            # must not be triggered to restart
+            if self.active(workpackage):
+                if not workpackage.started:
+                    workpackage.create_workpackage_dir()
+                workpackage.operation_done(self._operation_number, True)
+                if continue_op and not continue_cycle:
+                    workpackage.done = True
+                released.append(workpackage)
+                # requeue other workpackages
+                if not workpackage.queued and continue_op:
+                    self._benchmark.work_stat.put(workpackage)
+        return released
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# JUBE Benchmarking Environment
+# Copyright (C) 2008-2024
+# Forschungszentrum Juelich GmbH, Juelich Supercomputing Centre
+# http://www.fz-juelich.de/jsc/jube
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Analyser related tests"""
+
+from __future__ import (print_function,
+                        unicode_literals,
+                        division)
+
+import os
+import json
+import math
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import types
+import unittest
+import warnings
+import jube.analyser
+import jube.parameter
+import jube.pattern
+
+
+def legacy_statistic(match_lists):
+    """Former calculation of the statistic values of a pattern, which
+    are found in multiple files"""
+    pattern_dict = dict()
+    for match_list in match_lists:
+        if len(match_list) == 0:
+            continue
+        if "first" not in pattern_dict:
+            pattern_dict["first"] = match_list[0]
+        for match in match_list:
+            pattern_dict["min"] = min(pattern_dict.get("min", match), match)
+            pattern_dict["max"] = max(pattern_dict.get("max", match), match)
+            if "sum" in pattern_dict:
+                pattern_dict["sum"] += match
+                pattern_dict["sum2"] += match ** 2
+            else:
+                pattern_dict["sum"] = match
+                pattern_dict["sum2"] = match ** 2
+            pattern_dict["cnt"] = pattern_dict.get("cnt", 0) + 1
+        pattern_dict["last"] = match_list[-1]
+    return pattern_dict
+
+
+class DummyWorkpackage(object):
+
+    """Minimal root workpackage replacement"""
+
+    def __init__(self):
+        self.parameterset = jube.parameter.Parameterset()
+
+
+class TestAnalyser(unittest.TestCase):
+
+    """Analyser test class"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        rand = random.Random(4)
+        self.files = list()
+        self.values = list()
+        for i in range(4):
+            values = [rand.uniform(-1e5, 1e5) for _ in range(200)]
+            if i == 2:
+                values = list()
+            path = os.path.join(self.tmp_dir, "out_{0}.log".format(i))
+            out = open(path, "w")
+            for value in values:
+                out.write("value: {0!r} id: {1}\n".format(
+                    value, rand.randint(0, 9)))
+            out.close()
+            self.files.append(path)
+            self.values.append(values)
+        self.patternset = jube.pattern.Patternset()
+        self.patternset.add_pattern(jube.pattern.Pattern(
+            "value", "value: $jube_pat_fp", content_type="float"))
+        self.patternset.add_pattern(jube.pattern.Pattern(
+            "id", "id: $jube_pat_int", content_type="int"))
+        self.patternset.add_pattern(jube.pattern.Pattern(
+            "line", "^(value)", default="none"))
+        self.patternset.add_pattern(jube.pattern.Pattern(
+            "sum", "$value_sum + $id_cnt", pattern_mode="python",
+            content_type="float"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def analyse(self, procs, file_cache=None, analyser=None):
+        """Analyse all files as files of one workpackage"""
+        if analyser is None:
+            analyser = jube.analyser.Analyser("analyser")
+        analyser.benchmark = types.SimpleNamespace(bench_dir=self.tmp_dir)
+        analyser._file_patternsets = dict()
+        if file_cache is None:
+            analyser._cached_files = dict()
+            analyser._file_cache = None
+        else:
+            analyser._cached_files = file_cache
+            analyser._file_cache = dict()
+        parameterset = jube.parameter.Parameterset()
+        result_dict = dict()
+        pending = [(result_dict, DummyWorkpackage(), self.patternset.copy(),
+                    [(path, frozenset(), parameterset)
+                     for path in self.files])]
+        analyser._analyse_workpackages(self.patternset, pending, procs)
+        return result_dict
+
+    def test_statistic(self):
+        """Test statistic values of multiple files"""
+        result_dict = self.analyse(1)
+        expected = legacy_statistic(self.values)
+        for option in ["first", "last", "min", "max", "sum", "sum2", "cnt"]:
+            self.assertEqual(repr(result_dict["value_" + option]),
+                             repr(expected[option]))
+        self.assertEqual(result_dict["value"], self.values[0][0])
+        self.assertEqual(result_dict["line_cnt"], 600)
+        self.assertEqual(result_dict["sum"],
+                         result_dict["value_sum"] + 600)
+
+        # Scanning in small chunks gives the same result
+        chunk_size = jube.analyser.Analyser.CHUNK_SIZE
+        jube.analyser.Analyser.CHUNK_SIZE = 1000
+        try:
+            self.assertEqual(repr(self.analyse(1)), repr(result_dict))
+        finally:
+            jube.analyser.Analyser.CHUNK_SIZE = chunk_size
+
+    def test_parallel_analyse(self):
+        """Test scanning files by multiple processes"""
+        self.assertEqual(repr(self.analyse(3)), repr(self.analyse(1)))
+
+    def test_standard_deviation(self):
+        """Test standard deviation of values with a large offset"""
+        values = [1e9 + value for value in [4, 7, 13, 16] * 3000]
+        for cnt in [[12000], [5000, 7000], [1, 4095, 4097, 3807]]:
+            statistic = jube.analyser.Analyser.PatternStatistic()
+            start = 0
+            for batch_cnt in cnt:
+                jube.analyser.Analyser._add_matches(
+                    statistic, [batch_cnt, values[start], None,
+                                values[start:start + batch_cnt]], "float")
+                start += batch_cnt
+            statistic.flush()
+            self.assertAlmostEqual(statistic.standard_deviation(),
+                                   math.sqrt(22.5 * 12000 / 11999), places=9)
+            self.assertEqual(statistic["sum"], 12000 * 1e9 + 120000)
+            self.assertEqual(statistic["cnt"], 12000)
+
+    def test_large_standard_deviation(self):
+        """Test standard deviation of values, whose squares overflow"""
+        values = [1e200, 2e200, 3.0] * 2000
+        for cnt in [[6000], [1, 4095, 1904]]:
+            statistic = jube.analyser.Analyser.PatternStatistic()
+            start = 0
+            for batch_cnt in cnt:
+                jube.analyser.Analyser._add_matches(
+                    statistic, [batch_cnt, values[start], None,
+                                values[start:start + batch_cnt]], "float")
+                start += batch_cnt
+            statistic.flush()
+            self.assertTrue(math.isnan(statistic["sum2"]))
+            self.assertTrue(math.isclose(statistic.standard_deviation(),
+                                         statistics.stdev(values),
+                                         rel_tol=1e-12))
+
+    @unittest.skipIf(jube.analyser.numpy is None, "numpy not available")
+    def test_numpy_statistic(self):
+        """Test combining float values by numpy"""
+        rand = random.Random(2)
+        values = [rand.uniform(-1e5, 1e5) for _ in range(10000)]
+        values[3] = float("nan")
+        values[500] = 0.0
+        values[501] = -0.0
+        values[700] = 1e200
+        for start in [[], [float("nan")], [-0.0], [1e300]]:
+            python_dict = dict()
+            numpy_dict = dict()
+            if len(start) > 0:
+                jube.analyser.Analyser._add_values(python_dict, start)
+                jube.analyser.Analyser._add_values(numpy_dict, start)
+            jube.analyser.Analyser._add_values(python_dict, values)
+            # Overflows must not be reported by numpy itself
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                jube.analyser.Analyser._add_float_values(numpy_dict, values)
+            self.assertEqual(repr(numpy_dict), repr(python_dict))
+            for option in numpy_dict:
+                self.assertIs(type(numpy_dict[option]), float)
+
+    def test_mapped_file(self):
+        """Test scanning files by pattern, whose matches can cross lines"""
+        patternset = jube.pattern.Patternset()
+        patternset.add_pattern(jube.pattern.Pattern(
+            "value", r"value:\s+$jube_pat_fp", content_type="float"))
+        patternset.add_pattern(jube.pattern.Pattern(
+            "pair", r"id: (\d)\s+(v)?", content_type="string"))
+        patternset.add_pattern(jube.pattern.Pattern(
+            "line", ".*", dotall=True))
+        patternset.add_pattern(jube.pattern.Pattern(
+            "id", "id: $jube_pat_int", content_type="int"))
+        parameterset = jube.parameter.Parameterset()
+        analyser = jube.analyser.Analyser("analyser")
+        for path in self.files:
+            patternlist = analyser._substituted_pattern(
+                patternset, parameterset, frozenset())
+            file_patternlist = [(pattern, regex)
+                                for pattern, regex, _ in patternlist]
+            mapped_file = analyser._map_file(path, file_patternlist)
+            if os.path.getsize(path) == 0:
+                self.assertIsNone(mapped_file)
+            else:
+                self.assertIsNotNone(mapped_file)
+                mapped_file.close()
+            text_file = open(path, "r")
+            expected = analyser._data_matches(text_file.read(),
+                                              file_patternlist)
+            text_file.close()
+            batch_size = jube.analyser.Analyser.MATCH_BATCH_SIZE
+            try:
+                for match_batch_size in [1000, 1]:
+                    jube.analyser.Analyser.MATCH_BATCH_SIZE = \
+                        match_batch_size
+                    self.assertEqual(
+                        repr(analyser.scan_file(path, patternlist)),
+                        repr(expected))
+            finally:
+                jube.analyser.Analyser.MATCH_BATCH_SIZE = batch_size
+
+        # Files which cannot be scanned as bytes
+        for content in ["value: 1\r\nvalue: 2\r\n", "value:\x1c2\n",
+                        "valu\u00e9: 3\nvalue: 4\n"]:
+            path = os.path.join(self.tmp_dir, "special.log")
+            out = open(path, "w", newline="")
+            out.write(content)
+            out.close()
+            self.assertIsNone(analyser._map_file(path, file_patternlist))
+            result_dict, _ = analyser._analyse_file(path, patternset,
+                                                    parameterset)
+            text_file = open(path, "r")
+            self.assertEqual(result_dict["value_cnt"], len(
+                re.findall(r"value:\s+\d", text_file.read())))
+            text_file.close()
+
+    def test_file_cache(self):
+        """Test reusing the matches of unchanged files"""
+        analyser = jube.analyser.Analyser("analyser")
+        result_dict = self.analyse(1, dict(), analyser)
+        # The cache is stored as JSON by the benchmark
+        file_cache = json.loads(json.dumps(analyser.file_cache))
+        self.assertEqual(sorted(file_cache),
+                         ["out_0.log", "out_1.log", "out_2.log", "out_3.log"])
+
+        # Cached matches are used, if neither files nor pattern are changed
+        analyser._file_matches = None
+        for procs in [1, 3]:
+            self.assertEqual(repr(self.analyse(procs, file_cache, analyser)),
+                             repr(result_dict))
+        self.assertEqual(analyser.file_cache, file_cache)
+
+        # Changed files are scanned again
+        del analyser._file_matches
+        out = open(self.files[1], "a")
+        out.write("value: 1e6 id: 2\n")
+        out.close()
+        result_dict = self.analyse(1, file_cache, analyser)
+        self.assertEqual(result_dict["value_max"], 1e6)
+        self.assertEqual(repr(result_dict), repr(self.analyse(1)))
+
+        # Changed pattern are scanned again
+        file_cache = analyser.file_cache
+        self.patternset = jube.pattern.Patternset()
+        self.patternset.add_pattern(jube.pattern.Pattern(
+            "value", "value: $jube_pat_int", content_type="int"))
+        result_dict = self.analyse(1, file_cache, analyser)
+        self.assertIs(type(result_dict["value_sum"]), int)
+        self.assertEqual(repr(result_dict), repr(self.analyse(1)))
+        self.assertEqual(len(analyser.file_cache["out_0.log"]["matches"]), 1)
+
+        # Files containing too many numerical matches are not cached
+        analyser.CACHE_MAX_VALUES = 100
+        self.analyse(1, dict(), analyser)
+        self.assertEqual(list(analyser.file_cache), ["out_2.log"])
+
+
+if __name__ == "__main__":
+    unittest.main()
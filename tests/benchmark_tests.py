@@ -26,10 +26,14 @@ import re
 import unittest
 import shutil
 import os
+import threading
+import time
 import jube.step
 import jube.parameter
 import jube.benchmark
 import jube.workpackage
+import jube.conf
+import jube.jubeio
 
 
 class TestBenchmark(unittest.TestCase):
@@ -74,6 +78,188 @@ class TestBenchmark(unittest.TestCase):
                     "bench_run/000000/"+i+"_execution/work/"+j))
         shutil.rmtree('bench_run')
 
+    def test_benchmark_status(self):
+        """Test benchmark status table"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        status = self.benchmark.benchmark_status
+        self.assertEqual(status["all"], 4)
+        self.assertEqual(status["done"], 4)
+        workpackages = self.benchmark.workpackages["execution"]
+        workpackages[0].done = False
+        workpackages[1].done = False
+        workpackages[1].set_error(True, "error")
+        workpackages[2].remove()
+        status = self.benchmark.workpackage_status["execution"]
+        self.assertEqual(status, {"all": 4, "open": 1, "wait": 1,
+                                  "error": 1, "done": 1})
+        self.benchmark.remove_workpackage(workpackages[3])
+        status = self.benchmark.benchmark_status
+        self.assertEqual(status["all"], 3)
+        self.assertEqual(status["done"], 0)
+        shutil.rmtree('bench_run')
+
+    def test_workpackage_state_reconciliation(self):
+        """Test cached workpackage state"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        workpackage = self.benchmark.workpackages["execution"][0]
+        self.assertTrue(workpackage.started)
+        self.assertTrue(workpackage.done)
+        # external change is only visible after reconciliation
+        os.remove(os.path.join(workpackage.workpackage_dir,
+                               jube.conf.WORKPACKAGE_DONE_FILENAME))
+        self.assertTrue(workpackage.done)
+        self.assertTrue(workpackage.reconcile_state())
+        self.assertFalse(workpackage.reconcile_state())
+        self.assertFalse(workpackage.done)
+        self.benchmark.reconcile_workpackage_states()
+        self.assertFalse(workpackage.done)
+        self.assertTrue(workpackage.started)
+        shutil.rmtree(workpackage.workpackage_dir)
+        self.benchmark.reconcile_workpackage_states()
+        self.assertFalse(workpackage.started)
+        shutil.rmtree('bench_run')
+
+    def test_workpackage_journal(self):
+        """Test workpackage journal replay"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        workpackages_file = os.path.join(self.benchmark.bench_dir,
+                                         jube.conf.WORKPACKAGES_FILENAME)
+        journal_file = os.path.join(self.benchmark.bench_dir,
+                                    jube.conf.WORKPACKAGES_JOURNAL_FILENAME)
+        # journal is compacted at the end of a run
+        self.assertFalse(os.path.exists(journal_file))
+        workpackage = self.benchmark.workpackages["execution"][2]
+        workpackage.cycle = 3
+        self.benchmark._store_workpackage_information(workpackage)
+        self.assertTrue(os.path.exists(journal_file))
+        # simulate interrupted write of an additional entry
+        with open(journal_file, "a") as journal:
+            journal.write('{"id": 2, "workpack')
+        parser = jube.jubeio.Parser(workpackages_file)
+        workpackages, _ = parser.workpackages_from_xml(self.benchmark)
+        self.assertEqual([wp.id for wp in workpackages["execution"]],
+                         [0, 1, 2, 3])
+        self.assertEqual([wp.cycle for wp in workpackages["execution"]],
+                         [0, 0, 3, 0])
+        self.benchmark.write_workpackage_information(workpackages_file)
+        self.assertFalse(os.path.exists(journal_file))
+        shutil.rmtree('bench_run')
+
+    def test_watch_async_files(self):
+        """Test continuing workpackages as soon as their done_file,
+        error_file or break_file exists"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.step.add_operation(jube.step.Operation(
+            'echo "$i" > submitted', async_filename='ready_$i',
+            error_filename='failed_$i', break_filename='stop_$i'))
+        self.step.add_operation(jube.step.Operation(
+            'echo "$i" > finished'))
+        self.benchmark.new_run()
+        status = self.benchmark.benchmark_status
+        self.assertEqual(status["wait"], 4)
+        workpackages = self.benchmark.workpackages["execution"]
+        watch_files = [workpackage.pending_watch_files()
+                       for workpackage in workpackages]
+        self.assertEqual(watch_files, [
+            [os.path.abspath(os.path.join(workpackage.work_dir,
+                                          "{0}_{1}".format(name, i)))
+             for name in ["ready", "failed", "stop"]]
+            for i, workpackage in enumerate(workpackages)])
+
+        def finish_jobs():
+            """Simulate finished, failed and stopped batch jobs"""
+            # a break_file skips all further operations, but the
+            # workpackage still waits for its done_file
+            for i, j in [(0, 0), (1, 1), (2, 2), (2, 0), (3, 0)]:
+                open(watch_files[i][j], "w").close()
+                time.sleep(0.1)
+        timer = threading.Timer(0.1, finish_jobs)
+        timer.start()
+        self.benchmark.run(watch=0.02)
+        timer.join()
+        status = self.benchmark.benchmark_status
+        self.assertEqual(status["done"], 3)
+        self.assertEqual(status["error"], 1)
+        self.assertTrue(workpackages[1].error)
+        for i, workpackage in enumerate(workpackages):
+            self.assertEqual(workpackage.pending_watch_files(), list())
+            self.assertEqual(os.path.isfile(
+                os.path.join(workpackage.work_dir, "finished")), i in [0, 3])
+        shutil.rmtree('bench_run')
+
+    def test_shared_operation_barrier(self):
+        """Test single execution of a shared operation"""
+        # Worker processes leave the shared operation to the main process
+        for procs in [1, 3]:
+            if os.path.isdir("bench_run"):
+                shutil.rmtree('bench_run')
+            step = jube.step.Step(name='execution', depend=set(),
+                                  shared_name='shared', procs=procs)
+            step.add_uses(['param_set'])
+            step.add_operation(jube.step.Operation('echo "$i" >> shared/ids'))
+            step.add_operation(jube.step.Operation(
+                'sort ids > sorted; echo "$i" >> executed', shared=True))
+            step.add_operation(jube.step.Operation('cat shared/sorted'))
+            self.benchmark.steps['execution'] = step
+            self.benchmark.new_run()
+            status = self.benchmark.benchmark_status
+            self.assertEqual(status["done"], 4)
+            shared_dir = step.shared_folder_path(self.benchmark.bench_dir)
+            with open(os.path.join(shared_dir, "executed")) as executed:
+                self.assertEqual(len(executed.readlines()), 1)
+            for workpackage in self.benchmark.workpackages['execution']:
+                with open(os.path.join(workpackage.work_dir, "stdout")) as f:
+                    self.assertEqual(f.read(), "0\n1\n2\n3\n")
+            barrier = self.benchmark.shared_operation_barrier(step, 1, 0)
+            self.assertTrue(barrier.executed)
+            self.assertTrue(barrier.complete)
+            shutil.rmtree('bench_run')
+
+    def test_parallel_shared_operation_scans(self):
+        """Test linear number of state scans of a parallel step using a
+        shared operation"""
+        reconcile_state = jube.workpackage.Workpackage.reconcile_state
+        calls = dict()
+
+        def counting_reconcile_state(workpackage, scan=True):
+            """Count state scans of the main process"""
+            calls[cnt] += 1
+            return reconcile_state(workpackage, scan)
+        jube.workpackage.Workpackage.reconcile_state = \
+            counting_reconcile_state
+        try:
+            for cnt in [4, 32]:
+                calls[cnt] = 0
+                if os.path.isdir("bench_run"):
+                    shutil.rmtree('bench_run')
+                parameterset = jube.parameter.Parameterset(name='param_set')
+                parameterset.add_parameter(
+                    jube.parameter.Parameter.create_parameter(
+                        "i", ",".join(str(i) for i in range(cnt))))
+                self.benchmark.parametersets['param_set'] = parameterset
+                step = jube.step.Step(name='execution', depend=set(),
+                                      shared_name='shared', procs=3)
+                step.add_uses(['param_set'])
+                step.add_operation(jube.step.Operation(
+                    'echo "$i" >> shared/ids'))
+                step.add_operation(jube.step.Operation(
+                    'echo "$i" >> executed', shared=True))
+                step.add_operation(jube.step.Operation('true'))
+                self.benchmark.steps['execution'] = step
+                self.benchmark.new_run()
+                self.assertEqual(self.benchmark.benchmark_status["done"], cnt)
+                self.assertLess(calls[cnt], 4 * cnt)
+        finally:
+            jube.workpackage.Workpackage.reconcile_state = reconcile_state
+        self.assertLess(calls[32], 10 * calls[4])
+        shutil.rmtree('bench_run')
 
 if __name__ == "__main__":
     unittest.main()
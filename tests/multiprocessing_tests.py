@@ -76,6 +76,29 @@ class TestMultiprocessing(unittest.TestCase):
                     "bench_run/000000/"+i+"_parallel_execution/work/"+j))
         shutil.rmtree('bench_run')
 
+    def test_multiprocess_dependent_steps(self):
+        """Test multiprocessing execution of dependent parallel steps"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        dependentStep = jube.step.Step(
+            name='dependent_execution', depend={'parallel_execution'},
+            procs=3)
+        dependentStep.add_operation(jube.step.Operation(
+            'echo "$i"', stdout_filename='stdout'))
+        self.parallelBenchmark.steps['dependent_execution'] = dependentStep
+        self.parallelBenchmark.new_run()
+        status = self.parallelBenchmark.benchmark_status
+        self.assertEqual(status["all"], 8)
+        self.assertEqual(status["done"], 8)
+        for workpackage in \
+                self.parallelBenchmark.workpackages['dependent_execution']:
+            self.assertEqual(len(workpackage.parents), 1)
+            with open(os.path.join(workpackage.work_dir, "stdout")) as f:
+                self.assertEqual(
+                    f.read().strip(),
+                    str(workpackage.parents[0].parameterset["i"].value))
+        shutil.rmtree('bench_run')
+
 
 if __name__ == "__main__":
     unittest.main()
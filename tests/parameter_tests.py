@@ -22,6 +22,7 @@ from __future__ import (print_function,
                         unicode_literals,
                         division)
 
+import random
 import unittest
 import jube.parameter
 
@@ -101,6 +102,22 @@ class TestParameter(unittest.TestCase):
         self.assertEqual(self.para_select.value, "3")
         self.assertFalse(self.para_select.is_template)
 
+    def test_signature(self):
+        """Test parameter signature"""
+        self.assertEqual(self.para_cons.signature, ("3", None))
+        self.assertEqual(self.para_temp.signature, ("2,3,4", None))
+        self.assertEqual(self.para_select.signature, ("2,3,4", ("3", -1)))
+        expanded = list(self.para_temp.expand())
+        self.assertEqual(expanded[1].signature, ("2,3,4", ("3", 1)))
+        self.assertFalse(expanded[0].is_equivalent(expanded[1]))
+        self.assertTrue(expanded[1].is_equivalent(expanded[1].copy()))
+
+        # Changing the index must update the signature
+        parameter_copy = expanded[1].copy()
+        parameter_copy.idx = 0
+        self.assertEqual(parameter_copy.signature, ("2,3,4", ("3", 0)))
+        self.assertFalse(parameter_copy.is_equivalent(expanded[1]))
+
     def test_no_template(self):
         self.assertFalse(self.para_no_template.is_template)
         self.assertEqual(self.para_no_template.value, "2,3,4")
@@ -132,6 +149,18 @@ class TestParameter(unittest.TestCase):
         etree = self.para_export.etree_repr()
         self.assertEqual(etree.get("export"), "true")
 
+        # Cache check
+        self.assertIsNone(self.para_cons.cache)
+        self.assertIsNone(self.para_cons.etree_repr().get("cache"))
+        para_cache = jube.parameter.Parameter.create_parameter(
+            "cache", "hostname", parameter_mode="shell", cache=True)
+        self.assertTrue(para_cache.cache)
+        self.assertEqual(para_cache.etree_repr().get("cache"), "true")
+        para_no_cache = jube.parameter.Parameter.create_parameter(
+            "no_cache", "date", parameter_mode="shell", cache=False)
+        self.assertFalse(para_no_cache.cache)
+        self.assertEqual(para_no_cache.etree_repr().get("cache"), "false")
+
     def test_search_method(self):
         """ Test the searching of method method """
         self.assertEqual(self.para_search_method_1.search_method(
@@ -304,6 +333,92 @@ class TestParameterSet(unittest.TestCase):
         self.assertEqual(parameterset2[self.para_sub.name].value,
                          self.para_sub.value)
 
+    def test_copy(self):
+        """Copies share parameters until they are changed"""
+        parameterset = self.parameterset.copy()
+        self.assertIs(parameterset["test"], self.parameterset["test"])
+        parameterset.add_parameter(self.para_export)
+        parameterset.delete_parameter("test")
+        self.assertEqual(sorted(parameterset.all_parameter_names),
+                         ["test2"])
+        self.assertEqual(parameterset["test2"].value, "4")
+        self.assertEqual(sorted(self.parameterset.all_parameter_names),
+                         ["test", "test2"])
+        self.assertEqual(self.parameterset["test2"].value, "2,3,4")
+
+    def test_cached_views(self):
+        """Cached views are updated when the parameterset changes"""
+        def views(parameterset):
+            return [list(parameterset.constant_parameter_dict.items()),
+                    list(parameterset.template_parameter_dict.items()),
+                    list(parameterset.export_parameter_dict.items()),
+                    list(parameterset.value_dict.items()),
+                    list(parameterset.substitution_dict.items())]
+
+        def create_parameter(name, kind):
+            if kind == 0:
+                return jube.parameter.Parameter.create_parameter(name, "1,2")
+            elif kind == 1:
+                return jube.parameter.Parameter.create_parameter(
+                    name, "$a", selected_value="$a")
+            elif kind == 2:
+                return jube.parameter.Parameter.create_parameter(
+                    name, "1", export=True)
+            return jube.parameter.Parameter.create_parameter(
+                name, "1", parameter_mode="python")
+
+        rand = random.Random(42)
+        parameterset = jube.parameter.Parameterset()
+        copies = list()
+        for step in range(500):
+            name = "p{0}".format(rand.randrange(10))
+            version = parameterset.version
+            action = rand.random()
+            if action < 0.2:
+                if name in parameterset:
+                    parameterset.delete_parameter(name)
+                    self.assertGreater(parameterset.version, version)
+            elif action < 0.3:
+                update = jube.parameter.Parameterset()
+                update.add_parameter(create_parameter(name, step % 4))
+                parameterset.update_parameterset(update)
+            else:
+                parameterset.add_parameter(create_parameter(name, step % 4))
+                self.assertGreater(parameterset.version, version)
+            fresh = jube.parameter.Parameterset()
+            fresh.add_parameterset(parameterset)
+            self.assertEqual(views(parameterset), views(fresh))
+            if step % 50 == 0:
+                copies.append((parameterset.copy(), views(parameterset)))
+        # copies are not changed by later modifications
+        for parameterset_copy, copy_views in copies:
+            self.assertEqual(views(parameterset_copy), copy_views)
+
+    def test_parameter_substitution_chain(self):
+        """Substitution of dependent and cyclic parameters"""
+        parameterset = jube.parameter.Parameterset("chain")
+        # Add the chain in reverse order of its dependencies
+        for i in range(20, 0, -1):
+            parameterset.add_parameter(
+                jube.parameter.Parameter.create_parameter(
+                    "chain{0}".format(i), "${{chain{0}}}+".format(i - 1)))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("chain0", "1"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter(
+                "result", "len('${chain20}')",
+                parameter_mode="python"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("cycle1", "$cycle2"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("cycle2", "$cycle1"))
+        with self.assertLogs("jube.util.util", level="WARNING"):
+            parameterset.parameter_substitution()
+        self.assertEqual(parameterset["chain20"].value, "1" + "+" * 20)
+        self.assertEqual(parameterset["result"].value, "21")
+        self.assertEqual(parameterset["cycle1"].value, "$cycle2")
+        self.assertEqual(parameterset["cycle2"].value, "$cycle1")
+
     def test_etree_repr(self):
         """Etree repr check"""
         etree = self.parameterset.etree_repr()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# JUBE Benchmarking Environment
+# Copyright (C) 2008-2024
+# Forschungszentrum Juelich GmbH, Juelich Supercomputing Centre
+# http://www.fz-juelich.de/jsc/jube
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Performance related tests
+
+These tests measure time and memory of larger synthetic workloads. They
+are skipped unless the environment variable JUBE_PERFORMANCE_TESTS is set.
+Some tests compare against the baseline implementation, which is loaded
+from the git revision given by JUBE_PERFORMANCE_BASELINE (default: the
+root commit of the repository).
+"""
+
+from __future__ import (print_function,
+                        unicode_literals,
+                        division)
+
+import unittest
+import argparse
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import xml.dom.minidom as DOM
+import jube.analyser
+import jube.main
+import jube.parameter
+import jube.pattern
+import jube.util.output
+import jube.util.util
+from util_tests import legacy_substitution
+
+PERFORMANCE_TESTS = "JUBE_PERFORMANCE_TESTS" in os.environ
+
+MEASURE_CODE = """
+import json, resource, sys, time
+sys.path[0:0] = {paths!r}
+import performance_tests
+start = time.perf_counter()
+performance_tests.{function}(*{args!r})
+print(json.dumps({{
+    "runtime": time.perf_counter() - start,
+    "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}}))
+"""
+
+
+def measure(function, *args, **kwargs):
+    """Run function of this module inside a new Python process. Return its
+    runtime in seconds and the peak RSS of the process in bytes. The
+    keyword argument jube_path can be used to import another jube package
+    inside of the process."""
+    paths = [os.path.dirname(os.path.abspath(__file__))]
+    if kwargs.get("jube_path") is not None:
+        paths.insert(0, kwargs["jube_path"])
+    output = subprocess.check_output(
+        [sys.executable, "-c", MEASURE_CODE.format(
+            paths=paths, function=function, args=args)])
+    result = json.loads(output.decode("UTF-8").strip().split("\n")[-1])
+    return result["runtime"], result["maxrss"]
+
+
+def git_baseline(*args):
+    """Run a git command for the baseline revision inside of the
+    repository. Return its output or None if git or the revision is not
+    available."""
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        revision = os.environ.get("JUBE_PERFORMANCE_BASELINE")
+        if revision is None:
+            revision = subprocess.check_output(
+                ["git", "-C", repository, "rev-list", "--max-parents=0",
+                 "HEAD"], stderr=subprocess.DEVNULL).decode().split()[0]
+        return subprocess.check_output(
+            ["git", "-C", repository] + [arg.format(revision=revision)
+                                         for arg in args],
+            stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+
+
+def baseline_module(directory, name):
+    """Load a module of the baseline jube package as a separate module.
+    Return None if the baseline is not available."""
+    source = git_baseline("show", "{revision}:jube/" + name + ".py")
+    if source is None:
+        return None
+    filename = os.path.join(directory, "baseline_{0}.py".format(name))
+    module_file = open(filename, "wb")
+    module_file.write(source)
+    module_file.close()
+    spec = importlib.util.spec_from_file_location(
+        "baseline_{0}".format(name), filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def baseline_package(directory):
+    """Extract the baseline jube package into directory. Return False if
+    the baseline is not available."""
+    archive = git_baseline("archive", "--format=tar", "{revision}", "jube")
+    if archive is None:
+        return False
+    tar_file = tarfile.open(fileobj=io.BytesIO(archive))
+    tar_file.extractall(directory)
+    tar_file.close()
+    return True
+
+
+def report(name, runtime, peak=None):
+    """Print a single measurement"""
+    if peak is None:
+        print("\n  {0:<40} {1:8.3f} s".format(name, runtime))
+    else:
+        print("\n  {0:<40} {1:8.3f} s {2:10.1f} MiB".format(
+            name, runtime, peak / 1024 / 1024))
+
+
+def synthetic_workpackage(workpackage_id, parameter_cnt=8):
+    """Return etree representation of a synthetic workpackage"""
+    workpackage_etree = ET.Element("workpackage")
+    workpackage_etree.attrib["id"] = str(workpackage_id)
+    step_etree = ET.SubElement(workpackage_etree, "step")
+    step_etree.attrib["iteration"] = "0"
+    step_etree.attrib["cycle"] = "0"
+    step_etree.text = "execute"
+    parameterset_etree = ET.SubElement(workpackage_etree, "parameterset")
+    for i in range(parameter_cnt):
+        parameter_etree = ET.SubElement(parameterset_etree, "parameter")
+        parameter_etree.attrib["name"] = "param_{0}".format(i)
+        parameter_etree.attrib["type"] = "int"
+        parameter_etree.attrib["separator"] = ","
+        parameter_etree.attrib["duplicate"] = "none"
+        parameter_etree.attrib["mode"] = "text"
+        value_etree = ET.SubElement(parameter_etree, "value")
+        value_etree.text = ",".join(str(j) for j in range(10))
+        selection_etree = ET.SubElement(parameter_etree, "selection")
+        selection_etree.attrib["idx"] = str(workpackage_id % 10)
+        selection_etree.text = str(workpackage_id % 10)
+    ET.SubElement(workpackage_etree, "environment")
+    return workpackage_etree
+
+
+def write_minidom(filename, workpackage_cnt):
+    """Former pretty-print implementation of workpackage files"""
+    workpackages_etree = ET.Element("workpackages")
+    for workpackage_id in range(workpackage_cnt):
+        workpackages_etree.append(synthetic_workpackage(workpackage_id))
+    xml = jube.util.output.element_tree_tostring(
+        workpackages_etree, encoding="UTF-8")
+    dom = DOM.parseString(xml.encode("UTF-8"))
+    fout = open(filename, "wb")
+    fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
+    fout.close()
+
+
+def write_streaming(filename, workpackage_cnt):
+    """Current pretty-print implementation of workpackage files"""
+    jube.util.output.write_pretty_xml(
+        filename, ET.Element("workpackages"),
+        (synthetic_workpackage(workpackage_id)
+         for workpackage_id in range(workpackage_cnt)))
+
+
+@unittest.skipUnless(PERFORMANCE_TESTS,
+                     "set JUBE_PERFORMANCE_TESTS to run performance tests")
+class TestXMLWriterPerformance(unittest.TestCase):
+
+    """XML writer performance test class"""
+
+    WORKPACKAGE_CNT = 100000
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_workpackage_file_writing(self):
+        """Compare minidom and streaming workpackage file writing"""
+        old_filename = os.path.join(self.tmp_dir, "minidom.xml")
+        new_filename = os.path.join(self.tmp_dir, "streaming.xml")
+        old_runtime, old_peak = measure("write_minidom", old_filename,
+                                        self.WORKPACKAGE_CNT)
+        new_runtime, new_peak = measure("write_streaming", new_filename,
+                                        self.WORKPACKAGE_CNT)
+        report("minidom pretty-print", old_runtime, old_peak)
+        report("streaming pretty-print", new_runtime, new_peak)
+
+        # Both files must contain the same data
+        old_root = ET.parse(old_filename).getroot()
+        new_root = ET.parse(new_filename).getroot()
+        self.assertEqual(len(old_root), len(new_root))
+        for old_element, new_element in zip(old_root.iter(),
+                                            new_root.iter()):
+            self.assertEqual(old_element.tag, new_element.tag)
+            self.assertEqual(old_element.attrib, new_element.attrib)
+            self.assertEqual((old_element.text or "").strip(),
+                             (new_element.text or "").strip())
+
+        self.assertLess(new_runtime, old_runtime)
+
+
+def substitution_workload(function, dict_type, workpackage_cnt):
+    """Substitute typical texts of a step for workpackage_cnt
+    workpackages. Return the runtime in seconds."""
+    texts = ["echo $param_1 $param_2 > out_${param_3}.log",
+             "$param_4/bin/app -n $param_5 -t ${param_6} $$HOME",
+             "ready_$jube_wp_id",
+             "stdout",
+             "$param_7 == 0",
+             "export OMP_NUM_THREADS=$param_8 && srun $param_0"]
+    start = time.perf_counter()
+    for workpackage_id in range(workpackage_cnt):
+        parameter_dict = dict_type(
+            ("param_{0}".format(i), "{0}_{1}".format(i, workpackage_id))
+            for i in range(100))
+        parameter_dict["jube_wp_id"] = workpackage_id
+        for text in texts:
+            function(text, parameter_dict)
+    return time.perf_counter() - start
+
+
+@unittest.skipUnless(PERFORMANCE_TESTS,
+                     "set JUBE_PERFORMANCE_TESTS to run performance tests")
+class TestSubstitutionPerformance(unittest.TestCase):
+
+    """Substitution performance test class"""
+
+    WORKPACKAGE_CNT = 2000
+
+    def test_substitution(self):
+        """Compare former and current substitution implementation"""
+        old_runtime = substitution_workload(legacy_substitution, dict,
+                                            self.WORKPACKAGE_CNT)
+        dict_runtime = substitution_workload(jube.util.util.substitution,
+                                             dict, self.WORKPACKAGE_CNT)
+        new_runtime = substitution_workload(
+            jube.util.util.substitution, jube.util.util.SubstitutionDict,
+            self.WORKPACKAGE_CNT)
+        report("former substitution", old_runtime)
+        report("substitution (dict)", dict_runtime)
+        report("substitution (SubstitutionDict)", new_runtime)
+        self.assertLess(dict_runtime, old_runtime)
+        self.assertLess(new_runtime, old_runtime)
+
+
+def parameter_memory(parameter_class, parameter_cnt):
+    """Return the memory in bytes needed by parameter_cnt parameters"""
+    tracemalloc.start()
+    parameters = [parameter_class("param_{0}".format(i % 100), str(i))
+                  for i in range(parameter_cnt)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del parameters
+    return size
+
+
+def create_benchmark(directory, workpackage_cnt, parameter_cnt):
+    """Run a synthetic benchmark of two steps without any operation.
+    Return the benchmark directory."""
+    filename = os.path.join(directory, "benchmark.xml")
+    parameters = "\n".join(
+        "      <parameter name=\"param_{0}\">value_{0}</parameter>".format(i)
+        for i in range(parameter_cnt))
+    template = ",".join(str(i) for i in range(workpackage_cnt // 2))
+    xml_file = open(filename, "w")
+    xml_file.write("""<?xml version="1.0" encoding="UTF-8"?>
+<jube>
+  <benchmark name="memory" outpath="bench_run">
+    <parameterset name="parameter">
+{0}
+      <parameter name="index">{1}</parameter>
+      <parameter name="result" mode="python">$index * 2</parameter>
+    </parameterset>
+    <step name="first"><use>parameter</use></step>
+    <step name="second" depend="first"/>
+  </benchmark>
+</jube>
+""".format(parameters, template))
+    xml_file.close()
+    jube.main.main(["run", filename, "--hide-animation"])
+    return os.path.join(directory, "bench_run", "000000")
+
+
+def load_benchmark(benchmark_folder):
+    """Load all workpackages of an existing benchmark"""
+    args = argparse.Namespace(force=True, strict=False)
+    benchmark = jube.main._load_existing_benchmark(args, benchmark_folder)
+    assert benchmark is not None
+
+
+@unittest.skipUnless(PERFORMANCE_TESTS,
+                     "set JUBE_PERFORMANCE_TESTS to run performance tests")
+class TestParameterMemory(unittest.TestCase):
+
+    """Parameter memory test class"""
+
+    PARAMETER_CNT = 100000
+    WORKPACKAGE_CNT = 2000
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parameter_memory(self):
+        """Compare memory of baseline and current parameter layout"""
+        baseline = baseline_module(self.tmp_dir, "parameter")
+        if baseline is None:
+            self.skipTest("baseline revision not available")
+        old_size = parameter_memory(baseline.StaticParameter,
+                                    self.PARAMETER_CNT)
+        new_size = parameter_memory(jube.parameter.StaticParameter,
+                                    self.PARAMETER_CNT)
+        print("\n  {0:<40} {1:8.1f} B".format(
+            "baseline parameter", old_size / self.PARAMETER_CNT))
+        print("\n  {0:<40} {1:8.1f} B".format(
+            "parameter", new_size / self.PARAMETER_CNT))
+        self.assertLess(new_size, old_size)
+
+    def test_workpackages_from_xml(self):
+        """Compare loading a large synthetic benchmark by the baseline and
+        the current implementation"""
+        baseline_path = os.path.join(self.tmp_dir, "baseline")
+        if not baseline_package(baseline_path):
+            self.skipTest("baseline revision not available")
+        benchmark_folder = create_benchmark(self.tmp_dir,
+                                            self.WORKPACKAGE_CNT, 50)
+        old_runtime, old_peak = measure("load_benchmark", benchmark_folder,
+                                        jube_path=baseline_path)
+        new_runtime, new_peak = measure("load_benchmark", benchmark_folder)
+        report("baseline workpackages_from_xml ({0} wps)".format(
+            self.WORKPACKAGE_CNT), old_runtime, old_peak)
+        report("workpackages_from_xml ({0} wps)".format(
+            self.WORKPACKAGE_CNT), new_runtime, new_peak)
+        self.assertLess(new_runtime, old_runtime)
+        self.assertLess(new_peak, old_peak)
+
+
+def create_log(filename, line_cnt):
+    """Write a large synthetic output file"""
+    log_file = open(filename, "w")
+    for i in range(line_cnt):
+        log_file.write("iteration {0} time: {1} residual={2} info text "
+                       "padding padding\n".format(i, (i % 997) / 997, i))
+    log_file.close()
+
+
+def scan_log(filename, result_filename, mapped):
+    """Scan a large output file using a pattern, whose matches can cross
+    line ends. mapped=False uses the former scan of the whole file as
+    text."""
+    patternset = jube.pattern.Patternset()
+    patternset.add_pattern(jube.pattern.Pattern(
+        "time", r"time:\s+$jube_pat_fp", content_type="float"))
+    patternset.add_pattern(jube.pattern.Pattern(
+        "residual", "residual=$jube_pat_int", content_type="int"))
+    if not mapped:
+        jube.analyser.Analyser._map_file = staticmethod(
+            lambda file_path, patternlist: None)
+    result_dict, _ = jube.analyser.Analyser("analyser")._analyse_file(
+        filename, patternset, jube.parameter.Parameterset())
+    result_file = open(result_filename, "w")
+    result_file.write(repr(sorted(result_dict.items())))
+    result_file.close()
+
+
+@unittest.skipUnless(PERFORMANCE_TESTS,
+                     "set JUBE_PERFORMANCE_TESTS to run performance tests")
+class TestAnalysePerformance(unittest.TestCase):
+
+    """Analyse performance test class"""
+
+    LINE_CNT = 2000000
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_mapped_file_scan(self):
+        """Compare text and memory mapped scan of a large file"""
+        filename = os.path.join(self.tmp_dir, "out.log")
+        create_log(filename, self.LINE_CNT)
+        old_result = os.path.join(self.tmp_dir, "text.txt")
+        new_result = os.path.join(self.tmp_dir, "mapped.txt")
+        old_runtime, old_peak = measure("scan_log", filename, old_result,
+                                        False)
+        new_runtime, new_peak = measure("scan_log", filename, new_result,
+                                        True)
+        size = os.path.getsize(filename) / 1024 / 1024
+        report("text scan ({0:.0f} MiB/s)".format(size / old_runtime),
+               old_runtime, old_peak)
+        report("memory mapped scan ({0:.0f} MiB/s)".format(
+            size / new_runtime), new_runtime, new_peak)
+
+        old_file = open(old_result, "r")
+        new_file = open(new_result, "r")
+        self.assertEqual(old_file.read(), new_file.read())
+        old_file.close()
+        new_file.close()
+        self.assertLess(new_peak, old_peak)
+
+
+if __name__ == "__main__":
+    unittest.main()
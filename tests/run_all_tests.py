@@ -26,6 +26,7 @@ import unittest
 from parameter_tests import TestParameter, TestParameterSet
 from multiprocessing_tests import TestMultiprocessing
 from pattern_tests import TestPattern
+from analyser_tests import TestAnalyser
 from benchmark_tests import TestBenchmark
 from result_database_tests import TestResultDatabase
 from example_tests.example_cycle_tests import TestCycleExample
@@ -49,11 +50,17 @@ from example_tests.example_statistic_tests import TestStatisticExample
 from example_tests.example_tagging_tests import TestTaggingExample
 from yaml_tests import TestYAMLScripts
 from xml_tests import TestXMLScripts
+from step_tests import TestWorkpackageCreation
+from step_tests import TestParametersetExpansion
 from step_tests import TestOperation
 from step_tests import TestDoLog
 from util_tests import TestUtil
 from conf_tests import TestConf
 from substitute_tests import TestSubstitute
+from performance_tests import (TestXMLWriterPerformance,
+                               TestParameterMemory,
+                               TestSubstitutionPerformance,
+                               TestAnalysePerformance)
 
 
 if __name__ == "__main__":
@@ -27,11 +27,15 @@ import unittest
 import shutil
 import os
 import sys
+import io
+import time
+import contextlib
 import jube.step
 import jube.benchmark
 import jube.parameter
 import jube.workpackage
 import jube.main
+import jube.conf
 import subprocess
 
 class TestStep(unittest.TestCase):
@@ -156,6 +160,94 @@ class TestStep(unittest.TestCase):
         shutil.rmtree(self.bench_run_path)
 
 
+class TestWorkpackageCreation(unittest.TestCase):
+
+    """Workpackage creation test class"""
+
+    def setUp(self):
+        parameterset = jube.parameter.Parameterset("param")
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter(
+                "number", ",".join(str(i) for i in range(10))))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter(
+                "name", "${number}_$jube_wp_id"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("path",
+                                                       "$jube_wp_relpath"))
+        self.step = jube.step.Step(name="create", depend=set(), iterations=2,
+                                   active="$number % 3 != 0")
+        self.step.add_uses(["param"])
+        self.benchmark = jube.benchmark.Benchmark(
+            name="creation_test", outpath="bench_run",
+            parametersets={"param": parameterset}, substitutesets={},
+            filesets={}, patternsets={}, steps={"create": self.step},
+            analyser={}, results={}, results_order=[])
+        self.parent = jube.workpackage.Workpackage(
+            benchmark=self.benchmark, step=jube.step.Step("parent", set()),
+            local_parameter_names=list(),
+            parameterset=jube.parameter.Parameterset(), workpackage_id=100)
+        self.procs = jube.conf.CREATION_PROCS
+
+    def create_workpackages(self, procs):
+        """Create all workpackages of the step using procs processes"""
+        jube.conf.CREATION_PROCS = procs
+        jube.workpackage.Workpackage.id_counter = 0
+        workpackages = self.step.create_workpackages(
+            self.benchmark, jube.parameter.Parameterset(),
+            parents=[self.parent], incompatible_parameters=set())
+        # Children are linked by the benchmark, inactive workpackages
+        # are never linked
+        self.assertEqual(self.parent.children, list())
+        self.assertEqual(jube.workpackage.Workpackage.id_counter, 12)
+        return [(workpackage.id, workpackage.iteration,
+                 [parent.id for parent in workpackage.parents],
+                 sorted(sibling.id
+                        for sibling in workpackage.iteration_siblings),
+                 [(parameter.name, (parameter.value,
+                                    parameter.based_on_root.value))
+                  for parameter in workpackage.parameterset])
+                for workpackage in workpackages]
+
+    def test_parallel_creation(self):
+        """Test parallel workpackage creation"""
+        serial = self.create_workpackages(1)
+        self.assertEqual([workpackage[0] for workpackage in serial],
+                         list(range(12)))
+        self.assertEqual(serial[0][2], [100])
+        self.assertEqual(dict(serial[0][4])["name"],
+                         ("1_0", "${number}_$jube_wp_id"))
+        self.assertEqual(dict(serial[11][4])["name"][0], "8_11")
+        self.assertEqual(self.create_workpackages(3), serial)
+
+    def tearDown(self):
+        jube.conf.CREATION_PROCS = self.procs
+
+
+class TestParametersetExpansion(unittest.TestCase):
+
+    """Step parameterset expansion test class"""
+
+    def test_expand_parameterset(self):
+        """Test lazy expansion of nested templates"""
+        parameterset = jube.parameter.Parameterset()
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("a", "1,2"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter(
+                "b", "'$a,' + str($a * 10)", parameter_mode="python"))
+        parameterset.add_parameter(
+            jube.parameter.Parameter.create_parameter("c", "const"))
+        expansion = jube.step.Step._expand_parameterset(parameterset)
+        self.assertEqual(next(expansion)["b"].value, "1")
+        self.assertEqual([(p["a"].value, p["b"].value) for p in expansion],
+                         [("1", "10"), ("2", "2"), ("2", "20")])
+        # Unchanged parameters are shared between the expanded sets
+        first, second = parameterset.expand_templates()
+        self.assertIs(first["c"], second["c"])
+        self.assertEqual((first["a"].value, second["a"].value), ("1", "2"))
+
+
 class TestOperation(unittest.TestCase):
 
     """Operation test class"""
@@ -238,6 +330,72 @@ class TestOperation(unittest.TestCase):
         self.assertTrue(continue_cycle)
         self.assertTrue(continue_op)
 
+    def test_environment_capture(self):
+        """Test environment capture of an operation"""
+        operation = jube.step.Operation(
+            'export NEW_VAR="line1\nline2 "; (sleep 5 > /dev/null 2>&1 &)',
+            stdout_filename='stdout', stderr_filename='stderr')
+        env_pipe = jube.step.Operation.environment_pipe_supported()
+        for pipe in set([env_pipe, False]):
+            jube.step.Operation._environment_pipe = pipe
+            environment = dict(self.environment)
+            start = time.time()
+            operation.execute(self.parameter_dict, self.work_dir,
+                              environment=environment)
+            # background processes must not delay the execution
+            self.assertLess(time.time() - start, 4)
+            self.assertEqual(environment["TEST"], "test")
+            self.assertEqual(environment["NEW_VAR"].rstrip(),
+                             "line1\nline2")
+            self.assertFalse(os.path.exists(os.path.join(
+                self.work_dir, jube.conf.ENVIRONMENT_INFO)))
+        jube.step.Operation._environment_pipe = env_pipe
+
+    def test_verbose_output(self):
+        """Test operation execution with verbose output"""
+        verbose_level = jube.conf.VERBOSE_LEVEL
+        jube.conf.VERBOSE_LEVEL = 2
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) as console:
+                self.operation.execute(self.parameter_dict, self.work_dir,
+                                       environment=self.environment)
+        finally:
+            jube.conf.VERBOSE_LEVEL = verbose_level
+        self.assertEqual(console.getvalue(), "Test\n")
+        with open(os.path.join(self.work_dir, "stdout")) as stdout:
+            self.assertEqual(stdout.read(), "Test\n")
+        self.assertEqual(self.environment["TEST"], "test")
+
+    def test_shell_session(self):
+        """Test operation execution inside of a shell session"""
+        session = jube.step.ShellSession()
+        environment = dict(self.environment)
+        operations = [
+            jube.step.Operation('jube_test() { echo "function $1"; }; '
+                                'export NEW_VAR="line1\nline2 "'),
+            jube.step.Operation('jube_test "$NEW_VAR"; echo "$TEST"'),
+            jube.step.Operation('exit 0'),
+            jube.step.Operation('echo "$NEW_VAR" "$TEST"'),
+            jube.step.Operation('echo error >&2; false')]
+        for operation in operations[:4]:
+            operation.execute(self.parameter_dict, self.work_dir,
+                              environment=environment, session=session)
+            if operation.do != 'exit 0':
+                self.assertEqual(environment["NEW_VAR"], "line1\nline2 ")
+        environment["TEST"] = "changed"
+        operations[3].execute(self.parameter_dict, self.work_dir,
+                              environment=environment, session=session)
+        with self.assertRaises(RuntimeError) as error:
+            operations[4].execute(self.parameter_dict, self.work_dir,
+                                  environment=environment, session=session)
+        self.assertIn("error", str(error.exception))
+        session.close()
+        self.assertEqual(environment["TEST"], "changed")
+        with open(os.path.join(self.work_dir, "stdout")) as stdout:
+            self.assertEqual(stdout.read(), "function line1\nline2 \n"
+                             "test\nline1\nline2  test\n"
+                             "line1\nline2  changed\n")
+
     def tearDown(self):
         shutil.rmtree(os.path.join(self.currWorkDir, 'bench_run'))
 
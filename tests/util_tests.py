@@ -22,10 +22,67 @@ from __future__ import (print_function,
                         unicode_literals,
                         division)
 
+import os
+import pickle
+import random
+import re
+import shutil
+import string
+import tempfile
 import unittest
+import jube.conf
 import jube.util.util
 
 
+def legacy_substitution(text, substitution_dict):
+    """Former implementation of jube.util.util.substitution"""
+    changed = True
+    count = 0
+    str_substitution_dict = dict([(k, str(v)) for k, v in
+                                  substitution_dict.items()])
+    local_substitution_dict = dict([(k, re.sub(r"\$", "$$", v)
+                                     if "$" in v else v) for k, v in
+                                    str_substitution_dict.items()])
+    while changed and count < jube.conf.MAX_RECURSIVE_SUB:
+        count += 1
+        orig_text = text
+        text = re.sub(r"(^(?=\$)|[^$])((?:\$\$)+?)((?:\${3})?(?:[^$]|$))",
+                      r"\1\2\2\3", text) if "$" in text else text
+        tmp = string.Template(text)
+        new_text = tmp.safe_substitute(local_substitution_dict)
+        changed = new_text != orig_text
+        text = new_text
+    tmp = string.Template(text)
+    return re.sub(r"\$(?=([\s]|$))", "$$",
+                  tmp.safe_substitute(str_substitution_dict))
+
+
+class DummyStep(object):
+
+    """Minimal step replacement for scheduler tests"""
+
+    def __init__(self, name, max_wps="0"):
+        self.name = name
+        self.max_wps = max_wps
+
+
+class DummyWorkpackage(object):
+
+    """Minimal workpackage replacement for scheduler tests"""
+
+    def __init__(self, wp_id, step, parents=None):
+        self.id = wp_id
+        self.step = step
+        self.parents = list() if parents is None else parents
+        self.children = list()
+        for parent in self.parents:
+            parent.children.append(self)
+        self.parameter_dict = dict()
+        self.started = False
+        self.done = False
+        self.queued = False
+
+
 class TestUtil(unittest.TestCase):
 
     """Util python file test class"""
@@ -107,6 +164,97 @@ class TestUtil(unittest.TestCase):
         for i in range(len(test_text)):
             self.assertEqual(jube.util.util.substitution(text=test_text[i], substitution_dict=test_substitution_dict),test_result_text[i])
 
+    def test_substitution_equivalence(self):
+        """Test substitution against its former implementation"""
+        rand = random.Random(42)
+        names = ["a", "b", "ab", "a_1", "B"]
+        alphabet = ["$", "$", "$", "{", "}", " ", "x", "-", "1", "\n"] + \
+            names
+
+        def random_text(length):
+            return "".join(rand.choice(alphabet) for _ in range(length))
+
+        for _ in range(3000):
+            values = dict((name, random_text(rand.randint(0, 6)))
+                          for name in rand.sample(names, rand.randint(0, 5)))
+            if rand.random() < 0.2:
+                values["a"] = rand.randint(-5, 5)
+            text = random_text(rand.randint(0, 16))
+            expected = legacy_substitution(text, values)
+            self.assertEqual(
+                jube.util.util.substitution(text, values), expected)
+            self.assertEqual(jube.util.util.substitution(
+                text, jube.util.util.SubstitutionDict(values)), expected)
+
+    def test_substitution_dict(self):
+        """Test cached representations of a SubstitutionDict"""
+        values = jube.util.util.SubstitutionDict({"a": "$b", "b": 1})
+        self.assertEqual(values.substitution_dicts,
+                         ({"a": "$b", "b": "1"}, {"a": "$$b", "b": "1"}))
+        self.assertEqual(jube.util.util.substitution("$a$b", values), "$b1")
+        values["b"] = "2"
+        self.assertEqual(jube.util.util.substitution("$b", values), "2")
+        del values["b"]
+        self.assertEqual(jube.util.util.substitution("$b", values), "$b")
+        values.update(b="3")
+        self.assertEqual(jube.util.util.substitution("${b}", values), "3")
+
+        # Copies and merged dictionaries keep consistent representations
+        values.substitution_dicts
+        values_copy = values.copy()
+        values_copy["c"] = "$a"
+        self.assertNotIn("c", values.substitution_dicts[0])
+        self.assertEqual(values_copy.substitution_dicts[1]["c"], "$$a")
+        merged = jube.util.util.SubstitutionDict.merge(
+            [values_copy, jube.util.util.SubstitutionDict({"b": 4})])
+        self.assertEqual(merged, {"a": "$b", "b": 4, "c": "$a"})
+        self.assertEqual(merged.substitution_dicts,
+                         ({"a": "$b", "b": "4", "c": "$a"},
+                          {"a": "$$b", "b": "4", "c": "$$a"}))
+        # Dictionaries are sent to worker processes
+        unpickled = pickle.loads(pickle.dumps(merged))
+        self.assertEqual(unpickled, merged)
+        unpickled["d"] = "1"
+        self.assertEqual(jube.util.util.substitution("$c$d", unpickled),
+                         "$a1")
+
+    def test_copy_on_write_dict(self):
+        """Test CopyOnWriteDict against a normal dict"""
+        rand = random.Random(42)
+        expected = dict((i, i) for i in range(20))
+        values = jube.util.util.CopyOnWriteDict(expected)
+        copies = list()
+        for step in range(2000):
+            key = rand.randrange(40)
+            if rand.random() < 0.3:
+                if key in expected:
+                    del expected[key]
+                    del values[key]
+                else:
+                    self.assertRaises(KeyError, values.__delitem__, key)
+            else:
+                expected[key] = step
+                values[key] = step
+            if step % 100 == 0:
+                copies.append((dict(expected), values.copy()))
+            self.assertEqual(list(values.items()), list(expected.items()))
+            self.assertEqual(len(values), len(expected))
+            self.assertEqual(key in values, key in expected)
+        # copies are not changed by later modifications
+        for expected_copy, values_copy in copies:
+            self.assertEqual(list(values_copy.items()),
+                             list(expected_copy.items()))
+            # common keys contain at least all keys with different values
+            common = set(expected_copy) & set(expected)
+            common_keys = values_copy.common_keys(values)
+            self.assertTrue(common_keys <= common)
+            for key in common:
+                if expected_copy[key] != expected[key]:
+                    self.assertIn(key, common_keys)
+        self.assertEqual(
+            jube.util.util.CopyOnWriteDict(a=1, b=2).common_keys(
+                jube.util.util.CopyOnWriteDict(b=3, c=4)), set(["b"]))
+
     def test_ensure_list(self):
         """Test ensure_list"""
         self.assertEqual(jube.util.util.ensure_list(42),[42])
@@ -116,6 +264,132 @@ class TestUtil(unittest.TestCase):
         self.assertEqual(jube.util.util.ensure_list(["",42,3.141]),["",42,3.141])
         self.assertEqual(type(jube.util.util.ensure_list(["",42,3.141])),list)
 
+    def test_compile_pattern(self):
+        """Test compile_pattern and its line end detection"""
+        text = "a=1 b=2\n\nb=3 a=4 c\n  a=5\nend a=6"
+        lines = text.splitlines(True)
+        for pattern, line_local in [(r"a=(\d+)", True),
+                                    (r"^\s*a=([+-]?\d+)$", False),
+                                    (r"^ *(a)=(\d+)$", True),
+                                    (r"(\w)=(\d)(?=\s)", False),
+                                    (r"(\w)=(\d)\b", True),
+                                    (r"[^\n=]+=", True),
+                                    (r"[^=]+=", False),
+                                    (r"\Aa=(\d)", False),
+                                    (r"(?s:b.)", False),
+                                    (r"(a|c)\W", False),
+                                    (r".*", True)]:
+            regex, result = jube.util.util.compile_pattern(pattern)
+            self.assertEqual(result, line_local)
+            self.assertTrue(regex.flags & re.MULTILINE)
+            if line_local:
+                # Scanning the lines one by one gives the same matches
+                self.assertEqual([match for line in lines
+                                  for match in regex.findall(line)
+                                  if match != ""],
+                                 [match for match in regex.findall(text)
+                                  if match != ""])
+        regex, result = jube.util.util.compile_pattern("a.", True)
+        self.assertFalse(result)
+        self.assertEqual(regex.findall("a\nb"), ["a\n"])
+        self.assertIs(jube.util.util.compile_pattern("a.", True)[0], regex)
+
+    def test_script_cache(self):
+        """Test caching of shell evaluations"""
+        tmp_dir = tempfile.mkdtemp()
+        counter = os.path.join(tmp_dir, "counter")
+        cmd = "echo x >> {0}; wc -l < {0} | tr -d ' '; echo $JUBE_TEST_VAR"
+        cmd = cmd.format(counter)
+        os.environ["JUBE_TEST_VAR"] = "a"
+        cache = jube.util.util.SCRIPT_CACHE
+        os.environ.pop("JUBE_SCRIPT_CACHE", None)
+        try:
+            cache.clear()
+            cache.filename = os.path.join(tmp_dir, "cache.jsonl")
+            evaluation = jube.util.util.script_evaluation
+            # cache is disabled by default
+            self.assertEqual(evaluation(cmd, "shell"), "1\na\n")
+            self.assertEqual(evaluation(cmd, "shell"), "2\na\n")
+            # opt-in of a single parameter
+            self.assertEqual(evaluation(cmd, "shell", cache=True),
+                             "3\na\n")
+            self.assertEqual(evaluation(cmd, "shell", cache=True),
+                             "3\na\n")
+            os.environ["JUBE_SCRIPT_CACHE"] = "run"
+            self.assertEqual(evaluation(cmd, "shell"), "3\na\n")
+            # opt-out and changed environment variables
+            self.assertEqual(evaluation(cmd, "shell", cache=False),
+                             "4\na\n")
+            os.environ["JUBE_TEST_VAR"] = "b"
+            self.assertEqual(evaluation(cmd, "shell"), "5\nb\n")
+            os.environ["JUBE_TEST_VAR"] = "a"
+            # results are reloaded from the cache file
+            cache.clear()
+            cache.filename = os.path.join(tmp_dir, "cache.jsonl")
+            self.assertEqual(evaluation(cmd, "shell"), "3\na\n")
+            os.environ["JUBE_SCRIPT_CACHE"] = "none"
+            self.assertEqual(evaluation(cmd, "shell"), "6\na\n")
+            os.environ["JUBE_SCRIPT_CACHE"] = "unknown"
+            self.assertRaises(ValueError, evaluation, cmd, "shell")
+        finally:
+            cache.clear()
+            del os.environ["JUBE_TEST_VAR"]
+            os.environ.pop("JUBE_SCRIPT_CACHE", None)
+            shutil.rmtree(tmp_dir)
+
+    def test_bound_python_evaluation(self):
+        """Test python evaluation using parameters as variables"""
+        values = {"a": "4", "b": "2.5", "c": "0", "neg": "-1", "s": "abc",
+                  "z": "007"}
+        expressions = ["$a * 2", "${a}**$b", "[i * $a for i in range($a)]",
+                       "(lambda x: x + $a)($c)", "$a if $c else -$b",
+                       "2**-$a", "max($a, $b)", "$a/3", "$a//3"]
+        for expression in expressions:
+            result = jube.util.util.bound_python_evaluation(expression,
+                                                           values)
+            self.assertIsNotNone(result, expression)
+            text = jube.util.util.substitution(expression, values)
+            self.assertEqual(result, str(eval(text)), expression)
+        # The substituted text would have another meaning or is invalid
+        for expression in ["'$a'", "1$a", "${a}0", "$a.real", "$$a",
+                           "dict($a=1)", "$neg**2", "len('$s')", "$z + 1",
+                           "$unknown + 1", "$a +"]:
+            self.assertIsNone(jube.util.util.bound_python_evaluation(
+                expression, values), expression)
+
+    def test_work_stat_dependencies(self):
+        """Test WorkStat fan-in scheduling"""
+        work_stat = jube.util.util.WorkStat()
+        parents = [DummyWorkpackage(i, DummyStep("a")) for i in range(3)]
+        child = DummyWorkpackage(3, DummyStep("b"), parents)
+        work_stat.put_all(parents)
+        self.assertTrue(all(parent.queued for parent in parents))
+        for i, parent in enumerate(parents):
+            self.assertEqual(work_stat.get(), parent)
+            parent.done = True
+            ready = work_stat.finish(parent)
+            self.assertEqual(ready, [child] if i == 2 else [])
+            # finishing a workpackage twice must not release children again
+            self.assertEqual(work_stat.finish(parent), [])
+        self.assertTrue(work_stat.empty())
+
+    def test_work_stat_max_wps(self):
+        """Test WorkStat max_wps handling"""
+        work_stat = jube.util.util.WorkStat()
+        step = DummyStep("a", max_wps="2")
+        workpackages = [DummyWorkpackage(i, step) for i in range(4)]
+        work_stat.put_all(workpackages)
+        self.assertEqual(work_stat.get(), workpackages[0])
+        self.assertEqual(work_stat.get(), workpackages[1])
+        self.assertTrue(work_stat.empty())
+        # unfinished workpackages keep their slot
+        work_stat.update_queues(workpackages[0])
+        self.assertTrue(work_stat.empty())
+        workpackages[0].done = True
+        work_stat.update_queues(workpackages[0])
+        self.assertEqual(work_stat.get(), workpackages[2])
+        self.assertTrue(work_stat.empty())
+
 
 if __name__ == "__main__":
     unittest.main()